@@ -0,0 +1,77 @@
+"""
+Measure cold-start import time for the app's modules using `python -X importtime`.
+
+Run with: python benchmark_import_time.py [module ...]   (defaults to every page and data module)
+
+Each module is imported in a fresh interpreter. The report shows its total (cumulative) import
+time and the slowest top-level imports it pulls in, so heavy SDKs sneaking back into import
+time are easy to spot.
+"""
+import os
+import re
+import subprocess
+import sys
+
+DEFAULT_MODULES = [
+    "ga4_data_pull",
+    "gsc_data_pull",
+    "gaw_data_pull",
+    "llm_integration",
+    "keyword_planner",
+    "homepage",
+]
+
+# Lines look like: "import time:       412 |       1873 |   streamlit.runtime"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """
+    Parse -X importtime output into a list of (module, self_us, cumulative_us, depth).
+    """
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def measure(module):
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=repo_dir,
+        capture_output=True,
+        text=True,
+    )
+    entries = parse_importtime(result.stderr)
+
+    # Output is post-order: a module's direct imports are the depth-1 lines just before its depth-0 line
+    total, children = None, []
+    for name, _, cumulative, depth in entries:
+        if depth == 0:
+            if name == module:
+                total = cumulative
+                break
+            children = []
+        elif depth == 1:
+            children.append((name, cumulative))
+    return total, children, result.returncode
+
+
+def main(modules):
+    for module in modules:
+        total, children, returncode = measure(module)
+        if total is None:
+            print(f"{module}: import failed (exit code {returncode})")
+            continue
+
+        print(f"{module}: {total / 1000:.0f} ms")
+        for name, cumulative in sorted(children, key=lambda child: child[1], reverse=True)[:5]:
+            print(f"    {name:<40} {cumulative / 1000:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or DEFAULT_MODULES)
@@ -0,0 +1,83 @@
+"""
+Benchmark the LLM call paths against the offline OpenAI stand-in (see llm_replay.py).
+
+Run with: python benchmark_llm.py [--server] [--latency 0.8] [--tokens-per-second 60] [--runs 5]
+
+Times a blocking query_gpt call, the time to first piece and total time of stream_gpt, and the three
+dashboard insight questions asked one after another versus concurrently with run_insights. Every call
+skips the LLM response cache (regenerate=True) so each run pays the simulated model latency.
+With --server the calls go through the real OpenAI SDK to a local fake HTTP server instead of the
+in-process fake, which adds the SDK's request and SSE parsing overhead.
+"""
+import argparse
+import os
+import statistics
+import time
+
+from clients import reset_clients
+from llm_replay import FakeLLM, install, serve
+from llm_integration import query_gpt, run_insights, stream_gpt
+
+INSIGHT_QUESTIONS = {
+    "ga_insights": ("Summarize the website performance metrics in 2-3 bullets.", "Sessions: 1200\nLeads: 14"),
+    "page_insights": ("Which pages should link to the contact page?", "/: 800 views\n/services: 300 views"),
+    "seo_insights": ("Suggest target search terms.", "dietitian lynnwood\neating disorder dietitian"),
+}
+
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def time_stream():
+    started = time.perf_counter()
+    first = None
+    for _ in stream_gpt("Write a short PPC plan.", regenerate=True):
+        first = first or time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+def report(name, seconds):
+    print(f"{name:<36} median {statistics.median(seconds) * 1000:>8.0f} ms   max {max(seconds) * 1000:>8.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--server", action="store_true", help="go through the SDK and a local fake HTTP server")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    backend = FakeLLM(latency=args.latency, tokens_per_second=args.tokens_per_second, seed=0)
+    if args.server:
+        server = serve(backend, port=0)
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        reset_clients()
+    else:
+        install(backend)
+
+    blocking, first_piece, streamed, sequential, concurrent = [], [], [], [], []
+    for _ in range(args.runs):
+        blocking.append(timed(lambda: query_gpt("Summarize the metrics.", "Sessions: 1200", regenerate=True)))
+        first, total = time_stream()
+        first_piece.append(first)
+        streamed.append(total)
+        sequential.append(timed(lambda: [
+            query_gpt(prompt, data_summary, regenerate=True) for prompt, data_summary in INSIGHT_QUESTIONS.values()
+        ]))
+        concurrent.append(timed(lambda: run_insights(INSIGHT_QUESTIONS, context="", regenerate=True)))
+
+    print(f"Fake model: {args.latency:.2f} s to first token, {args.tokens_per_second:.0f} tokens/s"
+          f"{' (via SDK and HTTP server)' if args.server else ''}")
+    report("query_gpt (blocking)", blocking)
+    report("stream_gpt first piece", first_piece)
+    report("stream_gpt complete", streamed)
+    report("3 insights, one after another", sequential)
+    report("3 insights, run_insights", concurrent)
+
+
+if __name__ == "__main__":
+    main()
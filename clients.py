@@ -0,0 +1,144 @@
+import os
+import threading
+
+import streamlit as st
+
+from tenants import DEFAULT_TENANT_ID, current_tenant
+
+# Clients are built on first use and shared by every session and tenant in the process.
+# The SDK imports live inside the factories so importing a page never pays for them up front.
+_clients = {}
+_lock = threading.Lock()
+
+
+def _get_or_create(name, factory):
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _lock:
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def set_client(name, client):
+    """
+    Register a ready-made client under the given name (e.g. a stand-in for tests or benchmarks).
+    """
+    with _lock:
+        _clients[name] = client
+
+
+def reset_clients():
+    with _lock:
+        _clients.clear()
+
+
+# Pool key for a client built from a secrets section: the plain name for the usual section,
+# so every tenant authenticating with the same credentials shares one client
+def _pool_name(name, credentials, default):
+    return name if credentials == default else f"{name}:{credentials}"
+
+
+def get_ga4_property_id():
+    tenant = current_tenant()
+    if tenant.ga4_property_id:
+        return tenant.ga4_property_id
+    # Only the original single-client deployment keeps its property in the service account secrets;
+    # any other tenant falling back to it would be shown that client's analytics
+    if tenant.id != DEFAULT_TENANT_ID:
+        raise ValueError(f"Tenant '{tenant.id}' has no ga4_property_id configured.")
+    return st.secrets["google_service_account"]["property_id"]
+
+
+def _build_ga4_client(credentials="google_service_account"):
+    from google.analytics.data_v1beta import BetaAnalyticsDataClient
+
+    # Initialize GA Client using the service account JSON
+    return BetaAnalyticsDataClient.from_service_account_info(st.secrets[credentials])
+
+
+def get_ga4_client():
+    credentials = current_tenant().google_credentials
+    return _get_or_create(
+        _pool_name("ga4", credentials, "google_service_account"), lambda: _build_ga4_client(credentials)
+    )
+
+
+def _build_search_console_service(credentials="google_service_account"):
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+
+    # Load the service account credentials from Streamlit secrets
+    credentials = service_account.Credentials.from_service_account_info(
+        st.secrets[credentials],
+        scopes=['https://www.googleapis.com/auth/webmasters.readonly']
+    )
+    # Use the discovery document bundled with the library instead of downloading it
+    return build('searchconsole', 'v1', credentials=credentials, static_discovery=True)
+
+
+def get_search_console_service():
+    credentials = current_tenant().google_credentials
+    return _get_or_create(
+        _pool_name("search_console", credentials, "google_service_account"),
+        lambda: _build_search_console_service(credentials),
+    )
+
+
+def get_openai_api_key():
+    """
+    OpenAI key from Streamlit secrets, falling back to the OPENAI_API_KEY environment variable
+    for headless runs (e.g. ppc_batch.py) that have no secrets file.
+    """
+    try:
+        return st.secrets["openai"]["api_key"]
+    except (FileNotFoundError, KeyError):
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise
+        return api_key
+
+
+def _build_openai_client():
+    from openai import OpenAI
+
+    # Retries are left to the scheduler, which backs off across every session in the process
+    return OpenAI(api_key=get_openai_api_key(), max_retries=0)
+
+
+def get_openai_client():
+    return _get_or_create("openai", _build_openai_client)
+
+
+def _build_async_openai_client():
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=get_openai_api_key(), max_retries=0)
+
+
+def get_async_openai_client():
+    return _get_or_create("async_openai", _build_async_openai_client)
+
+
+def _build_google_ads_client(credentials="google_ads"):
+    from google.ads.googleads.client import GoogleAdsClient
+
+    # Load credentials from Streamlit secrets
+    secrets = st.secrets[credentials]
+    credentials_dict = {
+        "developer_token": secrets["developer_token"],
+        "client_id": secrets["client_id"],
+        "client_secret": secrets["client_secret"],
+        "refresh_token": secrets["refresh_token"],
+        "login_customer_id": secrets.get("login_customer_id"),  # Manager account, if the agency uses one
+        "use_proto_plus": True
+    }
+    return GoogleAdsClient.load_from_dict(credentials_dict, version="v18")
+
+
+def get_google_ads_client():
+    credentials = current_tenant().ads_credentials
+    return _get_or_create(
+        _pool_name("google_ads", credentials, "google_ads"), lambda: _build_google_ads_client(credentials)
+    )
@@ -0,0 +1,247 @@
+import copy
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from singleflight import get_flight
+from tenants import DEFAULT_TENANT_ID, current_tenant, use_tenant
+
+
+def fingerprint(value):
+    """
+    Return a stable content hash for DataFrames, Series and plain Python values (and containers of them),
+    or None if the value can't be hashed by content (e.g. a generator).
+    """
+    digest = hashlib.sha256()
+    if not _update_digest(digest, value):
+        return None
+    return digest.hexdigest()
+
+
+def _update_digest(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(type(value).__name__.encode())
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(value.columns)).encode())
+            digest.update(repr([str(dtype) for dtype in value.dtypes]).encode())
+        else:
+            digest.update(repr((value.name, str(value.dtype))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+        return True
+    if isinstance(value, dict):
+        digest.update(b"dict")
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            if not _update_digest(digest, value[key]):
+                return False
+        return True
+    if isinstance(value, (list, tuple)):
+        digest.update(type(value).__name__.encode())
+        return all(_update_digest(digest, item) for item in value)
+    if value is None or isinstance(value, (str, bytes, int, float, bool)) or hasattr(value, "isoformat"):
+        digest.update(repr(value).encode())
+        return True
+    return False
+
+
+# Time-to-live (seconds) and maximum entries for each external data source's cache
+SOURCE_CACHE_SETTINGS = {
+    "ga4": {"ttl": 15 * 60, "maxsize": 64},
+    "gsc": {"ttl": 60 * 60, "maxsize": 32},
+    "google_ads": {"ttl": 6 * 60 * 60, "maxsize": 32},
+}
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire ttl seconds after they are stored (never, if ttl is None).
+    Keeps hit/miss/eviction counters and the time spent serving hits and computing misses.
+    """
+
+    def __init__(self, ttl=None, maxsize=128):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def get(self, key):
+        """
+        Return (True, value) for a live entry, or (False, None) if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record(self, hit, seconds):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_seconds += seconds
+            else:
+                self.misses += 1
+                self.miss_seconds += seconds
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            calls = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / calls, 3) if calls else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+                "avg_hit_ms": round(self.hit_seconds / self.hits * 1000, 2) if self.hits else 0.0,
+                "avg_miss_ms": round(self.miss_seconds / self.misses * 1000, 2) if self.misses else 0.0,
+            }
+
+
+# One cache per tenant and external data source, shared by every session in the process
+_source_caches = {}
+_source_caches_lock = threading.Lock()
+
+
+def get_source_cache(source, tenant=None):
+    """
+    The cache for one data source's pulls for one tenant (the current one by default). Each tenant's
+    cache holds at most its "cache_entries" quota, so one busy client can't evict everyone else's data.
+    """
+    tenant = tenant or current_tenant()
+    with _source_caches_lock:
+        if (tenant.id, source) not in _source_caches:
+            settings = SOURCE_CACHE_SETTINGS.get(source, {"ttl": 15 * 60, "maxsize": 64})
+            maxsize = min(settings["maxsize"], tenant.quotas["cache_entries"])
+            _source_caches[tenant.id, source] = TTLCache(ttl=settings["ttl"], maxsize=maxsize)
+        return _source_caches[tenant.id, source]
+
+
+def cache_stats(tenant=None):
+    """
+    Return hit/miss/latency counters for every data source cache, keyed by "source" for the
+    default tenant and "tenant/source" for the others. Given a tenant, only its own caches
+    are returned, keyed by source.
+    """
+    with _source_caches_lock:
+        caches = dict(_source_caches)
+    if tenant is not None:
+        return {source: cache.stats() for (tenant_id, source), cache in caches.items() if tenant_id == tenant.id}
+    return {
+        source if tenant_id == DEFAULT_TENANT_ID else f"{tenant_id}/{source}": cache.stats()
+        for (tenant_id, source), cache in caches.items()
+    }
+
+
+def _cached_call(cache, key, func, args, kwargs, flight=None):
+    started = time.perf_counter()
+    found, value = cache.get(key)
+    if found:
+        result = _copy_result(value)
+        cache.record(True, time.perf_counter() - started)
+        return result
+
+    if flight is None:
+        value = _call_and_store(cache, key, func, args, kwargs)
+    else:
+        # Sessions missing the same key at the same time share one call
+        value, _ = flight.do(key, _call_and_store, cache, key, func, args, kwargs)
+    cache.record(False, time.perf_counter() - started)
+    return _copy_result(value)
+
+
+def _call_and_store(cache, key, func, args, kwargs):
+    value = func(*args, **kwargs)
+    cache.set(key, value)
+    return value
+
+
+def cached_fetch(source, key_func=None):
+    """
+    Cache an external data pull in its source's TTLCache (see SOURCE_CACHE_SETTINGS), partitioned by tenant.
+
+    key_func receives the call's arguments and returns a value to hash into the cache key. Use it
+    to normalize arguments whose meaning drifts over time (e.g. resolve "30daysAgo" to a date),
+    so equal requests share a key and relative dates can't serve yesterday's data under today's key.
+    Concurrent misses for the same key (e.g. several sessions opening the dashboard at once) are
+    coalesced into a single call through the source's SingleFlight.
+    The wrapped function also takes a tenant= keyword (a Tenant or its id) to pull for a tenant other
+    than the current one; the pull itself then runs under that tenant.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, tenant=None, **kwargs):
+            with use_tenant(tenant) as tenant:
+                key_source = key_func(*args, **kwargs) if key_func else (args, kwargs)
+                key = fingerprint((tenant.id, func.__module__, func.__qualname__, key_source))
+                if key is None:
+                    return func(*args, **kwargs)
+                return _cached_call(get_source_cache(source, tenant), key, func, args, kwargs, get_flight(source))
+
+        wrapper.cache_source = source
+        return wrapper
+    return decorator
+
+
+def memoize(maxsize=128):
+    """
+    Cache a pure function's results keyed on a content hash of its arguments, keeping at most
+    maxsize results (least recently used are evicted first). Callers get a copy of the cached
+    result so they can't change it for everyone else. Calls whose arguments can't be hashed
+    by content (e.g. an iterator of chunks) go straight through.
+    """
+    def decorator(func):
+        cache = TTLCache(ttl=None, maxsize=maxsize)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = fingerprint((args, kwargs))
+            if key is None:
+                return func(*args, **kwargs)
+            return _cached_call(cache, key, func, args, kwargs)
+
+        wrapper.cache_clear = cache.clear
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def _copy_result(result):
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.copy()
+    if isinstance(result, tuple):
+        return tuple(_copy_result(item) for item in result)
+    if isinstance(result, list):
+        return [_copy_result(item) for item in result]
+    if isinstance(result, dict):
+        return {key: _copy_result(item) for key, item in result.items()}
+    return copy.copy(result)
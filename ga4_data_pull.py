@@ -1,64 +1,95 @@
+import os
 import pandas as pd
 from datetime import date, timedelta
 import calendar
-from google.analytics.data_v1beta import BetaAnalyticsDataClient
-from google.analytics.data_v1beta.types import RunReportRequest, DateRange, Dimension, Metric
 import streamlit as st
-import plotly.express as px
+from clients import get_ga4_client, get_ga4_property_id
+from data_cache import cached_fetch, memoize
+from ga4_decoder import decode_report
+from report_text import render_report
+from scheduler import scheduled_call
+from tenants import current_tenant, use_tenant
+from warehouse import DateWarehouse, resolve_ga4_date
+
+# GA4 metrics pulled for the source and landing page reports
+TRAFFIC_METRICS = ["activeUsers", "sessions", "screenPageViews", "bounceRate", "averageSessionDuration", "newUsers"]
+
+# DataFrame column names for TRAFFIC_METRICS, in the same order
+TRAFFIC_COLUMNS = ['Total Visitors', 'Sessions', 'Pageviews', 'Bounce Rate', 'Average Session Duration', 'New Users']
+
+# Dimensions and metrics for each report the app knows how to pull, and the DataFrame columns they decode into
+REPORT_DEFINITIONS = {
+    "source": {
+        "dimensions": ["sessionSource", "date"],
+        "metrics": TRAFFIC_METRICS,
+        "dimension_columns": ['Session Source', 'Date'],
+        "metric_columns": TRAFFIC_COLUMNS,
+    },
+    "landing_page": {
+        "dimensions": ["pagePath", "date"],
+        "metrics": TRAFFIC_METRICS,
+        "dimension_columns": ['Page Path', 'Date'],
+        "metric_columns": TRAFFIC_COLUMNS,
+    },
+    "event": {
+        "dimensions": ["eventName", "date"],
+        "metrics": ["eventCount"],
+        "dimension_columns": ['Event Name', 'Date'],
+        "metric_columns": ['Event Count'],
+    },
+}
+
+# GA4 accepts at most five reports in a single BatchRunReports call
+MAX_BATCH_REPORTS = 5
+
+# Rows requested per page; GA4 silently caps a request without a limit at 10,000 rows
+REPORT_PAGE_SIZE = 10000
+
+# Reports needed to render the homepage dashboard: name -> (report, start date, end date)
+# Source and event data cover both comparison periods in one pull (see compare_periods)
+DASHBOARD_REPORTS = {
+    "source_60_days": ("source", "60daysAgo", "yesterday"),
+    "event_60_days": ("event", "60daysAgo", "yesterday"),
+    "landing_page_30_days": ("landing_page", "30daysAgo", "yesterday"),
+}
+
+# Local stores of finished GA4 days (one per tenant and property), so each render only pulls the days that are missing or still settling
+_warehouses = {}
+
+def get_warehouse():
+    tenant, property_id = current_tenant(), get_ga4_property_id()
+    if (tenant.id, property_id) not in _warehouses:
+        _warehouses[tenant.id, property_id] = DateWarehouse(os.path.join(tenant.data_dir, f"ga4_{property_id}.sqlite"))
+    return _warehouses[tenant.id, property_id]
+
+
+# Build the RunReportRequest for one page of a report in REPORT_DEFINITIONS
+def build_report_request(report, start_date, end_date, offset=0, limit=REPORT_PAGE_SIZE):
+    from google.analytics.data_v1beta.types import RunReportRequest, DateRange, Dimension, Metric
+
+    definition = REPORT_DEFINITIONS[report]
+    return RunReportRequest(
+        property=f"properties/{get_ga4_property_id()}",
+        dimensions=[Dimension(name=name) for name in definition["dimensions"]],
+        metrics=[Metric(name=name) for name in definition["metrics"]],
+        date_ranges=[DateRange(start_date=start_date, end_date=end_date)],  # Define date range
+        offset=offset,
+        limit=limit,
+    )
 
-# Load the secrets for the service account path and property ID
-service_account_info = st.secrets["google_service_account"]
-property_id = st.secrets["google_service_account"]["property_id"]
 
-# Initialize GA Client using the service account JSON
-client = BetaAnalyticsDataClient.from_service_account_info(service_account_info)
+# Decode a GA4 response into the report's typed columns (Date stays as GA4's YYYYMMDD string)
+def decode_report_response(report, response):
+    definition = REPORT_DEFINITIONS[report]
+    return decode_report(response, definition["dimension_columns"], definition["metric_columns"])
+
 
 # Get traffic by source
-def fetch_metrics_by_source(start_date, end_date):
-    # Define the request to pull data aggregated by source
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        dimensions=[Dimension(name="sessionSource"), Dimension(name="date")],  # Added 'date' dimension
-        metrics=[
-            Metric(name="activeUsers"),
-            Metric(name="sessions"),
-            Metric(name="screenPageViews"),
-            Metric(name="bounceRate"),
-            Metric(name="averageSessionDuration"),
-            Metric(name="newUsers"),
-        ],
-        date_ranges=[DateRange(start_date=start_date, end_date=end_date)],  # Define date range
-    )
+def fetch_metrics_by_source(start_date, end_date, tenant=None):
+    return load_reports([("source", start_date, end_date)], tenant=tenant)[0]
 
-    response = client.run_report(request)
-    
-    # Parse the response and create the dataframe for source-level metrics
-    rows = []
-    for row in response.rows:
-        session_source = row.dimension_values[0].value
-        date = row.dimension_values[1].value  # Capture the date
-        
-        # Convert all metrics to numeric values (with coercion to handle non-numeric data)
-        active_users = pd.to_numeric(row.metric_values[0].value, errors='coerce')
-        sessions = pd.to_numeric(row.metric_values[1].value, errors='coerce')
-        pageviews = pd.to_numeric(row.metric_values[2].value, errors='coerce')
-        bounce_rate = pd.to_numeric(row.metric_values[3].value, errors='coerce')
-        avg_session_duration = pd.to_numeric(row.metric_values[4].value, errors='coerce')
-        new_users = pd.to_numeric(row.metric_values[5].value, errors='coerce')
-        
-        rows.append([
-            date, session_source, active_users, sessions, pageviews, bounce_rate, avg_session_duration, new_users
-        ])
-    
-    # Create DataFrame for metrics by source
-    df_source_metrics = pd.DataFrame(rows, columns=[
-        'Date', 'Session Source', 'Total Visitors', 'Sessions', 'Pageviews', 'Bounce Rate', 'Average Session Duration', 'New Users'
-    ])
-    
-    # Convert all numeric columns to proper numeric types
-    numeric_cols = ['Total Visitors', 'Sessions', 'Pageviews', 'Bounce Rate', 'Average Session Duration', 'New Users']
-    for col in numeric_cols:
-        df_source_metrics[col] = pd.to_numeric(df_source_metrics[col], errors='coerce')
+def shape_metrics_by_source(df_source_metrics):
+    df_source_metrics = df_source_metrics[['Date', 'Session Source'] + TRAFFIC_COLUMNS].copy()
     
     # Process data for easier handling
     df_source_metrics.sort_values(by='Session Source', inplace=True)
@@ -68,51 +99,11 @@ def fetch_metrics_by_source(start_date, end_date):
     return df_source_metrics
 
 # Get data by landing page
-def fetch_metrics_by_landing_page(start_date, end_date):
-    # Define the request to pull data aggregated by landing page
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        dimensions=[Dimension(name="pagePath"), Dimension(name="date")],  # Added 'date' dimension
-        metrics=[
-            Metric(name="activeUsers"),
-            Metric(name="sessions"),
-            Metric(name="screenPageViews"),
-            Metric(name="bounceRate"),
-            Metric(name="averageSessionDuration"),
-            Metric(name="newUsers"),
-        ],
-        date_ranges=[DateRange(start_date=start_date, end_date=end_date)],  # Define date range
-    )
+def fetch_metrics_by_landing_page(start_date, end_date, tenant=None):
+    return load_reports([("landing_page", start_date, end_date)], tenant=tenant)[0]
 
-    response = client.run_report(request)
-    
-    # Parse the response and create the dataframe for landing page-level metrics
-    rows = []
-    for row in response.rows:
-        page_path = row.dimension_values[0].value
-        date = row.dimension_values[1].value  # Capture the date
-        
-        # Convert all metrics to numeric values (with coercion to handle non-numeric data)
-        active_users = pd.to_numeric(row.metric_values[0].value, errors='coerce')
-        sessions = pd.to_numeric(row.metric_values[1].value, errors='coerce')
-        pageviews = pd.to_numeric(row.metric_values[2].value, errors='coerce')
-        bounce_rate = pd.to_numeric(row.metric_values[3].value, errors='coerce')
-        avg_session_duration = pd.to_numeric(row.metric_values[4].value, errors='coerce')
-        new_users = pd.to_numeric(row.metric_values[5].value, errors='coerce')
-        
-        rows.append([
-            date, page_path, active_users, sessions, pageviews, bounce_rate, avg_session_duration, new_users
-        ])
-    
-    # Create DataFrame for metrics by landing page
-    df_landing_page_metrics = pd.DataFrame(rows, columns=[
-        'Date', 'Page Path', 'Total Visitors', 'Sessions', 'Pageviews', 'Bounce Rate', 'Average Session Duration', 'New Users'
-    ])
-    
-    # Convert all numeric columns to proper numeric types
-    numeric_cols = ['Total Visitors', 'Sessions', 'Pageviews', 'Bounce Rate', 'Average Session Duration', 'New Users']
-    for col in numeric_cols:
-        df_landing_page_metrics[col] = pd.to_numeric(df_landing_page_metrics[col], errors='coerce')
+def shape_metrics_by_landing_page(df_landing_page_metrics):
+    df_landing_page_metrics = df_landing_page_metrics[['Date', 'Page Path'] + TRAFFIC_COLUMNS].copy()
     
     # Process data for easier handling
     df_landing_page_metrics.sort_values(by='Page Path', inplace=True)
@@ -121,35 +112,11 @@ def fetch_metrics_by_landing_page(start_date, end_date):
 
 
 #  Get Conversions
-def fetch_metrics_by_event(start_date, end_date):
-    # Define the request to pull data aggregated by event name
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        dimensions=[Dimension(name="eventName"), Dimension(name="date")],  # Added 'date' dimension
-        metrics=[
-            Metric(name="eventCount"),  # Focus on the event count
-        ],
-        date_ranges=[DateRange(start_date=start_date, end_date=end_date)],  # Define date range
-    )
+def fetch_metrics_by_event(start_date, end_date, tenant=None):
+    return load_reports([("event", start_date, end_date)], tenant=tenant)[0]
 
-    response = client.run_report(request)
-    
-    # Parse the response and create the dataframe for event-level metrics
-    rows = []
-    for row in response.rows:
-        event_name = row.dimension_values[0].value
-        date = row.dimension_values[1].value  # Capture the date
-        
-        # Convert event count to numeric (with coercion to handle non-numeric data)
-        event_count = pd.to_numeric(row.metric_values[0].value, errors='coerce')
-        
-        rows.append([date, event_name, event_count])
-    
-    # Create DataFrame for metrics by event name
-    df_event_metrics = pd.DataFrame(rows, columns=['Date', 'Event Name', 'Event Count'])
-    
-    # Convert the 'Event Count' to numeric
-    df_event_metrics['Event Count'] = pd.to_numeric(df_event_metrics['Event Count'], errors='coerce')
+def shape_metrics_by_event(df_event_metrics):
+    df_event_metrics = df_event_metrics[['Date', 'Event Name', 'Event Count']].copy()
     
     # Sort data for easier handling
     df_event_metrics.sort_values(by='Event Count', ascending=False, inplace=True)
@@ -157,32 +124,180 @@ def fetch_metrics_by_event(start_date, end_date):
     return df_event_metrics
 
 
+# Turn stored rows back into the DataFrame layout each fetcher has always returned
+REPORT_SHAPERS = {
+    "source": shape_metrics_by_source,
+    "landing_page": shape_metrics_by_landing_page,
+    "event": shape_metrics_by_event,
+}
+
+def shape_report(report, df):
+    if df is None:
+        definition = REPORT_DEFINITIONS[report]
+        df = pd.DataFrame(columns=definition["dimension_columns"] + definition["metric_columns"])
+    df = df.copy()
+
+    # The warehouse keeps ISO dates; GA4 (and the summarizers) use YYYYMMDD
+    df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y%m%d')
+    return REPORT_SHAPERS[report](df)
+
+
+# Page through a report with offset/limit, one decoded chunk at a time
+def iter_report_pages(report, start_date, end_date, page_size=REPORT_PAGE_SIZE, first_response=None):
+    """
+    Yield decoded DataFrame chunks of at most page_size rows until the response's row_count
+    is exhausted, so high-cardinality reports are never truncated or held in memory whole.
+    If the first page was already fetched (e.g. in a batch), pass it as first_response.
+    """
+    offset = 0
+    response = first_response
+    while True:
+        if response is None:
+            request = build_report_request(report, start_date, end_date, offset=offset, limit=page_size)
+            # retry=None turns off the client's own retries, which would stack under the scheduler's
+            response = scheduled_call("ga4", get_ga4_client().run_report, request, retry=None, timeout_arg="timeout")
+        if not response.rows:
+            return
+
+        yield decode_report_response(report, response)
+
+        offset += len(response.rows)
+        if offset >= response.row_count:
+            return
+        response = None
+
+
+# Fetch several reports with as few round-trips as possible
+def fetch_reports_batch(report_specs, page_size=REPORT_PAGE_SIZE):
+    """
+    Send a list of (report, start_date, end_date) specs through GA4's BatchRunReports,
+    up to MAX_BATCH_REPORTS per call. Yields (spec, chunks) in the same order, where chunks
+    iterates the report's decoded pages: the first comes from the batch, any remaining pages
+    are fetched on demand.
+    """
+    from google.analytics.data_v1beta.types import BatchRunReportsRequest
+
+    for i in range(0, len(report_specs), MAX_BATCH_REPORTS):
+        chunk = report_specs[i:i + MAX_BATCH_REPORTS]
+        batch_request = BatchRunReportsRequest(
+            property=f"properties/{get_ga4_property_id()}",
+            requests=[
+                build_report_request(report, start_date, end_date, limit=page_size)
+                for report, start_date, end_date in chunk
+            ],
+        )
+        batch_response = scheduled_call(
+            "ga4", get_ga4_client().batch_run_reports, batch_request, retry=None, timeout_arg="timeout"
+        )
+
+        # Reports come back in the same order they were requested
+        for spec, response in zip(chunk, batch_response.reports):
+            yield spec, iter_report_pages(*spec, page_size=page_size, first_response=response)
+
+
+# Pull any missing or settling days for the given reports into the local warehouse
+def sync_reports(report_specs):
+    """
+    Make sure the warehouse holds every day of each (report, start_date, end_date) spec.
+    Returns the specs with their dates resolved to datetime.date.
+    """
+    resolved_specs = [
+        (report, resolve_ga4_date(start_date), resolve_ga4_date(end_date))
+        for report, start_date, end_date in report_specs
+    ]
+
+    warehouse = get_warehouse()
+
+    # Work out which date runs each report is missing (shared runs are only fetched once)
+    fetch_specs = []
+    for report, start, end in resolved_specs:
+        for run_start, run_end in warehouse.missing_runs(report, start, end):
+            spec = (report, run_start.isoformat(), run_end.isoformat())
+            if spec not in fetch_specs:
+                fetch_specs.append(spec)
+
+    # Stream each report's pages straight into the warehouse
+    for (report, run_start, run_end), chunks in fetch_reports_batch(fetch_specs):
+        warehouse.store(report, chunks, date.fromisoformat(run_start), date.fromisoformat(run_end))
+
+    return resolved_specs
+
+
+# Cache key for GA4 pulls: relative dates resolve to absolute ones so keys stay stable
+def _report_specs_cache_key(report_specs):
+    return [
+        (report, resolve_ga4_date(start_date).isoformat(), resolve_ga4_date(end_date).isoformat())
+        for report, start_date, end_date in report_specs
+    ]
+
+
+# Read reports from the local warehouse, pulling only missing or settling days from GA4
+@cached_fetch("ga4", key_func=_report_specs_cache_key)
+def load_reports(report_specs):
+    """
+    Return one DataFrame per (report, start_date, end_date) spec. Days already stored locally are
+    read from the warehouse; the rest are fetched from GA4 in batched calls and merged in first.
+    """
+    resolved_specs = sync_reports(report_specs)
+    warehouse = get_warehouse()
+    return [shape_report(report, warehouse.read(report, start, end)) for report, start, end in resolved_specs]
+
+
+# Stream a report in bounded-size chunks instead of loading it whole
+def iter_report_chunks(report, start_date, end_date, chunksize=REPORT_PAGE_SIZE, tenant=None):
+    """
+    Sync the report into the warehouse, then yield it in DataFrame chunks of at most chunksize rows.
+    The chunks can be fed to the summarizers (e.g. summarize_landing_pages) without ever building
+    the full DataFrame.
+    """
+    with use_tenant(tenant):
+        [(report, start, end)] = sync_reports([(report, start_date, end_date)])
+        warehouse = get_warehouse()
+    for chunk in warehouse.read(report, start, end, chunksize=chunksize):
+        yield shape_report(report, chunk)
+
+
+# Pull every report the homepage needs in a single batched fetch
+def fetch_dashboard_reports(report_plan=None, tenant=None):
+    """
+    Load all reports in the plan (defaults to DASHBOARD_REPORTS) for the tenant (the current one
+    by default) and return a dict mapping each report name to its DataFrame.
+    """
+    report_plan = report_plan or DASHBOARD_REPORTS
+    names = list(report_plan)
+    frames = load_reports([report_plan[name] for name in names], tenant=tenant)
+    return dict(zip(names, frames))
+
+
 # Summarize acquisition data
 def summarize_acquisition_sources(acquisition_data, event_data):
-    # Ensure the Date column is in datetime format and convert to date
-    acquisition_data['Date'] = pd.to_datetime(acquisition_data['Date'], errors='coerce').dt.date
+    # Get the date 30 days ago (part of the memo key, so cached results roll over with the date)
+    start_of_period = date.today() - timedelta(days=30)
+    return _summarize_acquisition_sources(acquisition_data, event_data, start_of_period)
 
-    # Get the date 30 days ago
-    today = date.today()
-    start_of_period = today - timedelta(days=30)
-    
-    # Filter data for the last 30 days
-    monthly_data = acquisition_data[acquisition_data['Date'] >= start_of_period]
-    
+@memoize()
+def _summarize_acquisition_sources(acquisition_data, event_data, start_of_period):
     # Check if required columns are in the dataframe
     required_cols = ["Session Source", "Sessions", "Bounce Rate"]
     if not all(col in acquisition_data.columns for col in required_cols):
         raise ValueError("Data does not contain required columns.")
+
+    # Filter data for the last 30 days (without touching the caller's Date column)
+    dates = pd.to_datetime(acquisition_data['Date'], errors='coerce').dt.date
+    monthly_data = acquisition_data[dates >= start_of_period]
     
     # Convert columns to numeric, if possible, and fill NaNs
-    monthly_data["Sessions"] = pd.to_numeric(monthly_data["Sessions"], errors='coerce').fillna(0)
-    monthly_data["Bounce Rate"] = pd.to_numeric(monthly_data["Bounce Rate"], errors='coerce').fillna(0)
+    monthly_data = monthly_data.assign(
+        Date=dates[dates >= start_of_period],
+        Sessions=pd.to_numeric(monthly_data["Sessions"], errors='coerce').fillna(0),
+        **{"Bounce Rate": pd.to_numeric(monthly_data["Bounce Rate"], errors='coerce').fillna(0)},
+    )
     
     # Merge the traffic data with the event data to include leads
     monthly_data = monthly_data.merge(event_data[['Page Path', 'Event Count']], on='Page Path', how='left')
 
     # Fill missing values in Event Count with 0 for pages without leads
-    monthly_data['Event Count'].fillna(0, inplace=True)
+    monthly_data['Event Count'] = monthly_data['Event Count'].fillna(0)
 
     # Group by Session Source to get aggregated metrics
     source_summary = monthly_data.groupby("Session Source").agg(
@@ -200,35 +315,29 @@ def summarize_acquisition_sources(acquisition_data, event_data):
     return source_summary
 
 # Summarize Landing Pages
+@memoize()
 def summarize_landing_pages(acquisition_data, event_data):
-    # Ensure that 'Page Path' exists in acquisition_data or handle differently
-    if 'Page Path' not in acquisition_data.columns:
-        raise ValueError("Data does not contain a 'Page Path' column.")
-    
-    # Convert columns to numeric, if possible, and fill NaNs
-    numeric_cols = ["Sessions", "Bounce Rate", "Total Visitors", "Pageviews", "Average Session Duration"]
-    for col in numeric_cols:
-        acquisition_data[col] = pd.to_numeric(acquisition_data[col], errors='coerce').fillna(0)
+    # Accept either a full DataFrame or an iterable of chunks (e.g. from iter_report_chunks)
+    chunks = [acquisition_data] if isinstance(acquisition_data, pd.DataFrame) else acquisition_data
 
     # Create a column for 'Leads', filtering event data where Event Name is 'generate_lead'
     event_data_filtered = event_data[event_data['Event Name'] == 'generate_lead']
-    
-    # Ensure that 'Event Count' is numeric
-    event_data_filtered['Event Count'] = pd.to_numeric(event_data_filtered['Event Count'], errors='coerce').fillna(0)
-    
-    # Create a new column for Leads and set it for Contact page only
-    acquisition_data['Leads'] = 0  # Initialize Leads to 0 for all pages
-    acquisition_data.loc[acquisition_data['Page Path'] == '/contact', 'Leads'] = event_data_filtered['Event Count'].sum()
+    total_leads = pd.to_numeric(event_data_filtered['Event Count'], errors='coerce').fillna(0).sum()
+
+    # Aggregate by Page Path one chunk at a time
+    page_summary = aggregate_chunks(
+        chunks,
+        by="Page Path",
+        sums={"Sessions": "Sessions", "Total_Visitors": "Total Visitors", "Pageviews": "Pageviews"},
+        means={"Avg_Session_Duration": "Average Session Duration", "Bounce_Rate": "Bounce Rate"},
+    )
 
-    # Group by Page Path to get aggregated metrics
-    page_summary = acquisition_data.groupby("Page Path").agg(
-        Sessions=("Sessions", "sum"),
-        Total_Visitors=("Total Visitors", "sum"),
-        Pageviews=("Pageviews", "sum"),
-        Avg_Session_Duration=("Average Session Duration", "mean"),
-        Bounce_Rate=("Bounce Rate", "mean"),
-        Conversions=("Leads", "sum")  # Use 'Leads' for conversions
-    ).reset_index()
+    # Every /contact row carries the period's total leads, so its conversions scale with its row count
+    page_summary["Conversions"] = 0
+    page_summary.loc[page_summary["Page Path"] == '/contact', "Conversions"] = (
+        page_summary.loc[page_summary["Page Path"] == '/contact', "Rows"] * total_leads
+    )
+    page_summary = page_summary.drop(columns="Rows")
 
     # Calculate Conversion Rate
     page_summary["Conversion Rate (%)"] = (page_summary["Conversions"] / page_summary["Sessions"] * 100).round(2)
@@ -239,110 +348,170 @@ def summarize_landing_pages(acquisition_data, event_data):
     return page_summary
 
 
-# Get this months summary
-def summarize_monthly_data(monthly_data, event_data):
-    # Ensure the Date column is in datetime format, then convert to date
-    if 'Date' not in monthly_data.columns:
-        raise ValueError("Data does not contain a 'Date' column.")
-    
-    monthly_data['Date'] = pd.to_datetime(monthly_data['Date'], errors='coerce').dt.date
-    
-    # Check if required columns are in the dataframe
-    required_cols = ["Total Visitors", "New Users", "Sessions", "Average Session Duration", "Session Source"]
-    if not all(col in monthly_data.columns for col in required_cols):
-        raise ValueError("Data does not contain required columns.")
-    
-    # Convert columns to numeric, if possible, and fill NaNs
-    numeric_cols = ["Total Visitors", "New Users", "Sessions", "Average Session Duration"]
-    for col in numeric_cols:
-        monthly_data[col] = pd.to_numeric(monthly_data[col], errors='coerce').fillna(0)
+# Group and aggregate report chunks without concatenating them first
+def aggregate_chunks(chunks, by, sums, means):
+    """
+    Group an iterable of DataFrame chunks by the `by` column. `sums` and `means` map output
+    column names to input columns; non-numeric values count as 0, as in the other summarizers.
+    Only running per-group sums and row counts are kept between chunks, so memory stays bounded
+    by the number of groups, not rows. The result also has a "Rows" column with each group's row count.
+    """
+    value_cols = list(dict.fromkeys(list(sums.values()) + list(means.values())))
+    totals = None
+    integer_cols = set()
+    for chunk in chunks:
+        if by not in chunk.columns:
+            raise ValueError(f"Data does not contain a '{by}' column.")
+
+        numeric = chunk[value_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
+        if totals is None:
+            integer_cols = {col for col in value_cols if pd.api.types.is_integer_dtype(numeric[col])}
+        numeric[by] = chunk[by].values
+        partial = numeric.groupby(by).agg(**{col: (col, "sum") for col in value_cols}, Rows=(by, "size"))
+        totals = partial if totals is None else totals.add(partial, fill_value=0)
+
+    if totals is None:
+        totals = pd.DataFrame(0, columns=value_cols + ["Rows"], index=pd.Index([], name=by))
+
+    summary = pd.DataFrame(index=totals.index)
+    for name, col in sums.items():
+        # Aligning chunks can upcast to float; keep integer metrics as integers
+        summary[name] = totals[col].astype("int64") if col in integer_cols else totals[col]
+    for name, col in means.items():
+        summary[name] = totals[col] / totals["Rows"]
+    summary["Rows"] = totals["Rows"]
+    return summary.reset_index()
+
+
+# Comparison periods as (first day, last day) in days before today
+COMPARISON_PERIODS = {
+    "current": (30, 1),          # last 30 days, ending yesterday
+    "previous": (60, 31),        # the 30 days before that
+    "this_week": (7, 1),
+    "last_week": (14, 8),
+    "last_year": (395, 366),     # the same 30 days, one year earlier
+}
+
+# Periods the homepage compares (this month vs last month)
+DASHBOARD_PERIODS = ["current", "previous"]
+
+
+# Resolve period names into absolute (start, end) dates
+def resolve_periods(names, today=None):
+    today = today or date.today()
+    return {
+        name: (today - timedelta(days=COMPARISON_PERIODS[name][0]), today - timedelta(days=COMPARISON_PERIODS[name][1]))
+        for name in names
+    }
 
-    # Filter event data to include only "generate_lead" events and calculate total leads
-    event_data_filtered = event_data[event_data['Event Name'] == 'generate_lead']
 
-    # Sum the "Event Count" for "generate_lead" events to get total leads
-    total_leads = event_data_filtered['Event Count'].sum()
+# Keep only the rows of a report that fall inside a (start, end) period
+def slice_period(data, period):
+    start, end = period
+    dates = pd.to_datetime(data['Date'], errors='coerce').dt.date
+    return data[(dates >= start) & (dates <= end)]
 
-    # Add a new column "Leads" to the acquisition data and set it to 0 by default
-    monthly_data['Leads'] = 0
-    
-    # Set the "Leads" column for the Contact page
-    monthly_data.loc[monthly_data['Session Source'] == 'Contact', 'Leads'] = total_leads
-    
-    # Calculate total metrics for the last 30 days
-    total_visitors = monthly_data["Total Visitors"].sum()
-    new_visitors = monthly_data["New Users"].sum()
-    total_sessions = monthly_data["Sessions"].sum()
 
-    # Calculate average metrics for the last 30 days
-    avg_time_on_site = monthly_data["Average Session Duration"].mean().round(2)
-    
-    # Create a summary DataFrame
-    summary_df = pd.DataFrame({
-        "Metric": ["Total Visitors", "New Visitors", "Total Sessions", "Total Leads", "Average Session Duration"],
-        "Value": [total_visitors, new_visitors, total_sessions, total_leads, avg_time_on_site]
-    })
+# Tag every row with each period it falls in; rows in overlapping periods appear once per period
+def _tag_periods(data, periods):
+    dates = pd.to_datetime(data['Date'], errors='coerce').dt.date
+    tagged = [
+        data[(dates >= start) & (dates <= end)].assign(Period=name)
+        for name, (start, end) in periods.items()
+    ]
+    return pd.concat(tagged, ignore_index=True)
 
-    # Summarize acquisition metrics (using Event Count for leads)
-    acquisition_summary = monthly_data.groupby("Session Source").agg(
-        Visitors=("Total Visitors", "sum"),
-        Sessions=("Sessions", "sum"),
-        Leads=("Leads", "sum")  # Sum of leads for the Contact page
-    ).reset_index()
-    
-    return summary_df, acquisition_summary
 
-def summarize_last_month_data(prev_monthly_data, event_data):
-    # Ensure the Date column is in datetime format, then convert to date
-    if 'Date' not in prev_monthly_data.columns:
-        raise ValueError("Data does not contain a 'Date' column.")
-    
-    prev_monthly_data['Date'] = pd.to_datetime(prev_monthly_data['Date'], errors='coerce').dt.date
-    
+# Summarize traffic and leads for every period in one grouped pass
+@memoize()
+def compare_periods(source_data, event_data, periods):
+    """
+    Split one contiguous pull of source and event data into periods (a dict of name -> (start, end)
+    dates) and return a dict of name -> (summary_df, acquisition_summary), in the same format
+    summarize_monthly_data has always returned.
+    """
+    return _summarize_tagged(_tag_periods(source_data, periods), _tag_periods(event_data, periods), list(periods))
+
+
+# Pull one date range covering all periods and compare them
+def fetch_period_comparison(period_names=DASHBOARD_PERIODS, tenant=None):
+    """
+    Fetch source and event data once for the span of all named periods (see COMPARISON_PERIODS)
+    and return (comparison, source_data, event_data), where comparison is compare_periods' result.
+    """
+    periods = resolve_periods(period_names)
+    start = min(period_start for period_start, _ in periods.values()).isoformat()
+    end = max(period_end for _, period_end in periods.values()).isoformat()
+
+    source_data, event_data = load_reports([("source", start, end), ("event", start, end)], tenant=tenant)
+    return compare_periods(source_data, event_data, periods), source_data, event_data
+
+
+def _summarize_tagged(source_data, event_data, period_names):
     # Check if required columns are in the dataframe
+    if 'Date' not in source_data.columns:
+        raise ValueError("Data does not contain a 'Date' column.")
     required_cols = ["Total Visitors", "New Users", "Sessions", "Average Session Duration", "Session Source"]
-    if not all(col in prev_monthly_data.columns for col in required_cols):
+    if not all(col in source_data.columns for col in required_cols):
         raise ValueError("Data does not contain required columns.")
-    
+
     # Convert columns to numeric, if possible, and fill NaNs
     numeric_cols = ["Total Visitors", "New Users", "Sessions", "Average Session Duration"]
-    for col in numeric_cols:
-        prev_monthly_data[col] = pd.to_numeric(prev_monthly_data[col], errors='coerce').fillna(0)
-    
-    # Filter event data to include only "generate_lead" events
-    event_data_filtered = event_data[event_data['Event Name'] == 'generate_lead']
+    source_data = source_data.assign(**{
+        col: pd.to_numeric(source_data[col], errors='coerce').fillna(0) for col in numeric_cols
+    })
 
-    # Sum the "Event Count" for "generate_lead" events to get total leads
-    total_leads = event_data_filtered['Event Count'].sum()
+    # Total "generate_lead" events per period
+    leads = event_data[event_data['Event Name'] == 'generate_lead'].groupby("Period")['Event Count'].sum()
+    leads = leads.reindex(period_names, fill_value=0)
 
-    # Add a new column "Leads" to the acquisition data and set it to 0 by default
-    prev_monthly_data['Leads'] = 0
-    
-    # Set the "Leads" column for the Contact page
-    prev_monthly_data.loc[prev_monthly_data['Session Source'] == 'Contact', 'Leads'] = total_leads
-    
-    # Calculate total metrics for the last month
-    total_visitors = prev_monthly_data["Total Visitors"].sum()
-    new_visitors = prev_monthly_data["New Users"].sum()
-    total_sessions = prev_monthly_data["Sessions"].sum()
+    # Every row from the Contact source carries its period's total leads
+    is_contact = source_data['Session Source'] == 'Contact'
+    source_data['Leads'] = source_data['Period'].map(leads).where(is_contact, 0)
 
-    # Calculate average metrics for the last month
-    avg_time_on_site = prev_monthly_data["Average Session Duration"].mean().round(2)
-    
-    # Create a summary DataFrame
-    summary_df = pd.DataFrame({
-        "Metric": ["Total Visitors", "New Visitors", "Total Sessions", "Total Leads", "Average Session Duration"],
-        "Value": [total_visitors, new_visitors, total_sessions, total_leads, avg_time_on_site]
-    })
+    # Totals and averages for every period at once
+    totals = source_data.groupby("Period").agg(
+        Total_Visitors=("Total Visitors", "sum"),
+        New_Visitors=("New Users", "sum"),
+        Total_Sessions=("Sessions", "sum"),
+        Avg_Time_On_Site=("Average Session Duration", "mean"),
+    ).reindex(period_names).fillna({"Total_Visitors": 0, "New_Visitors": 0, "Total_Sessions": 0})
 
     # Summarize acquisition metrics (using Event Count for leads)
-    acquisition_summary = prev_monthly_data.groupby("Session Source").agg(
+    acquisition = source_data.groupby(["Period", "Session Source"]).agg(
         Visitors=("Total Visitors", "sum"),
         Sessions=("Sessions", "sum"),
         Leads=("Leads", "sum")  # Sum of leads for the Contact page
     ).reset_index()
-    
-    return summary_df, acquisition_summary
+
+    results = {}
+    for name in period_names:
+        period_totals = totals.loc[name]
+        summary_df = pd.DataFrame({
+            "Metric": ["Total Visitors", "New Visitors", "Total Sessions", "Total Leads", "Average Session Duration"],
+            "Value": [
+                period_totals["Total_Visitors"],
+                period_totals["New_Visitors"],
+                period_totals["Total_Sessions"],
+                leads[name],
+                round(period_totals["Avg_Time_On_Site"], 2),
+            ]
+        })
+        acquisition_summary = acquisition[acquisition["Period"] == name].drop(columns="Period").reset_index(drop=True)
+        results[name] = (summary_df, acquisition_summary)
+    return results
+
+
+# Get this months summary
+@memoize()
+def summarize_monthly_data(monthly_data, event_data):
+    """
+    Summarize all of monthly_data as a single period; returns (summary_df, acquisition_summary).
+    """
+    if 'Date' not in monthly_data.columns:
+        raise ValueError("Data does not contain a 'Date' column.")
+    results = _summarize_tagged(monthly_data.assign(Period="all"), event_data.assign(Period="all"), ["all"])
+    return results["all"]
 
 
 # Generate all metrics
@@ -398,6 +567,8 @@ def generate_all_metrics_copy(current_summary_df, last_month_summary_df):
 
 
 def plot_acquisition_pie_chart_plotly(acquisition_summary):
+    import plotly.express as px
+
     # Filter data for pie chart
     source_data = acquisition_summary[['Session Source', 'Visitors']].copy()
     source_data = source_data[source_data['Visitors'] > 0]  # Exclude sources with no visitors
@@ -452,28 +623,46 @@ def describe_top_sources(acquisition_summary):
         st.markdown(f"**{source} - {visitors} visitors**")
         st.markdown(f"{descriptions.get(source, 'Description not available for this source.')}")
 
-def generate_page_summary(landing_page_summary):
-    # Map page paths to friendly names
-    page_name_map = {
-        "/": "Home",
-        "/contact": "Contact",
-        "/ratesinsurance": "Rates & Insurance",
-        "/about": "About",
-        "/faqs": "FAQs",
-        "/adults-nutrition-counseling": "Adults",
-        "/teens-nutrition-counseling": "Teens"
-    }
+# Map page paths to friendly names
+PAGE_NAME_MAP = {
+    "/": "Home",
+    "/contact": "Contact",
+    "/ratesinsurance": "Rates & Insurance",
+    "/about": "About",
+    "/faqs": "FAQs",
+    "/adults-nutrition-counseling": "Adults",
+    "/teens-nutrition-counseling": "Teens"
+}
+
+# Keep only the named pages, with a friendly "Page Name" column
+def filter_named_pages(landing_page_summary):
+    filtered_summary = landing_page_summary[landing_page_summary["Page Path"].isin(PAGE_NAME_MAP.keys())]
+    return filtered_summary.assign(**{"Page Name": filtered_summary["Page Path"].map(PAGE_NAME_MAP)})
+
+# Build the page performance text that is sent to the LLM
+def build_page_summary_llm_text(landing_page_summary, token_budget=None):
+    filtered_summary = filter_named_pages(landing_page_summary)
+    # Only the contact page gets a conversion rate
+    filtered_summary = filtered_summary.assign(**{
+        "Conversion Rate (%)": filtered_summary["Conversion Rate (%)"].where(filtered_summary["Page Name"] == "Contact")
+    })
+    return render_report(
+        filtered_summary,
+        [
+            "Page Name",
+            ("Total_Visitors", "Visitors"),
+            "Sessions",
+            ("Avg_Session_Duration", "Average Session Duration", "{:.2f} seconds"),
+            ("Conversion Rate (%)", "Conversion Rate", "{}%"),
+        ],
+        style="fields", title="### Page Performance Summary\n", token_budget=token_budget,
+    ) + "\n\n"
 
+def generate_page_summary(landing_page_summary):
     # Filter the DataFrame to only include the specified pages
-    filtered_summary = landing_page_summary[landing_page_summary["Page Path"].isin(page_name_map.keys())]
-
-    # Rename Page Path to friendly names
-    filtered_summary["Page Name"] = filtered_summary["Page Path"].map(page_name_map)
+    filtered_summary = filter_named_pages(landing_page_summary)
 
-    # Initialize a summary string to track all page info for LLM
-    llm_summary = "### Page Performance Summary\n\n"
-
-    # Display summary for each relevant page and append to LLM summary
+    # Display summary for each relevant page
     for _, row in filtered_summary.iterrows():
         page_name = row["Page Name"]
         visitors = row["Total_Visitors"]
@@ -492,16 +681,6 @@ def generate_page_summary(landing_page_summary):
             f"{conversion_rate}",
             unsafe_allow_html=True
         )
-        
-        # Append to LLM summary
-        llm_summary += (
-            f"**{page_name}**: Visitors: {visitors}, "
-            f"Sessions: {sessions}, "
-            f"Average Session Duration: {avg_session_duration} seconds"
-        )
-        if page_name == "Contact":
-            llm_summary += f", Conversion Rate: {row['Conversion Rate (%)']}%"
-        llm_summary += "\n\n"
 
     # Store LLM summary in session state for later use
-    st.session_state["page_summary_llm"] = llm_summary
+    st.session_state["page_summary_llm"] = build_page_summary_llm_text(landing_page_summary)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+# GA4 reports these metric types as whole numbers; everything else is decoded as float
+INTEGER_METRIC_TYPES = {"TYPE_INTEGER"}
+
+
+def decode_report(response, dimension_columns, metric_columns):
+    """
+    Decode a GA4 RunReportResponse into a DataFrame with one typed column per dimension and metric.
+
+    The rows are walked once to collect every cell value into flat lists, and all metric cells are
+    converted to floats in one vectorized call instead of one pd.to_numeric per cell.
+    Dimension columns stay as strings; metric columns are float64, or int64 when GA4 reports
+    an integer metric (or, without headers, when every value is a whole number).
+    """
+    rows = response.rows
+    n_rows = len(rows)
+    n_dims = len(dimension_columns)
+    n_metrics = len(metric_columns)
+
+    # Flatten every cell value in a single pass over the rows
+    dimension_cells = [cell.value for row in rows for cell in row.dimension_values]
+    metric_cells = [cell.value for row in rows for cell in row.metric_values]
+
+    dimension_grid = np.array(dimension_cells, dtype=object).reshape(n_rows, n_dims)
+    metric_grid = _to_float(metric_cells).reshape(n_rows, n_metrics)
+    metric_types = _metric_types(response, n_metrics)
+
+    columns = {}
+    for i, name in enumerate(dimension_columns):
+        columns[name] = dimension_grid[:, i]
+    for i, name in enumerate(metric_columns):
+        columns[name] = _as_integer_if_whole(metric_grid[:, i], metric_types[i])
+
+    return pd.DataFrame(columns)
+
+
+def _to_float(cells):
+    # float() on the whole list runs in C; only fall back to coercion when GA4 sent a bad value
+    try:
+        return np.fromiter(map(float, cells), dtype=np.float64, count=len(cells))
+    except ValueError:
+        return pd.to_numeric(pd.Series(cells, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+
+
+def _metric_types(response, n_metrics):
+    # Metric headers are optional (e.g. on synthetic responses); None means "infer from values"
+    headers = list(getattr(response, "metric_headers", []) or [])
+    if len(headers) != n_metrics:
+        return [None] * n_metrics
+    return [getattr(header.type_, "name", str(header.type_)) for header in headers]
+
+
+def _as_integer_if_whole(values, metric_type):
+    if np.isnan(values).any():
+        return values
+    if metric_type is not None:
+        return values.astype(np.int64) if metric_type in INTEGER_METRIC_TYPES else values
+    # No header to go on: keep whole-number columns as integers, like pd.to_numeric does
+    return values.astype(np.int64) if np.array_equal(values, np.floor(values)) else values
@@ -1,26 +1,132 @@
 import streamlit as st
-from llm_integration import query_gpt_keywordbuilder, initialize_llm_context
+from llm_integration import complete, initialize_llm_context, stream_completion
+from structured_output import JSONItemStream, json_schema_format, repair_prompt, schema_errors
 import json
-import re
 import pandas as pd
 
 # Set page configuration
 st.set_page_config(page_title="Keyword Campaign Builder", layout="wide")
 
-def extract_json_like_content(response):
+# Shape of one generated keyword
+KEYWORD_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "Keyword": {"type": "string"},
+        "Ad Group": {"type": "string"},
+    },
+    "required": ["Keyword", "Ad Group"],
+    "additionalProperties": False,
+}
+
+# Structured output the model is asked for (strict mode rejects limits like item counts or minimum
+# lengths, so those are checked locally)
+KEYWORD_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "keywords": {"type": "array", "items": KEYWORD_ITEM_SCHEMA},
+    },
+    "required": ["keywords"],
+    "additionalProperties": False,
+}
+KEYWORD_PLAN_FORMAT = json_schema_format("keyword_plan", KEYWORD_PLAN_SCHEMA)
+
+AD_GROUP_COUNT = 3
+KEYWORDS_PER_AD_GROUP = 5
+
+# Repair attempts after the first answer before giving up
+MAX_KEYWORD_REPAIRS = 1
+
+KEYWORD_PROMPT = (
+    "Generate a list of exactly 15 paid search keywords grouped into 3 ad groups based on the following business description. "
+    "Each ad group should contain 5 keywords. "
+    'Return a JSON object whose "keywords" list holds one entry per keyword, each with the following structure: '
+    '{"Keyword": "Keyword 1", "Ad Group": "Ad Group 1"}. '
+    "Ensure that the only output is the JSON object with no additional text before or after."
+)
+
+def check_keyword_plan(plan):
     """
-    Extracts the content inside the first matched brackets: [ ... ].
-    Returns the content including the brackets.
+    Return every problem with a parsed keyword plan: schema violations, then blanks, ad group counts and duplicates.
+    """
+    errors = schema_errors(plan, KEYWORD_PLAN_SCHEMA)
+    if errors:
+        return errors
+
+    keywords = pd.DataFrame(plan["keywords"], columns=["Keyword", "Ad Group"])
+    blank = keywords["Keyword"].str.strip().eq("") | keywords["Ad Group"].str.strip().eq("")
+    errors.extend(f"$.keywords[{index}]: keyword and ad group must not be blank" for index in keywords.index[blank])
+    group_sizes = keywords.groupby("Ad Group").size()
+    if len(group_sizes) != AD_GROUP_COUNT:
+        errors.append(f"$.keywords: expected {AD_GROUP_COUNT} ad groups, got {len(group_sizes)}")
+    for ad_group, size in group_sizes.items():
+        if size != KEYWORDS_PER_AD_GROUP:
+            errors.append(f"$.keywords: ad group '{ad_group}' has {size} keywords, expected {KEYWORDS_PER_AD_GROUP}")
+    duplicates = keywords.loc[keywords["Keyword"].str.lower().duplicated(), "Keyword"]
+    errors.extend(f"$.keywords: keyword '{keyword}' appears more than once" for keyword in duplicates)
+    return errors
+
+def is_valid_keyword_plan(output):
+    """
+    Whether a model answer is a keyword plan that passes check_keyword_plan; only those are cached.
     """
     try:
-        # Use regex to find the first occurrence of [ ... ]
-        match = re.search(r"\[.*?\]", response, re.DOTALL)
-        if match:
-            return match.group(0)  # Return the matched string, including brackets
-        else:
-            return None
-    except Exception as e:
-        return None
+        return not check_keyword_plan(json.loads(output))
+    except ValueError:
+        return False
+
+def stream_keyword_plan(business_description, placeholder):
+    """
+    Stream the keyword plan, showing and validating each keyword as soon as it is complete.
+    Returns (output text, parsed plan or None, errors). A stream that stops looking like JSON is cut off early.
+    """
+    parser = JSONItemStream(item_depth=2)
+    items, errors = [], []
+    try:
+        for piece in stream_completion(
+            KEYWORD_PROMPT, business_description, label="keyword_plan", response_format=KEYWORD_PLAN_FORMAT,
+            validate=is_valid_keyword_plan,
+        ):
+            for item in parser.feed(piece):
+                errors.extend(schema_errors(item, KEYWORD_ITEM_SCHEMA, f"$.keywords[{len(items)}]"))
+                items.append(item)
+                placeholder.dataframe(pd.DataFrame(items), use_container_width=True)
+        plan = parser.result()
+    except ValueError as e:
+        # Covers malformed JSON (json.JSONDecodeError is a ValueError) as well as output that isn't JSON at all
+        return parser.text, None, [f"$: output is not valid JSON ({e})"]
+    return parser.text, plan, errors or check_keyword_plan(plan)
+
+def repair_keyword_plan(output, errors, business_description):
+    """
+    Ask the model to fix just the listed problems in its previous answer. Returns (output, plan or None, errors).
+    API errors propagate rather than being mistaken for an invalid answer.
+    """
+    repaired = complete(
+        prompt=repair_prompt(output, errors),
+        data_summary=business_description,
+        label="keyword_plan_repair",
+        response_format=KEYWORD_PLAN_FORMAT,
+        validate=is_valid_keyword_plan,
+    )
+    try:
+        plan = json.loads(repaired)
+    except json.JSONDecodeError as e:
+        return repaired, None, [f"$: output is not valid JSON ({e})"]
+    return repaired, plan, check_keyword_plan(plan)
+
+def generate_keyword_plan(business_description, placeholder):
+    """
+    Generate a validated keyword plan, repairing it in place rather than regenerating it from scratch.
+    Returns (keyword list or None, remaining errors).
+    """
+    output, plan, errors = stream_keyword_plan(business_description, placeholder)
+    for _ in range(MAX_KEYWORD_REPAIRS):
+        if not errors:
+            break
+        output, plan, errors = repair_keyword_plan(output, errors, business_description)
+    if errors:
+        return None, errors
+    return plan["keywords"], []
 
 def main():
     # Initialize LLM session context
@@ -43,36 +149,24 @@ def main():
     # Generate Keywords Button
     if st.button("Generate Keywords"):
         if business_description.strip():
-            # Query the LLM using the provided description
+            # Query the LLM using the provided description, showing keywords as they arrive
             with st.spinner("Generating keyword suggestions..."):
-                llm_response = query_gpt_keywordbuilder(
-                    prompt=(
-                        "Generate a list of exactly 15 paid search keywords grouped into 3 ad groups based on the following business description. "
-                        "Each ad group should contain 5 keywords. "
-                        "Return the response as a JSON-formatted list of dictionaries, where each dictionary has the following structure: "
-                        '{"Keyword": "Keyword 1", "Ad Group": "Ad Group 1"}. '
-                        "Ensure that the only output is the JSON list of dictionaries with no additional text before or after."
-                    ),
-                    data_summary=business_description
-                )
-
-            # Extract content inside brackets
-            extracted_json = extract_json_like_content(llm_response)
-
-            if extracted_json:
                 try:
-                    keyword_list = json.loads(extracted_json)  # Parse JSON
-                    st.session_state["keywords_df"] = pd.DataFrame(keyword_list)  # Save DataFrame in session state
-                    st.session_state["keyword_checkboxes"] = {
-                        f"{kw} ({ad})": True for kw, ad in zip(
-                            st.session_state["keywords_df"]["Keyword"],
-                            st.session_state["keywords_df"]["Ad Group"]
-                        )
-                    }  # Initialize checkbox states
-                except json.JSONDecodeError:
-                    st.error("Failed to parse the extracted content as JSON. Please check the output.")
-            else:
-                st.error("Could not extract content inside brackets. Please check the LLM response.")
+                    keyword_list, errors = generate_keyword_plan(business_description, st.empty())
+                except Exception as e:
+                    keyword_list, errors = None, None
+                    st.error(f"The keyword request to the AI service failed: {e}")
+
+            if keyword_list:
+                st.session_state["keywords_df"] = pd.DataFrame(keyword_list)  # Save DataFrame in session state
+                st.session_state["keyword_checkboxes"] = {
+                    f"{kw} ({ad})": True for kw, ad in zip(
+                        st.session_state["keywords_df"]["Keyword"],
+                        st.session_state["keywords_df"]["Ad Group"]
+                    )
+                }  # Initialize checkbox states
+            elif errors:
+                st.error("Could not generate a valid keyword list: " + "; ".join(errors))
 
     # Display and allow editing of keywords if they exist in session state
     if "keywords_df" in st.session_state:
@@ -1,46 +1,59 @@
 import pandas as pd
-from google.ads.googleads.client import GoogleAdsClient
-from google.ads.googleads.errors import GoogleAdsException
 import streamlit as st
+from clients import get_google_ads_client
+from data_cache import cached_fetch
+from scheduler import scheduled_call
+from tenants import resolve_tenant
 
-def fetch_keyword_data(customer_id, location_ids, language_id, page_url):
-    # Load credentials from Streamlit secrets
-    credentials_dict = {
-        "developer_token": st.secrets["google_ads"]["developer_token"],
-        "client_id": st.secrets["google_ads"]["client_id"],
-        "client_secret": st.secrets["google_ads"]["client_secret"],
-        "refresh_token": st.secrets["google_ads"]["refresh_token"],
-        "login_customer_id": None,  # Optional for test accounts
-        "use_proto_plus": True
-    }
-    
+def fetch_keyword_data(customer_id=None, location_ids=None, language_id=None, page_url=None, tenant=None):
+    from google.ads.googleads.errors import GoogleAdsException
+
+    # The tenant's Ads customer and website unless given
+    tenant = resolve_tenant(tenant)
+    customer_id = customer_id or tenant.ads_customer_id
+    page_url = page_url or tenant.site_url
+    if not customer_id:
+        raise ValueError(f"Tenant '{tenant.id}' has no ads_customer_id configured.")
+    try:
+        return _fetch_keyword_data(customer_id, location_ids, language_id, page_url, tenant=tenant)
+    except GoogleAdsException as ex:
+        st.error(f"GoogleAdsException occurred: {ex}")
+        return pd.DataFrame()  # Return an empty DataFrame on failure
+
+# Only successful pulls are cached; failures raise before reaching the cache
+@cached_fetch("google_ads")
+def _fetch_keyword_data(customer_id, location_ids, language_id, page_url):
     # Location and language constants (New York, NY and English as defaults)
     location_ids = ["1014044"]
     language_id = "1000"  # English
 
     # Website URL for generating keyword ideas
-    try:
-        client = GoogleAdsClient.load_from_dict(credentials_dict, version="v18")
-
-        # KeywordPlanIdeaService
-        keyword_plan_idea_service = client.get_service("KeywordPlanIdeaService")
-
-        # Create request
-        request = client.get_type("GenerateKeywordIdeasRequest")
-        request.customer_id = customer_id
-        request.language = client.get_service("GoogleAdsService").language_constant_path(language_id)
-        request.geo_target_constants.extend([
-            client.get_service("GeoTargetConstantService").geo_target_constant_path(location_id)
-            for location_id in location_ids
-        ])
-        request.url_seed.url = page_url
-
-        # Fetch keyword ideas
-        response = keyword_plan_idea_service.generate_keyword_ideas(request=request)
-
-        # Collect data
-        data = []
-        for idea in response:
+    client = get_google_ads_client()
+
+    # KeywordPlanIdeaService
+    keyword_plan_idea_service = client.get_service("KeywordPlanIdeaService")
+
+    # Create request
+    request = client.get_type("GenerateKeywordIdeasRequest")
+    request.customer_id = customer_id
+    request.language = client.get_service("GoogleAdsService").language_constant_path(language_id)
+    request.geo_target_constants.extend([
+        client.get_service("GeoTargetConstantService").geo_target_constant_path(location_id)
+        for location_id in location_ids
+    ])
+    request.url_seed.url = page_url
+
+    # Fetch keyword ideas one page at a time, each page through the scheduler (iterating the pager itself
+    # would fetch the later pages behind its back); the scheduler retries, so the client's own retries are off
+    data = []
+    while True:
+        page = scheduled_call(
+            "google_ads", keyword_plan_idea_service.generate_keyword_ideas, request=request, retry=None,
+            timeout_arg="timeout"
+        )
+
+        # Collect data (results holds only this page's ideas)
+        for idea in page.results:
             metrics = idea.keyword_idea_metrics
             data.append({
                 "Keyword": idea.text,
@@ -49,11 +62,10 @@ def fetch_keyword_data(customer_id, location_ids, language_id, page_url):
                 "Low Top of Page Bid (micros)": metrics.low_top_of_page_bid_micros,
                 "High Top of Page Bid (micros)": metrics.high_top_of_page_bid_micros
             })
+        if not page.next_page_token:
+            break
+        request.page_token = page.next_page_token
 
-        # Convert to DataFrame
-        return pd.DataFrame(data)
-
-    except GoogleAdsException as ex:
-        st.error(f"GoogleAdsException occurred: {ex}")
-        return pd.DataFrame()  # Return an empty DataFrame on failure
+    # Convert to DataFrame
+    return pd.DataFrame(data)
 
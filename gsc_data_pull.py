@@ -1,80 +1,332 @@
+import os
+import re
+import numpy as np
 import pandas as pd
-from googleapiclient.discovery import build
 from datetime import datetime, timedelta
-from google.oauth2 import service_account
 import streamlit as st
+from clients import get_search_console_service
+from data_cache import cached_fetch
+from query_index import QueryIndex
+from report_text import render_report
+from scheduler import scheduled_call
+from text_utils import load_stopwords
+from tenants import resolve_tenant, use_tenant
+from token_counter import count_tokens
+from warehouse import DateWarehouse, resolve_ga4_date
 
-# Define the Google Search Console property URL
-PROPERTY_URL = 'https://www.chelseawnutrition.com/'  # Replace with your actual website URL in Search Console
+# Token budget for the search query digest sent to the LLM
+SEO_QUERY_TOKEN_BUDGET = 600
 
-# Load the service account credentials from Streamlit secrets
-credentials = service_account.Credentials.from_service_account_info(
-    st.secrets["google_service_account"],
-    scopes=['https://www.googleapis.com/auth/webmasters.readonly']
-)
+# How many impressions one click is worth when ranking queries
+CLICK_WEIGHT = 20
 
-# Initialize the Google Search Console service
-service = build('searchconsole', 'v1', credentials=credentials)
+# Representative queries listed for each topic cluster
+QUERIES_PER_CLUSTER = 3
+
+_QUERY_WORD = re.compile(r"[a-z0-9]+")
+
+# Rows per Search Analytics request; 25,000 is the most the API returns in one page
+GSC_PAGE_ROWS = 25000
+
+# DataFrame column for each Search Analytics dimension the app can pull
+GSC_DIMENSION_COLUMNS = {
+    "query": "Search Query",
+    "page": "Page",
+    "date": "Date",
+    "device": "Device",
+    "country": "Country",
+}
+
+# DataFrame columns for the metrics every Search Analytics row carries
+GSC_METRIC_COLUMNS = ['Impressions', 'Clicks', 'CTR', 'Avg. Position']
+
+# First day pulled when no start date is given
+GSC_HISTORY_START = "2024-01-01"
+
+# Cache key for Search Console pulls, with the default date range filled in
+def _search_console_cache_key(start_date=None, end_date=None):
+    if not start_date:
+        return (GSC_HISTORY_START, datetime.today().strftime('%Y-%m-%d'))
+    return (start_date, end_date.strftime('%Y-%m-%d'))
+
+def _format_date(value):
+    return value if isinstance(value, str) else value.strftime('%Y-%m-%d')
+
+# Build the Search Analytics request body for one page of results
+def build_search_console_request(start_date, end_date, dimensions=("query",), start_row=0,
+                                 row_limit=GSC_PAGE_ROWS, search_type="web"):
+    return {
+        'startDate': _format_date(start_date),
+        'endDate': _format_date(end_date),
+        'dimensions': list(dimensions),
+        'searchType': search_type,
+        'rowLimit': row_limit,
+        'startRow': start_row,
+    }
+
+# Decode one page of Search Analytics rows into typed columns (Date stays as the API's YYYY-MM-DD string)
+def decode_search_console_rows(rows, dimensions=("query",)):
+    columns = {}
+    for i, dimension in enumerate(dimensions):
+        columns[GSC_DIMENSION_COLUMNS[dimension]] = np.array([row['keys'][i] for row in rows], dtype=object)
+    # Impressions and clicks come back as JSON numbers that are always whole
+    columns['Impressions'] = np.fromiter((row.get('impressions', 0) for row in rows), dtype=np.int64, count=len(rows))
+    columns['Clicks'] = np.fromiter((row.get('clicks', 0) for row in rows), dtype=np.int64, count=len(rows))
+    columns['CTR'] = np.fromiter((row.get('ctr', 0) for row in rows), dtype=np.float64, count=len(rows))
+    columns['Avg. Position'] = np.fromiter((row.get('position', 0) for row in rows), dtype=np.float64, count=len(rows))
+    return pd.DataFrame(columns)
+
+# Page through Search Analytics with startRow, one decoded chunk at a time
+def iter_search_console_pages(start_date, end_date, dimensions=("query",), search_type="web", page_rows=GSC_PAGE_ROWS,
+                              tenant=None):
+    """
+    Yield typed DataFrame chunks of at most page_rows rows until the API runs out of rows, so the
+    long tail of a large property is fetched in full without holding every raw response at once.
+    Several dimensions (e.g. query, page, date, device) can be broken down in the same pass.
+    Pulls the tenant's Search Console site (the current tenant's by default).
+    """
+    unknown = [dimension for dimension in dimensions if dimension not in GSC_DIMENSION_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown Search Console dimensions: {', '.join(unknown)}")
+
+    tenant = resolve_tenant(tenant)
+    with use_tenant(tenant):
+        service = get_search_console_service()
+
+    start_row = 0
+    while True:
+        request = build_search_console_request(start_date, end_date, dimensions, start_row, page_rows, search_type)
+        query = service.searchanalytics().query(siteUrl=tenant.gsc_site_url, body=request)
+        rows = scheduled_call("gsc", query.execute).get('rows', [])
+        if not rows:
+            return
+
+        yield decode_search_console_rows(rows, dimensions)
+
+        # A short page is the last one
+        if len(rows) < page_rows:
+            return
+        start_row += len(rows)
+
+# Reports kept per day in the local Search Console store, by table name, smallest first. Query totals
+# need their own report: GSC counts a query once per search, but once per page in query_page rows
+GSC_STORE_REPORTS = {
+    "query": ("date", "query"),
+    "query_page": ("date", "query", "page"),
+}
+
+# Longest span of days fetched and stored in one go, so a first sync over the whole history is written
+# (and can be resumed) a month at a time instead of as one huge run
+GSC_SYNC_SPAN_DAYS = 31
+
+# Local store of Search Console days per tenant site; GSC finalizes a day about SETTLE_DAYS after it ends,
+# so the store re-pulls recent days until then and never touches older ones again
+_warehouses = {}
+
+def get_gsc_warehouse(tenant=None):
+    tenant = resolve_tenant(tenant)
+    site_url = tenant.gsc_site_url
+    if (tenant.id, site_url) not in _warehouses:
+        name = re.sub(r"[^a-z0-9]+", "_", site_url.lower()).strip("_")
+        _warehouses[tenant.id, site_url] = DateWarehouse(os.path.join(tenant.data_dir, f"gsc_{name}.sqlite"))
+    return _warehouses[tenant.id, site_url]
+
+# The smallest stored report that can be grouped by the given dimensions
+def _store_report(by):
+    for report, dimensions in GSC_STORE_REPORTS.items():
+        if set(by) <= set(dimensions):
+            return report
+    raise ValueError(f"No stored Search Console report has the dimensions {', '.join(by)}.")
+
+# Pull any missing or still-settling days in the range into the local store
+def sync_search_console(start_date, end_date, tenant=None, report="query"):
+    """
+    Make sure the local store holds every day between start_date and end_date for the given report
+    (see GSC_STORE_REPORTS), fetching only the days it is missing (or that GSC may still revise),
+    at most GSC_SYNC_SPAN_DAYS at a time. Returns the range resolved to datetime.date.
+    """
+    start, end = resolve_ga4_date(start_date), resolve_ga4_date(end_date)
+    warehouse = get_gsc_warehouse(tenant)
+    dimensions = GSC_STORE_REPORTS[report]
+    for run_start, run_end in warehouse.missing_runs(report, start, end, max_days=GSC_SYNC_SPAN_DAYS):
+        chunks = iter_search_console_pages(run_start, run_end, dimensions=dimensions, tenant=tenant)
+        warehouse.store(report, chunks, run_start, run_end)
+    return start, end
+
+def aggregate_search_console(start_date, end_date, by=("query",), tenant=None):
+    """
+    Totals for any date range, grouped by any of the stored dimensions (query, page, date), computed
+    from the smallest stored report that has them. Impressions and clicks are summed; CTR and position
+    are recomputed from the totals, with position weighted by impressions as Search Console does.
+    """
+    report = _store_report(by)
+    start, end = sync_search_console(start_date, end_date, tenant, report)
+    columns = [GSC_DIMENSION_COLUMNS[dimension] for dimension in by]
+    totals = get_gsc_warehouse(tenant).aggregate(report, start, end, columns, {
+        "Impressions": '"Impressions"',
+        "Clicks": '"Clicks"',
+        "Weighted Position": '"Avg. Position" * "Impressions"',
+    })
+    if totals is None or totals.empty:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in columns}).assign(
+            Impressions=pd.Series(dtype="int64"), Clicks=pd.Series(dtype="int64"),
+            CTR=pd.Series(dtype="float64"), **{"Avg. Position": pd.Series(dtype="float64")},
+        )
+
+    impressions = totals["Impressions"].where(totals["Impressions"] > 0)
+    totals["CTR"] = (totals["Clicks"] / impressions).fillna(0.0)
+    totals["Avg. Position"] = (totals["Weighted Position"] / impressions).fillna(0.0)
+    return totals.drop(columns="Weighted Position").sort_values(
+        ["Clicks", "Impressions"], ascending=False, ignore_index=True
+    )
 
 # Define a function to fetch Google Search Console data
+@cached_fetch("gsc", key_func=_search_console_cache_key)
 def fetch_search_console_data(start_date=None, end_date=None):
-    # Default to last 30 days if no date range is provided
+    # Default to everything since GSC_HISTORY_START if no date range is provided
     if not start_date:
         end_date = datetime.today()
-        start_date = "2024-01-01"
-    
-    # Format dates as strings for the API
-    start_date_str = start_date
-    end_date_str = end_date.strftime('%Y-%m-%d')
-
-    # Create the request payload
-    request = {
-        'startDate': start_date_str,
-        'endDate': end_date_str,
-        'dimensions': ['query'],  # Break down by search query
-        'searchType': 'web',
-        'rowLimit': 1000  # Adjust if needed, max 25,000 per call
-    }
-    
-    # Run the query
-    response = service.searchanalytics().query(siteUrl=PROPERTY_URL, body=request).execute()
-    
-    # Parse response into a list of rows
-    rows = []
-    for row in response.get('rows', []):
-        query = row['keys'][0]
-        impressions = row.get('impressions', 0)
-        clicks = row.get('clicks', 0)
-        ctr = row.get('ctr', 0)
-        position = row.get('position', 0)
-        rows.append([query, impressions, clicks, ctr, position])
-    
-    # Load the data into a DataFrame
-    df = pd.DataFrame(rows, columns=['Search Query', 'Impressions', 'Clicks', 'CTR', 'Avg. Position'])
-    return df
+        start_date = GSC_HISTORY_START
+
+    # Per-query totals from the local store, which only pulls the days it doesn't have yet
+    return aggregate_search_console(start_date, end_date, by=("query",))
+
+
+# The query totals together with a QueryIndex over their queries, cached under the same key as the
+# pull itself so the index is built once per pull instead of hashing the queries on every keystroke
+@cached_fetch("gsc", key_func=_search_console_cache_key)
+def fetch_search_console_index(start_date=None, end_date=None):
+    search_data = fetch_search_console_data(start_date, end_date)
+    return search_data, QueryIndex(search_data["Search Query"])
 
 
 # Function to create a summary of the top 30 search queries for LLM consumption
-def summarize_search_queries(search_data):
-    # Ensure necessary columns are present
-    if not all(col in search_data.columns for col in ["Search Query", "Impressions", "Clicks", "Avg. Position"]):
-        raise ValueError("Data does not contain required columns.")
-
-    # Sort by Avg. Position and select top 30
-    top_queries = search_data.sort_values(by="Avg. Position").head(30)
-    top_queries["Avg. Position"] = top_queries["Avg. Position"].round(0).astype(int)
-    
-    # Format the summary as a readable text
-    summary = "Top 30 Search Queries Summary:\n"
-    summary += "Query | Impressions | Clicks | Avg. Position\n"
-    summary += "-" * 50 + "\n"
-
-    for _, row in top_queries.iterrows():
-        query = row["Search Query"]
-        impressions = row["Impressions"]
-        clicks = row["Clicks"]
-        avg_position = row["Avg. Position"]
-        
-        summary += f"{query} | {impressions} | {clicks} | {avg_position},\n"
-    
-    return summary
+def summarize_search_queries(search_data, top=30, token_budget=None):
+    # The best-ranked queries, picked without sorting every row
+    return render_report(
+        search_data,
+        [("Search Query", "Query"), "Impressions", "Clicks", ("Avg. Position", "Avg. Position", "{:.0f}")],
+        title=f"Top {top} Search Queries Summary:",
+        by="Avg. Position", top=top, ascending=True, token_budget=token_budget,
+    ) + "\n"
+
+
+def group_queries_by_head_term(search_data, index=None, positions=None):
+    """
+    Group queries by the longest phrase they share with other queries (e.g. every "dietitian near me"
+    variant), with each group's query count and summed impressions and clicks, largest groups first.
+    Queries that share no phrase with another are left out.
+    index is a QueryIndex over search_data's queries (built here if not given); positions limits the
+    groups to those rows (e.g. the ones matching a filter), keeping groups that still have two or more.
+    """
+    index = index if index is not None else QueryIndex(search_data["Search Query"])
+    groups = index.head_terms()
+    if positions is not None:
+        groups = {head: np.intersect1d(ids, positions, assume_unique=True) for head, ids in groups.items()}
+        groups = dict(sorted(((head, ids) for head, ids in groups.items() if len(ids) >= 2),
+                             key=lambda item: (-len(item[1]), item[0])))
+    rows = []
+    for head_term, positions in groups.items():
+        members = search_data.iloc[positions]
+        rows.append([head_term, len(members), members["Impressions"].sum(), members["Clicks"].sum(),
+                     "; ".join(members["Search Query"].head(QUERIES_PER_CLUSTER))])
+    return pd.DataFrame(rows, columns=["Head Term", "Queries", "Impressions", "Clicks", "Examples"])
+
+
+# Reduce a query to its sorted content words, so reorderings, plurals and filler words compare equal
+def _normalize_query(query, stopwords):
+    words = set()
+    for word in _QUERY_WORD.findall(query.lower()):
+        if word in stopwords:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return " ".join(sorted(words)) or query.lower().strip()
+
+
+def dedupe_search_queries(search_data):
+    """
+    Merge near-identical queries (same content words regardless of order, case, punctuation or plurals).
+    Each group keeps its highest-impression wording, summed impressions and clicks, an impression-weighted
+    average position, a Score (impressions plus CLICK_WEIGHT per click) and its normalized Words.
+    """
+    stopwords = load_stopwords()
+    data = search_data.assign(
+        Words=search_data["Search Query"].map(lambda query: _normalize_query(query, stopwords)),
+        **{"Weighted Position": search_data["Avg. Position"] * search_data["Impressions"]},
+    ).sort_values("Impressions", ascending=False)
+
+    deduped = data.groupby("Words", sort=False).agg(
+        **{
+            "Search Query": ("Search Query", "first"),
+            "Impressions": ("Impressions", "sum"),
+            "Clicks": ("Clicks", "sum"),
+            "Weighted Position": ("Weighted Position", "sum"),
+            "Avg. Position": ("Avg. Position", "mean"),
+        }
+    ).reset_index()
+    has_impressions = deduped["Impressions"] > 0
+    deduped.loc[has_impressions, "Avg. Position"] = (
+        deduped.loc[has_impressions, "Weighted Position"] / deduped.loc[has_impressions, "Impressions"]
+    )
+    deduped["Score"] = deduped["Impressions"] + CLICK_WEIGHT * deduped["Clicks"]
+    return deduped.drop(columns="Weighted Position").sort_values("Score", ascending=False, ignore_index=True)
+
+
+def cluster_search_queries(deduped):
+    """
+    Assign each deduplicated query to a topic: its content word with the highest total Score across
+    all queries (the head term it shares with the most valuable neighbours). Adds a "Topic" column.
+    """
+    words = deduped["Words"].str.split().explode()
+    word_scores = deduped.loc[words.index, "Score"].groupby(words.values).sum()
+    candidates = pd.DataFrame({"Word": words.values, "Word Score": words.map(word_scores).values}, index=words.index)
+    head_terms = candidates.sort_values("Word Score", ascending=False).groupby(level=0)["Word"].first()
+    return deduped.assign(Topic=head_terms)
+
+
+def compact_search_queries(search_data, token_budget=SEO_QUERY_TOKEN_BUDGET):
+    """
+    Digest of the search queries for an LLM prompt that stays within token_budget however many queries there are:
+    near-duplicates merged, queries grouped into topics, and topics listed by value with their totals and best
+    queries until the budget runs out.
+    """
+    if search_data.empty:
+        return "No search queries yet."
+
+    clustered = cluster_search_queries(dedupe_search_queries(search_data))
+    clustered["Weighted Position"] = clustered["Avg. Position"] * clustered["Impressions"]
+    topics = clustered.groupby("Topic").agg(
+        Queries=("Search Query", "size"),
+        Impressions=("Impressions", "sum"),
+        Clicks=("Clicks", "sum"),
+        Score=("Score", "sum"),
+        **{"Weighted Position": ("Weighted Position", "sum")},
+    ).sort_values("Score", ascending=False)
+    topics["Avg. Position"] = topics["Weighted Position"] / topics["Impressions"].where(topics["Impressions"] > 0)
+    top_queries = clustered.groupby("Topic")["Search Query"].agg(lambda queries: list(queries[:QUERIES_PER_CLUSTER]))
+
+    header = "Topic | Queries | Impressions | Clicks | Avg. Position | Top queries"
+    lines, used = [header], count_tokens(header)
+    # Keep room for the closing line about what didn't fit
+    budget = token_budget - count_tokens("(+000000 more queries in 00000 smaller topics)")
+    for topic, queries_count, impressions, clicks, position in zip(
+        topics.index, topics["Queries"], topics["Impressions"], topics["Clicks"], topics["Avg. Position"]
+    ):
+        position = f"{position:.0f}" if pd.notna(position) else "-"
+        stats = f"{topic} | {queries_count} | {impressions} | {clicks} | {position} | "
+        queries = top_queries[topic]
+        line = stats + "; ".join(queries)
+        if used + count_tokens(line) > budget:
+            line = stats + queries[0]
+            if used + count_tokens(line) > budget:
+                break
+        lines.append(line)
+        used += count_tokens(line)
+
+    shown = len(lines) - 1
+    if shown < len(topics):
+        remaining = topics.iloc[shown:]
+        lines.append(f"(+{remaining['Queries'].sum()} more queries in {len(remaining)} smaller topics)")
+    return "\n".join(lines)
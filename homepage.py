@@ -1,39 +1,51 @@
-import openai
+import time
 import streamlit as st
 import pandas as pd
 from datetime import date, timedelta
-from ga4_data_pull import *
-from gsc_data_pull import *
-from llm_integration import *
-from urllib.parse import quote
+from ga4_data_pull import (
+    DASHBOARD_PERIODS, build_page_summary_llm_text, compare_periods, describe_top_sources, fetch_dashboard_reports,
+    generate_all_metrics_copy, generate_page_summary, plot_acquisition_pie_chart_plotly, resolve_periods,
+    slice_period, summarize_landing_pages,
+)
+from gsc_data_pull import (
+    compact_search_queries, fetch_search_console_data, fetch_search_console_index, group_queries_by_head_term,
+)
+from llm_integration import (
+    STREAM_REFRESH_SECONDS, initialize_llm_context, query_gpt, record_transcript_entries, submit_gpt_stream,
+)
+from llm_metrics import render_llm_debug_panel
+from report_text import render_report
+from scheduler import current_deadline, request_deadline
+from task_graph import TaskGraph
+from tenants import TENANT_SELECTOR, current_tenant, select_tenant, tenant_link_params, use_tenant
+from urllib.parse import quote, urlencode
 
 # Page configuration
 st.set_page_config(page_title="BizBuddy", layout="wide", page_icon = "🤓")
 
 st.markdown("<h1 style='text-align: center;'>Welcome to BizBuddy: Let's Grow Your Digital Presence</h1>", unsafe_allow_html=True)
 
-def generate_seo_insights(search_data):
-   # Prepare the search query list
-   query_list = search_data["Search Query"].unique()
-   formatted_queries = "\n".join(query_list)
+# Build the LLM prompt for SEO suggestions from the search queries
+def build_seo_prompt(search_data):
+   # Compact the search queries into a topic digest that fits the prompt's token budget
+   formatted_queries = compact_search_queries(search_data)
 
    # Define the prompt for the LLM
    prompt = (
-   "Here are the search queries this website currently appears for:\n"
+   "Here are the search queries this website currently appears for, grouped by topic and ranked by impressions and clicks:\n"
    f"{formatted_queries}\n\n"
    "Based on this data, please provide the following, make sure to bold any suggested keywords:\n"
    "- Target search terms that align with the website's goals.\n"
    "- New niche ideas for search terms that could improve conversions.\n"
    "- A brief explanation of why SEO optimization is critical for this business."
    )
+   return prompt
 
+def generate_seo_insights(search_data):
    # Call the LLM using query_gpt
-   response = query_gpt(prompt)
+   response = query_gpt(build_seo_prompt(search_data))
    return response
    
-# Initialize LLM context with business context on app load
-initialize_llm_context()
-
 # Generate and display each summary with LLM analysis
 def display_report_with_llm(summary_func, llm_prompt):
    # Generate summary
@@ -44,98 +56,218 @@ def display_report_with_llm(summary_func, llm_prompt):
    return llm_response
 
 
-def main():
-    # Fetch data for the last 30 days (from 30 days ago to yesterday)
-    start_date_30_days = "30daysAgo"
-    end_date_yesterday = "yesterday"
+# LLM prompts for the dashboard insight sections
+GA_LLM_PROMPT = """
+           Based on the following website performance metrics, provide a short analysis. Highlight key improvements, areas needing attention, 
+           and how these metrics compare to typical industry standards. Limit your response to 2-3 bullet points.
+           """
 
-    df_30_days = fetch_metrics_by_source(start_date_30_days, end_date_yesterday)
-    
-    # Fetch data for the last month (from 60 days ago to 30 days ago)
-    start_date_60_days = "60daysAgo"
-    end_date_30_days = "31daysAgo"
+PAGE_LLM_PROMPT = "Provide insights based on the following page performance data, note that there is no CTAs on any page besides the Home. We need to think of ways to drive more people to the contact page. State only the bullets, no pre text. Limit your response to 2-3 bullet points:"
 
-    df_60_to_30_days = fetch_metrics_by_source(start_date_60_days, end_date_30_days)
 
-    # Fetch event data (generate leads)
-    event_data = fetch_metrics_by_event(start_date_30_days, end_date_yesterday)  # Add this line to fetch event data
+# Combine a metric summary into a string for LLM processing
+def build_metric_summary_text(summary_df):
+    return render_report(summary_df, ["Metric", "Value"], style="plain")
 
-    lp_df_30_days = fetch_metrics_by_landing_page(start_date_30_days, end_date_yesterday)
-   
-    # First column - GA4 Metrics and Insights
-    col1, col2 = st.columns(2)
+
+# Start every data pull and LLM call for the dashboard as soon as its inputs are ready
+def start_dashboard_tasks(regenerate=False):
+    """
+    Build the dashboard's task graph: GA4 and Search Console pulls start immediately and in parallel,
+    summaries start when their reports arrive, and each LLM insight starts when its summary is ready.
+    The insight calls are independent: each one sends the business context (these are the first
+    questions of every session, so reruns hit the LLM response cache) and returns its transcript entry
+    instead of appending it, so main() can merge the entries in a fixed order.
+    regenerate skips the cache and asks the model again.
+    """
+    graph = TaskGraph()
+    context = current_tenant().business_context
+
+    # External data pulls (independent of each other)
+    graph.add("reports", fetch_dashboard_reports)
+    graph.add("search_data", fetch_search_console_data)
+
+    # Split the 60-day pull into this month and last month and summarize both together
+    periods = resolve_periods(DASHBOARD_PERIODS)
+    graph.add(
+        "comparison",
+        lambda reports: compare_periods(reports["source_60_days"], reports["event_60_days"], periods),
+        deps=["reports"],
+    )
+
+    # Landing page summary, using lead events for the last 30 days
+    graph.add(
+        "landing_page_summary",
+        lambda reports: summarize_landing_pages(
+            reports["landing_page_30_days"], slice_period(reports["event_60_days"], periods["current"])
+        ),
+        deps=["reports"],
+    )
+
+    # LLM insights, each returning a StreamingAnswer that fills in as the model answers
+    graph.add(
+        "ga_insights",
+        lambda comparison: submit_gpt_stream(
+            GA_LLM_PROMPT, build_metric_summary_text(comparison["current"][0]), context, regenerate, label="ga_insights"
+        ),
+        deps=["comparison"],
+    )
+    graph.add(
+        "page_insights",
+        lambda landing_page_summary: submit_gpt_stream(
+            PAGE_LLM_PROMPT, build_page_summary_llm_text(landing_page_summary), context, regenerate, label="page_insights"
+        ),
+        deps=["landing_page_summary"],
+    )
+    graph.add(
+        "seo_insights",
+        lambda search_data: submit_gpt_stream(
+            build_seo_prompt(search_data), "", context, regenerate, label="seo_insights"
+        ),
+        deps=["search_data"],
+    )
+    return graph
+
+
+# Seconds the dashboard's data pulls and LLM calls have to start (including queueing and retries)
+DASHBOARD_DEADLINE_SECONDS = 120
+
+# Order in which insight answers are added to the session transcript, whatever order they finish in
+INSIGHT_TASKS = ["ga_insights", "page_insights", "seo_insights"]
+
+
+def stream_insights(graph, slots, seo_link_slot, deadline):
+    """
+    Draw each insight into its slot as the model writes it, until all are done or the deadline
+    (a time.monotonic() value) passes. A task that failed or ran out of time gets an error in its
+    slot instead. Returns {task name: transcript entry} for the insights that finished.
+    """
+    streams, drawn, entries, pending = {}, {}, {}, list(INSIGHT_TASKS)
+    while pending and time.monotonic() < deadline:
+        for name in list(pending):
+            try:
+                if name not in streams:
+                    if not graph.done(name):
+                        continue
+                    streams[name] = graph.result(name)
+                stream = streams[name]
+                if not stream.done():
+                    if stream.text and stream.text != drawn.get(name):
+                        drawn[name] = stream.text
+                        slots[name].markdown(stream.text + "▌")
+                    continue
+                answer, entries[name] = stream.result()
+            except Exception as e:
+                slots[name].error(f"Couldn't generate these insights: {e}")
+                pending.remove(name)
+                continue
+            slots[name].markdown(answer)
+            pending.remove(name)
+            if name == "seo_insights":
+                params = urlencode({"message": str(answer), **tenant_link_params()}, quote_via=quote)
+                seo_url = f"https://bizbuddyv1-seobuddy.streamlit.app?{params}"
+                seo_link_slot.link_button("Check Out our SEO Helper!!", seo_url)
+        if pending:
+            time.sleep(STREAM_REFRESH_SECONDS)
+
+    for name in pending:
+        slots[name].error("These insights took too long to generate. Try reloading the page.")
+    return entries
+
+
+def main():
+    # Start the LLM session memory from this tenant's business context
+    initialize_llm_context()
+
+    # Kick off every GA4, Search Console and LLM call up front; sections render as their data arrives
+    regenerate = st.button("Regenerate insights")
+    with request_deadline(DASHBOARD_DEADLINE_SECONDS):
+        graph = start_dashboard_tasks(regenerate)
+        deadline = current_deadline()
+
+    # Leaving the block shuts the task graph down, also when a section fails to render
+    with graph:
+        # First column - GA4 Metrics and Insights
+        col1, col2 = st.columns(2)
    
-    with col1:
-        st.markdown("<h3 style='text-align: center;'>Web Performance Overview</h3>", unsafe_allow_html=True)
+        with col1:
+            st.markdown("<h3 style='text-align: center;'>Web Performance Overview</h3>", unsafe_allow_html=True)
 
-        # Fetch event data (generate leads)
-        last_month_event_data = fetch_metrics_by_event(start_date_60_days, start_date_30_days)  # Add this line to fetch event data
-        
-        # Summarize monthly data with leads now included (for the 30 days data)
-        current_summary = summarize_monthly_data(df_30_days, event_data)[0]
-        last_month_summary = summarize_last_month_data(df_60_to_30_days, last_month_event_data)[0]
+            comparison = graph.result("comparison")
+            current_summary = comparison["current"][0]
+            last_month_summary = comparison["previous"][0]
+            current_acquisition_summary = comparison["current"][1]
        
-        # Display GA4 metrics (Updated with the new leads data)
-        generate_all_metrics_copy(current_summary, last_month_summary)
-        
-        # LLM insights based on GA data
-        ga_llm_prompt = """
-           Based on the following website performance metrics, provide a short analysis. Highlight key improvements, areas needing attention, 
-           and how these metrics compare to typical industry standards. Limit your response to 2-3 bullet points.
-           """
-        
-        # Combine current summary into a string for LLM processing
-        metric_summary_text = "\n".join([f"{row['Metric']}: {row['Value']}" for _, row in current_summary.iterrows()])
-        ga_insights = query_gpt(ga_llm_prompt, metric_summary_text)
+            # Display GA4 metrics (Updated with the new leads data)
+            generate_all_metrics_copy(current_summary, last_month_summary)
         
-        st.markdown("### Insights from AI")
-        st.markdown(ga_insights)
-
-    # Second column - Acquisition Overview (with Pie Chart and Source Descriptions)
-    with col2:
-        st.markdown("<h3 style='text-align: center;'>Acquisition Overview</h3>", unsafe_allow_html=True)
-        acq_col1, acq_col2 = st.columns(2)
-    with acq_col1:
-        plot_acquisition_pie_chart_plotly(summarize_monthly_data(df_30_days, event_data)[1])
-    with acq_col2:
-        describe_top_sources(summarize_monthly_data(df_30_days, event_data)[1])
+            # LLM insights based on GA data (filled in once the model answers)
+            st.markdown("### Insights from AI")
+            ga_insights_slot = st.empty()
+            ga_insights_slot.markdown("_Generating insights..._")
+
+        # Second column - Acquisition Overview (with Pie Chart and Source Descriptions)
+        with col2:
+            st.markdown("<h3 style='text-align: center;'>Acquisition Overview</h3>", unsafe_allow_html=True)
+            acq_col1, acq_col2 = st.columns(2)
+        with acq_col1:
+            plot_acquisition_pie_chart_plotly(current_acquisition_summary)
+        with acq_col2:
+            describe_top_sources(current_acquisition_summary)
         
-        temp_url = "https://bizbuddyv1-ppcbuddy.streamlit.app/"
-        st.markdown("Search and social ads are key to driving traffic. Check out these tools to help you get going.")
-        st.link_button("Paid Search - Helper", temp_url)
-        st.link_button("Social Ads - Helper", temp_url)
-
-    # Landing page analysis section
-    st.divider()
-    col3, col4 = st.columns(2)
-    with col3:
-        st.markdown("<h3 style='text-align: center;'>Individual Page Overview</h3>", unsafe_allow_html=True)
+            temp_url = "https://bizbuddyv1-ppcbuddy.streamlit.app/"
+            st.markdown("Search and social ads are key to driving traffic. Check out these tools to help you get going.")
+            st.link_button("Paid Search - Helper", temp_url)
+            st.link_button("Social Ads - Helper", temp_url)
+
+        # Landing page analysis section
+        st.divider()
+        col3, col4 = st.columns(2)
+        with col3:
+            st.markdown("<h3 style='text-align: center;'>Individual Page Overview</h3>", unsafe_allow_html=True)
     
-        # Get landing page summary (now includes leads)
-        landing_page_summary = summarize_landing_pages(lp_df_30_days, event_data)
-        generate_page_summary(landing_page_summary)
+            # Get landing page summary (now includes leads)
+            generate_page_summary(graph.result("landing_page_summary"))
         
-        llm_input = st.session_state.get("page_summary_llm", "")
-        response = query_gpt("Provide insights based on the following page performance data, note that there is no CTAs on any page besides the Home. We need to think of ways to drive more people to the contact page. State only the bullets, no pre text. Limit your response to 2-3 bullet points:", llm_input)
-        
-        st.markdown("### Insights from AI")
-        st.markdown(response)
+            st.markdown("### Insights from AI")
+            page_insights_slot = st.empty()
+            page_insights_slot.markdown("_Generating insights..._")
     
-    with col4:
-        st.markdown("<h3 style='text-align: center;'>Search Query Analysis</h3>", unsafe_allow_html=True)
-        sq_col1, sq_col2 = st.columns(2)
-    with sq_col1:
-        st.markdown("These are all the search terms that your website has shown up for in the search results. The Google search engine shows websites based on the relevance of a website's information as it relates to the search terms.")
-        search_data = fetch_search_console_data()
-        st.dataframe(search_data['Search Query'], use_container_width=True)
+        with col4:
+            st.markdown("<h3 style='text-align: center;'>Search Query Analysis</h3>", unsafe_allow_html=True)
+            sq_col1, sq_col2 = st.columns(2)
+        with sq_col1:
+            st.markdown("These are all the search terms that your website has shown up for in the search results. The Google search engine shows websites based on the relevance of a website's information as it relates to the search terms.")
+            graph.result("search_data")
+            # The pulled queries and their index, built once per pull (not on every keystroke)
+            search_data, queries = fetch_search_console_index()
+            # Narrow the list as you type: each word matches the start of a word in the query
+            query_filter = st.text_input("Filter search queries", "", placeholder="e.g. dietitian near")
+            positions = queries.search(query_filter) if query_filter else None
+            if st.checkbox("Group variants of the same search"):
+                st.dataframe(group_queries_by_head_term(search_data, queries, positions),
+                             use_container_width=True, hide_index=True)
+            else:
+                shown_queries = search_data if positions is None else search_data.iloc[positions]
+                st.dataframe(shown_queries['Search Query'], use_container_width=True)
         
-    with sq_col2:
-        seo_insights = generate_seo_insights(search_data)
-        st.markdown(seo_insights)
-        encoded_message = quote(str(seo_insights))
-        seo_url = f"https://bizbuddyv1-seobuddy.streamlit.app?message={encoded_message}"
-        st.link_button("Check Out our SEO Helper!!", seo_url)
+        with sq_col2:
+            seo_insights_slot = st.empty()
+            seo_insights_slot.markdown("_Generating insights..._")
+            seo_link_slot = st.empty()
+
+        # Stream every insight into its slot as the model writes it
+        slots = {"ga_insights": ga_insights_slot, "page_insights": page_insights_slot, "seo_insights": seo_insights_slot}
+        entries = stream_insights(graph, slots, seo_link_slot, deadline)
+
+        # Merge the transcript deterministically so follow-up questions see the same history every run
+        record_transcript_entries([entries.get(name) for name in INSIGHT_TASKS])
+
+    # Per-call LLM latency, token and cost figures for this client, shown when staff open the page with ?debug=1
+    if TENANT_SELECTOR and st.experimental_get_query_params().get("debug"):
+        render_llm_debug_panel()
 
 # Execute the main function only when the script is run directly
 if __name__ == "__main__":
-    main()
+    with use_tenant(select_tenant()):
+        main()
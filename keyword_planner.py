@@ -1,15 +1,19 @@
+import os
 import streamlit as st
 import requests
 from bs4 import BeautifulSoup
+import numpy as np
 import pandas as pd
 import re
 from collections import Counter
-from llm_integration import query_gpt, initialize_llm_context  # Import GPT and initialization functions
-import nltk
-from nltk.corpus import stopwords
+from llm_integration import initialize_llm_context, render_stream, stream_gpt  # Import GPT and initialization functions
+from data_cache import memoize
+from query_index import QueryIndex
+from tenants import current_tenant, select_tenant, use_tenant
+from text_utils import load_stopwords
 
-# Ensure necessary NLTK data is downloaded
-nltk.download('stopwords')
+# Page configuration (must be the first Streamlit command, before the tenant is picked)
+st.set_page_config(page_title="Google Ads Keyword Planner", layout="wide")
 
 def fetch_website_content(url):
     """
@@ -28,8 +32,8 @@ def clean_and_extract_keywords(text, num_keywords=6):
     """
     words = re.findall(r'\b\w+\b', text.lower())
     
-    # Use NLTK's stopwords
-    stop_words = set(stopwords.words('english'))
+    # Use the bundled stopword list (loaded once, on first use)
+    stop_words = load_stopwords()
     
     # Filter out stopwords
     filtered_words = [word for word in words if word not in stop_words and len(word) > 2]
@@ -53,30 +57,62 @@ def load_data(file_path):
         st.error(f"An error occurred: {e}")
         return pd.DataFrame()
 
-def filter_data(df, query):
+def load_keyword_data(file_path):
     """
-    Filter the dataframe based on a search query.
+    Load the keyword data and an index of its cells, reusing both until the file changes.
+    """
+    try:
+        modified = os.path.getmtime(file_path)
+    except OSError:
+        # load_data reports the missing file
+        return load_data(file_path), None
+    return _load_indexed_keyword_data(file_path, modified)
+
+# Keyed on the file's path and modification time, so reruns don't hash the table to find its index
+@memoize(maxsize=4)
+def _load_indexed_keyword_data(file_path, modified):
+    df = load_data(file_path)
+    return df, build_keyword_index(df)
+
+def filter_data(df, query, index=None):
+    """
+    Filter the dataframe based on a search query, using the table's cell index if given.
     """
     if query:
-        return df[df.apply(lambda row: row.astype(str).str.contains(query, case=False).any(), axis=1)]
+        # Look the query up in an index of the table's cells instead of scanning every cell on each keystroke;
+        # a row matches if any one of its cells contains the query
+        index = index if index is not None else build_keyword_index(df)
+        cells = index.contains(query)
+        return df.iloc[np.unique(cells // max(len(df.columns), 1))]
     return df
 
-def generate_ppc_plan(keywords):
+def build_keyword_index(df):
     """
-    Generate a PPC plan using GPT based on the selected keywords.
+    Index every cell of the keyword table on its own (row by row, so cell i is in row i // column count).
+    """
+    return QueryIndex(df.astype(str).to_numpy().ravel())
+
+def build_ppc_prompt(keywords):
+    """
+    Build the LLM prompt asking for a PPC plan for the given keywords.
     """
-    prompt = (
-        "You are an expert PPC marketer tasked with creating a PPC plan using the following 5 keywords. The budget for this campaign is small, and all keywords will be managed within a single campaign to maximize efficiency. Provide a detailed plan that includes: Match type recommendations for balancing reach and cost control. Conversion types that align with the business goals. Business context to ensure the campaign targets the right audience and objectives. Example ad copy tailored to each keyword, designed to maximize engagement and drive conversions. Keep the plan cost-effective, and focus on strategies to maximize ROI within a limited budget.\n\n"
+    return (
+        f"You are an expert PPC marketer tasked with creating a PPC plan using the following {len(keywords)} keywords."
+        " The budget for this campaign is small, and all keywords will be managed within a single campaign to maximize efficiency. Provide a detailed plan that includes: Match type recommendations for balancing reach and cost control. Conversion types that align with the business goals. Business context to ensure the campaign targets the right audience and objectives. Example ad copy tailored to each keyword, designed to maximize engagement and drive conversions. Keep the plan cost-effective, and focus on strategies to maximize ROI within a limited budget.\n\n"
         f"Keywords: {', '.join(keywords)}"
     )
-    return query_gpt(prompt)
+
+def generate_ppc_plan(keywords):
+    """
+    Generate a PPC plan using GPT based on the selected keywords.
+    """
+    # Stream the plan onto the page as it is written
+    return render_stream(stream_gpt(build_ppc_prompt(keywords)))
 
 def main():
     """
     Main function to run the Streamlit app.
     """
-    st.set_page_config(page_title="Google Ads Keyword Planner", layout="wide")
-
     # Initialize session state
     initialize_llm_context()
 
@@ -84,7 +120,7 @@ def main():
 
     # Fetch and display keyword suggestions
     st.subheader("Suggested Keywords Based on Your Website")
-    url = "https://www.chelseawnutrition.com/"
+    url = current_tenant().site_url
     html_content = fetch_website_content(url)
     if html_content:
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -96,9 +132,9 @@ def main():
     st.subheader("What People Are Searching for Related to Your Website")
     uploaded_file = "KeywordStats_Washington_CWN.csv"
     try:
-        df = load_data(uploaded_file)
+        df, index = load_keyword_data(uploaded_file)
         search_query = st.text_input("Search for Keywords:", value="")
-        filtered_df = filter_data(df, search_query)
+        filtered_df = filter_data(df, search_query, index)
         with st.expander("View Keyword Data", expanded=True):
             st.dataframe(filtered_df, use_container_width=True)
     except Exception as e:
@@ -121,9 +157,9 @@ def main():
 
             # Generate PPC Plan
             with st.spinner("Generating PPC Plan..."):
-                ppc_plan = generate_ppc_plan(selected_keywords)
                 st.subheader("Generated PPC Plan")
-                st.write(ppc_plan)
+                generate_ppc_plan(selected_keywords)
 
 if __name__ == "__main__":
-    main()
+    with use_tenant(select_tenant()):
+        main()
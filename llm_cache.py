@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from data_cache import fingerprint
+from tenants import current_tenant
+
+# Total size of cached LLM answers kept on disk before the least recently used are evicted
+LLM_CACHE_MAX_BYTES = 20 * 1024 * 1024
+
+# Seconds a cached answer stays valid (None keeps answers until they are evicted)
+LLM_CACHE_TTL = 7 * 24 * 60 * 60
+
+
+def llm_cache_key(model, system_prompt, context, data_summary, prompt, response_format=None):
+    """
+    Hash everything that determines the model's answer into a cache key.
+    """
+    key = ("chat", model, system_prompt, context, data_summary, prompt)
+    if response_format is not None:
+        key += (response_format,)
+    return fingerprint(key)
+
+
+class LLMResponseCache:
+    """
+    Disk-backed cache of LLM answers in a single SQLite file, shared by every session and rerun.
+
+    Entries are evicted least recently used first once their total size passes max_bytes, and are
+    treated as missing ttl seconds after they were stored (never, if ttl is None).
+    """
+
+    def __init__(self, path, max_bytes=LLM_CACHE_MAX_BYTES, ttl=LLM_CACHE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key, now=None):
+        """
+        Return the cached answer for key, or None if it is missing or expired.
+        """
+        now = now or time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and row[1] + self.ttl <= now:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, response, now=None):
+        now = now or time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self.evictions += len(stale)
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock, self._connect() as conn:
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            calls = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / calls, 3) if calls else 0.0,
+                "evictions": self.evictions,
+                "size": entries,
+                "bytes": total,
+            }
+
+
+# One response cache per tenant, each capped at the tenant's "llm_cache_bytes" quota
+_caches = {}
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache(tenant=None):
+    tenant = tenant or current_tenant()
+    with _cache_lock:
+        if tenant.id not in _caches:
+            _caches[tenant.id] = LLMResponseCache(
+                os.path.join(tenant.data_dir, "llm_cache.sqlite"), max_bytes=tenant.quotas["llm_cache_bytes"]
+            )
+        return _caches[tenant.id]
@@ -1,62 +1,388 @@
-from openai import OpenAI
+import asyncio
+import threading
+import time
 import streamlit as st
+from clients import get_async_openai_client, get_openai_client
+from llm_cache import get_llm_cache, llm_cache_key
+from llm_metrics import record_llm_call
+from scheduler import (
+    current_deadline, deadline_at, scheduled_call, scheduled_call_async, scheduled_stream, scheduled_stream_async,
+)
+from singleflight import get_flight
+from tenants import current_tenant, use_tenant
+from token_counter import count_tokens, truncate_to_tokens
 
-# Initialize the OpenAI client
-client = OpenAI(api_key=st.secrets["openai"]["api_key"])
+# Model and system prompt used for every LLM call
+LLM_MODEL = "gpt-4o-mini"
+SYSTEM_PROMPT = "You are a data analyst with a focus on digital growth and conversion optimization."
 
-# Business context for session memory
-business_context = """
-Answer these questions based on this context: The data is from a one-person dietitian business that began about a year ago. The dietitian has some technical 
-skills and seeks to use GA4 data to grow her website’s performance and make clear, actionable business decisions. Keep insights simple, specific, and free from jargon. 
-Keep a few key things in mind, she is in lynnwood Washing just outside Seattle. She is hoping to work specifcally with Adults with Eating disorders. A conversion event 
-for her is someone going to the contact page and filling out a contact form (a lead). Keep in mind this data is from this year summarized for that whole time period.
-"""
+# Tokens of recent conversation sent verbatim with each question, and of the recap of older turns
+MEMORY_TOKEN_BUDGET = 2000
+RECAP_TOKEN_BUDGET = 200
+
+# Longest slice of an older question kept in the recap
+RECAP_QUESTION_CHARS = 120
+
+# Minimum seconds between redraws of a streaming answer
+STREAM_REFRESH_SECONDS = 0.05
 
 def initialize_llm_context():
-    if "session_summary" not in st.session_state:
-        st.session_state["session_summary"] = business_context
+    # Start the session memory from the current tenant's business context (and start over if the tenant changes)
+    tenant = current_tenant()
+    if "session_summary" not in st.session_state or st.session_state.get("llm_tenant", tenant.id) != tenant.id:
+        st.session_state["session_summary"] = tenant.business_context
+    st.session_state["llm_tenant"] = tenant.id
+
+# Build the chat messages for a prompt, its data summary and the conversation context
+def build_messages(prompt, data_summary="", context=""):
+    full_prompt = f"{context}\n\nData Summary:\n{data_summary}\n\nUser Question: {prompt}"
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": full_prompt}
+    ]
+
+# The text a question and its answer add to the session transcript
+def transcript_entry(prompt, answer):
+    return f"\nUser: {prompt}\nModel: {answer}\n"
+
+# Split a session transcript into its opening context and its (question, answer) turns
+def split_transcript(transcript):
+    base, *entries = transcript.split("\nUser: ")
+    turns = []
+    for entry in entries:
+        prompt, _, answer = entry.partition("\nModel: ")
+        turns.append((prompt, answer.rstrip("\n")))
+    return base, turns
+
+def build_memory(transcript, budget=MEMORY_TOKEN_BUDGET, recap_budget=RECAP_TOKEN_BUDGET):
+    """
+    Bound the conversation context sent with a question. The opening business context is always kept,
+    the most recent turns are kept verbatim while they fit in budget tokens, and older turns are
+    compacted into a one-line recap of the questions asked (capped at recap_budget tokens).
+    """
+    base, turns = split_transcript(transcript)
+    recent, used = [], 0
+    for prompt, answer in reversed(turns):
+        entry = transcript_entry(prompt, answer)
+        used += count_tokens(entry)
+        if used > budget:
+            break
+        recent.append(entry)
+    recent.reverse()
+
+    older = turns[:len(turns) - len(recent)]
+    if not older:
+        return base + "".join(recent)
+    asked = "; ".join(" ".join(prompt.split())[:RECAP_QUESTION_CHARS] for prompt, _ in older)
+    recap = truncate_to_tokens(f"Earlier in this session the user asked about: {asked}", recap_budget)
+    return base + f"\n{recap}\n" + "".join(recent)
+
+# Conversation context for the next question: the session transcript within its token budget
+def conversation_context():
+    return build_memory(st.session_state.get("session_summary", ""))
+
+# Look up a cached answer (skipped when regenerating); returns (cache key, answer or None, cache status).
+# A cached answer that validate rejects counts as a miss, so it is asked for again
+def _cached_answer(prompt, data_summary, context, regenerate, response_format=None, validate=None):
+    key = llm_cache_key(LLM_MODEL, SYSTEM_PROMPT, context, data_summary, prompt, response_format)
+    if regenerate:
+        return key, None, "bypass"
+    answer = get_llm_cache().get(key)
+    if answer is not None and validate is not None and not validate(answer):
+        answer = None
+    return key, answer, "miss" if answer is None else "hit"
+
+# Save a finished answer in the current tenant's LLM response cache, unless validate rejects it
+def _store_answer(key, answer, validate=None):
+    if validate is None or validate(answer):
+        get_llm_cache().set(key, answer)
+
+# Keyword arguments for chat.completions.create
+def _request_options(messages, response_format=None, stream=False):
+    options = {"model": LLM_MODEL, "messages": messages}
+    if response_format is not None:
+        options["response_format"] = response_format
+    if stream:
+        options["stream"] = True
+        options["stream_options"] = {"include_usage": True}
+    return options
+
+def _create_completion(key, messages, response_format, validate=None):
+    # Send the prompt to GPT-4 through the OpenAI client instance
+    response = scheduled_call(
+        "openai", get_openai_client().chat.completions.create, timeout_arg="timeout",
+        **_request_options(messages, response_format)
+    )
+
+    # Access the response using dot notation
+    answer = response.choices[0].message.content
+    _store_answer(key, answer, validate)
+    return answer, response.usage
 
-def query_gpt(prompt, data_summary=""):
+def _complete(prompt, data_summary="", context="", regenerate=False, label="query_gpt", response_format=None,
+              validate=None):
+    key, answer, cache = _cached_answer(prompt, data_summary, context, regenerate, response_format, validate)
+    messages = build_messages(prompt, data_summary, context)
+    with record_llm_call(label, LLM_MODEL, messages, context, cache) as call:
+        if answer is None:
+            # Identical questions already being asked by another session of this client share that call
+            (answer, call.usage), shared = get_flight("openai").do(
+                ("complete", current_tenant().id, key), _create_completion, key, messages, response_format, validate
+            )
+            if shared:
+                call.cache = "coalesced"
+        call.answer = answer
+    return answer
+
+def query_gpt(prompt, data_summary="", regenerate=False, label="query_gpt"):
+    """
+    Ask the model a question in the context of the session transcript, and add the exchange to it.
+    Answers are served from the LLM response cache unless regenerate is set.
+    """
     try:
         session_summary = st.session_state.get("session_summary", "")
-        full_prompt = f"{session_summary}\n\nData Summary:\n{data_summary}\n\nUser Question: {prompt}"
-
-        # Send the prompt to GPT-4 through the OpenAI client instance
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a data analyst with a focus on digital growth and conversion optimization."},
-                {"role": "user", "content": full_prompt}
-            ]
-        )
-        
-        # Access the response using dot notation
-        answer = response.choices[0].message.content
-        st.session_state["session_summary"] += f"\nUser: {prompt}\nModel: {answer}\n"
-        
+        answer = _complete(prompt, data_summary, build_memory(session_summary), regenerate, label)
+        st.session_state["session_summary"] = session_summary + transcript_entry(prompt, answer)
+
         return answer
 
     except Exception as e:
         return f"Error: {e}"
 
 
-def query_gpt_keywordbuilder(prompt, data_summary=""):
+def query_gpt_keywordbuilder(prompt, data_summary="", regenerate=False, label="query_gpt_keywordbuilder",
+                             response_format=None):
     try:
-        full_prompt = f"\n\nData Summary:\n{data_summary}\n\nUser Question: {prompt}"
-    
-        # Send the prompt to GPT-4 through the OpenAI client instance
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a data analyst with a focus on digital growth and conversion optimization."},
-                {"role": "user", "content": full_prompt}
-            ]
-        )
-        
-        # Access the response using dot notation
-        answer = response.choices[0].message.content
-        
-        return answer
+        return complete(prompt, data_summary, regenerate=regenerate, label=label, response_format=response_format)
 
     except Exception as e:
         return f"Error: {e}"
+
+
+def complete(prompt, data_summary="", context="", regenerate=False, label="complete", response_format=None,
+             validate=None):
+    """
+    Ask the model a question without touching the session transcript, letting API errors propagate.
+    With validate, only answers it accepts are cached (and a cached answer it rejects is asked for again).
+    """
+    return _complete(prompt, data_summary, context, regenerate, label, response_format, validate)
+
+
+def stream_completion(prompt, data_summary="", context="", regenerate=False, label="stream_completion",
+                      response_format=None, validate=None):
+    """
+    Yield the model's answer in pieces as it is generated (a cached answer comes in one piece),
+    caching it once complete. Leaves the session transcript alone and lets API errors propagate.
+    validate works as for complete().
+    """
+    key, answer, cache = _cached_answer(prompt, data_summary, context, regenerate, response_format, validate)
+    messages = build_messages(prompt, data_summary, context)
+    with record_llm_call(label, LLM_MODEL, messages, context, cache, streamed=True) as call:
+        if answer is not None:
+            yield answer
+        else:
+            pieces = []
+            try:
+                # The OpenAI concurrency slot stays taken until the whole stream has been read
+                with scheduled_stream(
+                    "openai", get_openai_client().chat.completions.create, timeout_arg="timeout",
+                    **_request_options(messages, response_format, stream=True)
+                ) as stream:
+                    for chunk in stream:
+                        call.usage = getattr(chunk, "usage", None) or call.usage
+                        piece = _chunk_text(chunk)
+                        if piece:
+                            call.first_token()
+                            pieces.append(piece)
+                            yield piece
+            finally:
+                # Also when the reader stops early, so the call is recorded with the text it got
+                answer = "".join(pieces)
+                call.answer = answer
+            _store_answer(key, answer, validate)
+        call.answer = answer
+
+def stream_gpt(prompt, data_summary="", regenerate=False, label="stream_gpt"):
+    """
+    Streaming version of query_gpt: yields the answer in pieces as the model produces them.
+    Once the answer is complete it is cached and added to the session transcript.
+    A cached answer is yielded in one piece.
+    """
+    session_summary = st.session_state.get("session_summary", "")
+    try:
+        pieces = []
+        for piece in stream_completion(prompt, data_summary, build_memory(session_summary), regenerate, label):
+            pieces.append(piece)
+            yield piece
+        answer = "".join(pieces)
+        st.session_state["session_summary"] = session_summary + transcript_entry(prompt, answer)
+
+    except Exception as e:
+        yield f"Error: {e}"
+
+# Text added by one streamed completion chunk (None for chunks without content)
+def _chunk_text(chunk):
+    if not chunk.choices:
+        return None
+    return chunk.choices[0].delta.content
+
+def render_stream(pieces, placeholder=None):
+    """
+    Draw streamed text into a placeholder (a new st.empty() by default) as it arrives, with a cursor
+    while it is still coming in. Returns the full text.
+    """
+    placeholder = placeholder or st.empty()
+    text, drawn_at = "", 0.0
+    for piece in pieces:
+        text += piece
+        if time.monotonic() - drawn_at >= STREAM_REFRESH_SECONDS:
+            placeholder.markdown(text + "▌")
+            drawn_at = time.monotonic()
+    placeholder.markdown(text)
+    return text
+
+
+# Async LLM calls all run on one background event loop, so they share a single
+# AsyncOpenAI client and connection pool no matter which thread or session submits them
+_loop = None
+_loop_lock = threading.Lock()
+
+def _get_event_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+        return _loop
+
+# Run a coroutine function on the shared event loop under the caller's request deadline and tenant
+def _run_on_loop(coroutine_func, *args):
+    deadline = current_deadline()
+    tenant = current_tenant()
+
+    async def run():
+        with deadline_at(deadline), use_tenant(tenant):
+            return await coroutine_func(*args)
+
+    return asyncio.run_coroutine_threadsafe(run(), _get_event_loop())
+
+async def query_gpt_async(prompt, data_summary="", context="", regenerate=False, label="query_gpt_async"):
+    """
+    Ask the model a question against a fixed context, without touching the session transcript.
+    Returns (answer, transcript entry); the entry is None if the call failed.
+    """
+    try:
+        # The response cache is SQLite on disk; its reads and writes run off the event loop
+        key, answer, cache = await asyncio.to_thread(_cached_answer, prompt, data_summary, context, regenerate)
+        messages = build_messages(prompt, data_summary, context)
+        with record_llm_call(label, LLM_MODEL, messages, context, cache) as call:
+            if answer is None:
+                response = await scheduled_call_async(
+                    "openai", get_async_openai_client().chat.completions.create, timeout_arg="timeout",
+                    **_request_options(messages)
+                )
+                answer = response.choices[0].message.content
+                call.usage = response.usage
+                await asyncio.to_thread(_store_answer, key, answer)
+            call.answer = answer
+        return answer, transcript_entry(prompt, answer)
+
+    except Exception as e:
+        return f"Error: {e}", None
+
+def submit_gpt(prompt, data_summary="", context="", regenerate=False, label="query_gpt_async"):
+    """
+    Start query_gpt_async on the shared event loop and return a concurrent.futures.Future
+    for its (answer, transcript entry). An identical question already in flight for the same tenant is
+    joined instead.
+    """
+    key = llm_cache_key(LLM_MODEL, SYSTEM_PROMPT, context, data_summary, prompt)
+    return get_flight("openai").share(
+        ("answer", current_tenant().id, key, regenerate),
+        lambda: _run_on_loop(query_gpt_async, prompt, data_summary, context, regenerate, label),
+    )
+
+class StreamingAnswer:
+    """
+    Handle on an answer being streamed on the LLM event loop. `text` holds what has arrived so far;
+    result() blocks for the final (answer, transcript entry), like submit_gpt's future.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.future = None
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout=timeout)
+
+async def _stream_gpt_async(handle, prompt, data_summary, context, regenerate, label):
+    try:
+        key, answer, cache = await asyncio.to_thread(_cached_answer, prompt, data_summary, context, regenerate)
+        messages = build_messages(prompt, data_summary, context)
+        with record_llm_call(label, LLM_MODEL, messages, context, cache, streamed=True) as call:
+            if answer is None:
+                stream = await scheduled_stream_async(
+                    "openai", get_async_openai_client().chat.completions.create, timeout_arg="timeout",
+                    **_request_options(messages, stream=True)
+                )
+                async with stream:
+                    async for chunk in stream:
+                        call.usage = getattr(chunk, "usage", None) or call.usage
+                        piece = _chunk_text(chunk)
+                        if piece:
+                            call.first_token()
+                            handle.text += piece
+                answer = handle.text
+                await asyncio.to_thread(_store_answer, key, answer)
+            call.answer = answer
+        handle.text = answer
+        return answer, transcript_entry(prompt, answer)
+
+    except Exception as e:
+        handle.text = f"Error: {e}"
+        return handle.text, None
+
+def submit_gpt_stream(prompt, data_summary="", context="", regenerate=False, label="stream_gpt_async"):
+    """
+    Streaming version of submit_gpt: starts the question on the shared event loop and returns a
+    StreamingAnswer whose text fills in as the model answers.
+    """
+    def start():
+        handle = StreamingAnswer()
+        handle.future = _run_on_loop(_stream_gpt_async, handle, prompt, data_summary, context, regenerate, label)
+        return handle
+
+    # Sessions of the same client asking the same question at the same time watch the same stream
+    key = llm_cache_key(LLM_MODEL, SYSTEM_PROMPT, context, data_summary, prompt)
+    return get_flight("openai").share(("stream", current_tenant().id, key, regenerate), start)
+
+# Snapshot of the session transcript for a group of concurrent questions
+def snapshot_context():
+    return st.session_state.get("session_summary", "")
+
+# Append transcript entries in the given order, skipping failed calls and exchanges the transcript
+# already holds (so a rerun that re-asks the same questions doesn't repeat them)
+def record_transcript_entries(entries):
+    transcript = snapshot_context()
+    for entry in entries:
+        if entry and entry not in transcript:
+            transcript += entry
+    st.session_state["session_summary"] = transcript
+
+def run_insights(requests, context=None, regenerate=False):
+    """
+    Ask several independent questions at once. `requests` maps a name to (prompt, data_summary).
+    Every question sees the same (budgeted) transcript snapshot, and their entries are added to the transcript
+    in request order once all have answered. Returns a dict of name -> answer.
+    """
+    context = conversation_context() if context is None else context
+    futures = {
+        name: submit_gpt(prompt, data_summary, context, regenerate, label=name)
+        for name, (prompt, data_summary) in requests.items()
+    }
+    results = {name: future.result() for name, future in futures.items()}
+    record_transcript_entries([entry for _, entry in results.values()])
+    return {name: answer for name, (answer, _) in results.items()}
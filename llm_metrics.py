@@ -0,0 +1,278 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from tenants import current_tenant
+from token_counter import count_tokens
+
+# Dollars per million (prompt, completion) tokens, for the cost estimate of each call
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# Upper bounds of the histogram buckets for each recorded measurement (the last bucket is open-ended)
+HISTOGRAM_BUCKETS = {
+    "wall_ms": [100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000],
+    "ttft_ms": [50, 100, 250, 500, 1000, 2000, 4000, 8000],
+    "prompt_tokens": [250, 500, 1000, 2000, 4000, 8000, 16000, 32000],
+    "completion_tokens": [50, 100, 250, 500, 1000, 2000, 4000],
+    "context_tokens": [250, 500, 1000, 2000, 4000, 8000, 16000],
+}
+
+# Most recent call records kept in memory for the debug panel and export
+MAX_RECORDS = 1000
+
+# Optional JSON-lines file every call record is appended to as it happens
+METRICS_LOG_PATH = os.environ.get("BIZBUDDY_LLM_METRICS_LOG")
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with count, sum, min and max. Percentiles are estimated from the buckets.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q):
+        """
+        Upper bound of the bucket holding the q-th percentile (the max, for the open-ended bucket).
+        """
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + [self.max], self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 1) if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": self.max,
+        }
+
+
+class LLMMetrics:
+    """
+    In-process record of every LLM call: the raw records (most recent MAX_RECORDS) plus histograms
+    of latency and token counts per tenant and call label. Readers pass a tenant id to see only
+    that tenant's calls.
+    """
+
+    def __init__(self, max_records=MAX_RECORDS, log_path=METRICS_LOG_PATH):
+        self.records = deque(maxlen=max_records)
+        self.histograms = {}
+        self.log_path = log_path
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        with self._lock:
+            self.records.append(record)
+            label_histograms = self.histograms.setdefault(
+                (record["tenant"], record["label"]), {name: Histogram(bounds) for name, bounds in HISTOGRAM_BUCKETS.items()}
+            )
+            for name, histogram in label_histograms.items():
+                if record.get(name) is not None:
+                    histogram.observe(record[name])
+            if self.log_path:
+                with open(self.log_path, "a") as log:
+                    log.write(json.dumps(record) + "\n")
+
+    def _records(self, tenant_id=None):
+        return [record for record in self.records if tenant_id is None or record["tenant"] == tenant_id]
+
+    def summary(self, tenant_id=None):
+        """
+        One row per call label: call count, cache hits, errors, total cost and latency/token percentiles.
+        """
+        with self._lock:
+            records = self._records(tenant_id)
+            merged = {}
+            for (tenant, label), hs in self.histograms.items():
+                if tenant_id is not None and tenant != tenant_id:
+                    continue
+                label_histograms = merged.setdefault(
+                    label, {name: Histogram(bounds) for name, bounds in HISTOGRAM_BUCKETS.items()}
+                )
+                for name, histogram in hs.items():
+                    label_histograms[name].merge(histogram)
+            histograms = {label: {name: h.summary() for name, h in hs.items()} for label, hs in merged.items()}
+        if not records:
+            return pd.DataFrame()
+
+        calls = pd.DataFrame(records)
+        rows = calls.groupby("label").agg(
+            calls=("label", "size"),
+            cache_hits=("cache", lambda cache: int((cache == "hit").sum())),
+            errors=("error", lambda error: int(error.notna().sum())),
+            cancelled=("status", lambda status: int((status == "cancelled").sum())),
+            cost_usd=("cost_usd", "sum"),
+        )
+        for label in rows.index:
+            for name in ("wall_ms", "ttft_ms", "prompt_tokens", "context_tokens"):
+                summary = histograms.get(label, {}).get(name, {})
+                rows.loc[label, f"{name}_p50"] = summary.get("p50")
+                rows.loc[label, f"{name}_p95"] = summary.get("p95")
+        return rows.reset_index()
+
+    def latest(self, count, tenant_id=None):
+        with self._lock:
+            return self._records(tenant_id)[-count:]
+
+    def to_jsonl(self, tenant_id=None):
+        with self._lock:
+            return "".join(json.dumps(record) + "\n" for record in self._records(tenant_id))
+
+    def export_jsonl(self, path, tenant_id=None):
+        with open(path, "w") as out:
+            out.write(self.to_jsonl(tenant_id))
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+            self.histograms.clear()
+
+
+_metrics = LLMMetrics()
+
+
+def get_llm_metrics():
+    return _metrics
+
+
+class LLMCall:
+    """
+    Measurements for one LLM call, filled in as it runs and recorded when it finishes.
+    """
+
+    def __init__(self, label, model, messages, context, cache, streamed):
+        self.tenant = current_tenant().id
+        self.label = label
+        self.model = model
+        self.messages = messages
+        self.context = context
+        self.cache = cache
+        self.streamed = streamed
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.answer = None
+        self.usage = None
+
+    def first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def to_record(self, error=None, cancelled=False):
+        finished = time.perf_counter()
+        prompt_tokens = getattr(self.usage, "prompt_tokens", None)
+        completion_tokens = getattr(self.usage, "completion_tokens", None)
+        if prompt_tokens is None:
+            prompt_tokens = sum(count_tokens(message["content"]) for message in self.messages)
+        if completion_tokens is None:
+            completion_tokens = count_tokens(self.answer)
+        if self.cache in ("hit", "coalesced") or error is not None:
+            cost = 0.0
+        else:
+            prompt_price, completion_price = MODEL_PRICES.get(self.model, (0.0, 0.0))
+            cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+        first_token_at = self.first_token_at or (finished if self.answer is not None else None)
+        return {
+            "timestamp": time.time(),
+            "tenant": self.tenant,
+            "label": self.label,
+            "model": self.model,
+            "cache": self.cache,
+            "streamed": self.streamed,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "context_tokens": count_tokens(self.context),
+            "cost_usd": round(cost, 6),
+            "wall_ms": round((finished - self.started) * 1000, 1),
+            "ttft_ms": round((first_token_at - self.started) * 1000, 1) if first_token_at else None,
+            "error": type(error).__name__ if error is not None else None,
+            "status": "error" if error is not None else "cancelled" if cancelled else "ok",
+        }
+
+
+@contextmanager
+def record_llm_call(label, model, messages, context="", cache="miss", streamed=False):
+    """
+    Time an LLM call and record it in the process metrics when the block exits. The block sets
+    call.answer (and call.usage, when the API reports it) and calls call.first_token() for streams.
+    Exceptions are recorded by class name and re-raised. A block left early by its caller (a stream
+    closed before its end, a Streamlit rerun or stop) is recorded as cancelled, with whatever
+    call.answer holds by then.
+    """
+    call = LLMCall(label, model, messages, context, cache, streamed)
+    error, cancelled = None, False
+    try:
+        yield call
+    except Exception as e:
+        error = e
+        raise
+    except BaseException:
+        cancelled = True
+        raise
+    finally:
+        _metrics.record(call.to_record(error=error, cancelled=cancelled))
+
+
+def render_llm_debug_panel():
+    """
+    Show the current tenant's per-label LLM latency, token and cost figures, its latest calls and caches,
+    and a JSON-lines download of its calls. For agency staff only (see homepage.py).
+    """
+    from data_cache import cache_stats
+    from llm_cache import get_llm_cache
+    from scheduler import scheduler_stats
+    from singleflight import singleflight_stats
+
+    tenant = current_tenant()
+    with st.expander("LLM call metrics"):
+        summary = _metrics.summary(tenant.id)
+        if summary.empty:
+            st.write("No LLM calls yet.")
+        else:
+            st.dataframe(summary, use_container_width=True)
+            st.dataframe(pd.DataFrame(_metrics.latest(20, tenant.id)), use_container_width=True)
+        st.write("LLM response cache:", get_llm_cache(tenant).stats())
+        st.write("Data source caches:", cache_stats(tenant))
+        st.write("Request scheduler:", scheduler_stats())
+        st.write("Coalesced requests:", singleflight_stats())
+        st.download_button("Download call log (JSON lines)", _metrics.to_jsonl(tenant.id), file_name="llm_calls.jsonl")
@@ -0,0 +1,422 @@
+"""
+Offline stand-ins for the OpenAI chat completions API, for benchmarks and load tests.
+
+Three ways to take the network out of the LLM paths:
+
+* Cassettes: use_cassette(path, mode="record") wraps the real clients and saves every completion
+  to a JSON file; mode="replay" answers the same requests from that file without an API key.
+* In-process fake: install(FakeLLM(...)) registers client stand-ins (see clients.set_client) that
+  answer after a configurable latency, stream at a configurable token rate and inject API errors.
+* Local server: python llm_replay.py serve --port 8089 runs the same fake behind an
+  OpenAI-compatible HTTP endpoint. Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8089/v1
+  to exercise the real SDK, its retries and its streaming parser.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from clients import get_async_openai_client, get_openai_client, set_client
+from data_cache import fingerprint
+from token_counter import count_tokens
+
+# Token-sized pieces of text (a word plus its trailing whitespace), as streamed back by the fake
+_PIECES = re.compile(r"\S+\s*|\s+")
+
+FAKE_ANSWER = (
+    "- **Traffic:** Sessions are steady compared with last month; organic search is the main source of new visitors.\n"
+    "- **Engagement:** The home page keeps visitors longest, while service pages have the highest bounce rate.\n"
+    "- **Next step:** Add a clear call to action linking to the contact page from every service page."
+)
+
+
+class FakeAPIError(Exception):
+    """
+    Error raised by the in-process fake, carrying an HTTP status code like the SDK's APIStatusError.
+    """
+    status_code = 500
+
+
+class FakeRateLimitError(FakeAPIError):
+    status_code = 429
+
+
+class FakeServiceUnavailableError(FakeAPIError):
+    status_code = 503
+
+
+FAKE_ERRORS = {429: FakeRateLimitError, 503: FakeServiceUnavailableError}
+
+# Request fields that only change how an answer is delivered, not what it says; left out of cassette keys
+# so a streamed recording also answers the plain request (and a different per-call timeout still matches)
+TRANSPORT_FIELDS = frozenset({"stream", "stream_options", "timeout", "extra_headers"})
+
+
+class Cassette:
+    """
+    Recorded completions in a JSON file, keyed on a hash of every request field that can change the
+    answer (model, messages, response_format, temperature, ...), i.e. all but TRANSPORT_FIELDS.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(request):
+        return fingerprint({field: value for field, value in request.items() if field not in TRANSPORT_FIELDS})
+
+    def get(self, request):
+        return self.entries.get(self.key(request))
+
+    def put(self, request, content, usage):
+        with self._lock:
+            self.entries[self.key(request)] = {
+                "model": request["model"],
+                "content": content,
+                "usage": usage,
+                "recorded_at": time.time(),
+            }
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w") as f:
+                json.dump(self.entries, f, indent=1)
+
+
+class FakeLLM:
+    """
+    Completion backend that answers from a cassette (or with FAKE_ANSWER) after realistic delays.
+
+    latency is the time to the first token, tokens_per_second the streaming rate (a non-streamed
+    answer arrives after latency plus its whole generation time), and error_rate the share of
+    requests that fail with error_status. With strict=True a request missing from the cassette
+    is an error instead of getting the canned answer.
+    """
+
+    def __init__(self, latency=0.5, tokens_per_second=50.0, error_rate=0.0, error_status=429,
+                 cassette=None, strict=False, seed=None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.cassette = cassette
+        self.strict = strict
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def plan(self, request):
+        """
+        Decide one request's outcome: returns (content, usage) or raises the injected error.
+        """
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+        if failed:
+            raise FAKE_ERRORS.get(self.error_status, FakeAPIError)(f"Injected error {self.error_status}")
+
+        entry = self.cassette.get(request) if self.cassette else None
+        if entry is None and self.strict:
+            raise LookupError("Request not found in cassette")
+        content = entry["content"] if entry else FAKE_ANSWER
+        usage = entry["usage"] if entry else {
+            "prompt_tokens": sum(count_tokens(message["content"]) for message in request["messages"]),
+            "completion_tokens": count_tokens(content),
+        }
+        return content, usage
+
+    def piece_delay(self):
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def complete(self, request):
+        content, usage = self.plan(request)
+        time.sleep(self.latency)
+        if request.get("stream"):
+            return self._stream(request, content, usage)
+        time.sleep(self.piece_delay() * len(_PIECES.findall(content)))
+        return completion_response(request, content, usage)
+
+    def _stream(self, request, content, usage):
+        for piece in _PIECES.findall(content):
+            yield completion_chunk(request, piece)
+            time.sleep(self.piece_delay())
+        yield completion_chunk(request, None, usage)
+
+    async def complete_async(self, request):
+        content, usage = self.plan(request)
+        await asyncio.sleep(self.latency)
+        if request.get("stream"):
+            return self._stream_async(request, content, usage)
+        await asyncio.sleep(self.piece_delay() * len(_PIECES.findall(content)))
+        return completion_response(request, content, usage)
+
+    async def _stream_async(self, request, content, usage):
+        for piece in _PIECES.findall(content):
+            yield completion_chunk(request, piece)
+            await asyncio.sleep(self.piece_delay())
+        yield completion_chunk(request, None, usage)
+
+
+class RecordingLLM:
+    """
+    Completion backend that forwards to the real OpenAI clients and saves every answer to a cassette.
+    """
+
+    def __init__(self, cassette, client, async_client):
+        self.cassette = cassette
+        self.client = client
+        self.async_client = async_client
+
+    def complete(self, request):
+        response = self.client.chat.completions.create(**request)
+        if request.get("stream"):
+            return self._record_stream(request, response)
+        self.cassette.put(request, response.choices[0].message.content, _usage_dict(response.usage))
+        return response
+
+    def _record_stream(self, request, stream):
+        pieces, usage = [], None
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+            yield chunk
+        self.cassette.put(request, "".join(pieces), _usage_dict(usage))
+
+    async def complete_async(self, request):
+        response = await self.async_client.chat.completions.create(**request)
+        if request.get("stream"):
+            return self._record_stream_async(request, response)
+        self.cassette.put(request, response.choices[0].message.content, _usage_dict(response.usage))
+        return response
+
+    async def _record_stream_async(self, request, stream):
+        pieces, usage = [], None
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+            yield chunk
+        self.cassette.put(request, "".join(pieces), _usage_dict(usage))
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+
+
+def completion_response(request, content, usage):
+    """
+    Build a response object shaped like the SDK's ChatCompletion.
+    """
+    return SimpleNamespace(
+        id=f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        model=request["model"],
+        choices=[SimpleNamespace(
+            index=0, message=SimpleNamespace(role="assistant", content=content), finish_reason="stop"
+        )],
+        usage=_usage_namespace(usage),
+    )
+
+
+def completion_chunk(request, piece, usage=None):
+    """
+    Build a streamed chunk shaped like the SDK's ChatCompletionChunk. The final chunk has no
+    choices and carries the usage, as the API sends it with stream_options={"include_usage": True}.
+    """
+    if piece is None:
+        return SimpleNamespace(model=request["model"], choices=[], usage=_usage_namespace(usage))
+    return SimpleNamespace(
+        model=request["model"],
+        choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=piece), finish_reason=None)],
+        usage=None,
+    )
+
+
+def _usage_namespace(usage):
+    if usage is None:
+        return None
+    return SimpleNamespace(
+        prompt_tokens=usage["prompt_tokens"],
+        completion_tokens=usage["completion_tokens"],
+        total_tokens=usage["prompt_tokens"] + usage["completion_tokens"],
+    )
+
+
+class _Completions:
+    def __init__(self, backend, is_async):
+        self.backend = backend
+        self.is_async = is_async
+
+    def create(self, **request):
+        if self.is_async:
+            return self.backend.complete_async(request)
+        return self.backend.complete(request)
+
+
+def fake_client(backend, is_async=False):
+    """
+    Client stand-in exposing chat.completions.create on top of a FakeLLM or RecordingLLM backend.
+    """
+    return SimpleNamespace(chat=SimpleNamespace(completions=_Completions(backend, is_async)))
+
+
+def install(backend):
+    """
+    Route the app's OpenAI and AsyncOpenAI clients through the given backend.
+    """
+    set_client("openai", fake_client(backend))
+    set_client("async_openai", fake_client(backend, is_async=True))
+    return backend
+
+
+def use_cassette(path, mode="replay", **fake_options):
+    """
+    Record real completions to (mode="record") or replay them from (mode="replay") a cassette file.
+    fake_options go to the replaying FakeLLM, e.g. latency=0 to replay as fast as possible.
+    """
+    cassette = Cassette(path)
+    if mode == "record":
+        return install(RecordingLLM(cassette, get_openai_client(), get_async_openai_client()))
+    if mode == "replay":
+        return install(FakeLLM(cassette=cassette, strict=fake_options.pop("strict", True), **fake_options))
+    raise ValueError(f"Unknown cassette mode '{mode}' (expected 'record' or 'replay')")
+
+
+def _chunk_json(request, chunk):
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": request["model"],
+        "choices": [
+            {"index": choice.index, "delta": {"content": choice.delta.content}, "finish_reason": choice.finish_reason}
+            for choice in chunk.choices
+        ],
+        "usage": _usage_dict(chunk.usage),
+    }
+
+
+def make_handler(backend):
+    """
+    Build an HTTP handler serving POST /v1/chat/completions (plain and SSE streaming) from backend.
+    """
+
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            try:
+                content, usage = backend.plan(request)
+            except FakeAPIError as e:
+                self._send_json(e.status_code, {"error": {"message": str(e), "type": "fake_error"}})
+                return
+            except LookupError as e:
+                self._send_json(404, {"error": {"message": str(e), "type": "cassette_miss"}})
+                return
+
+            time.sleep(backend.latency)
+            if request.get("stream"):
+                self._send_stream(request, content, usage)
+                return
+            time.sleep(backend.piece_delay() * len(_PIECES.findall(content)))
+            # Recordings of streams made without include_usage have no usage to report
+            usage = dict(usage or {})
+            self._send_json(200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": dict(usage, total_tokens=usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)),
+            })
+
+        def _send_stream(self, request, content, usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for piece in _PIECES.findall(content):
+                self._send_event(_chunk_json(request, completion_chunk(request, piece)))
+                time.sleep(backend.piece_delay())
+            if (request.get("stream_options") or {}).get("include_usage"):
+                self._send_event(_chunk_json(request, completion_chunk(request, None, usage)))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def _send_event(self, payload):
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+            self.wfile.flush()
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeOpenAIHandler
+
+
+def serve(backend, host="127.0.0.1", port=8089):
+    """
+    Start an OpenAI-compatible fake server on a background thread and return it (call shutdown() to stop).
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(backend))
+    threading.Thread(target=server.serve_forever, name="fake-openai-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an OpenAI-compatible fake chat completions server.")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds to the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--cassette", help="answer from this cassette file instead of the canned answer")
+    parser.add_argument("--strict", action="store_true", help="fail requests missing from the cassette")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    backend = FakeLLM(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        cassette=Cassette(args.cassette) if args.cassette else None,
+        strict=args.strict,
+        seed=args.seed,
+    )
+    server = serve(backend, args.host, args.port)
+    print(f"Fake OpenAI API on http://{args.host}:{args.port}/v1 (set OPENAI_BASE_URL to use it)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Generate PPC plans for many client accounts without the Streamlit UI.
+
+Run with: python ppc_batch.py jobs.jsonl plans.jsonl [--concurrency 4] [--regenerate] [--openai-batch]
+
+Each job is one client: a business context and the keywords to plan for, given as a JSONL file
+({"id": ..., "business_context": ..., "keywords": [...]}) or a CSV with the same columns (keywords
+separated by commas or semicolons). Jobs without an id get one from a hash of their content.
+A job may name a registered tenant (see tenants.py) instead of giving its business context; its
+plan is then cached with that tenant's LLM responses.
+
+Plans are appended to the output JSONL file as each one finishes, so an interrupted run picks up
+where it stopped: jobs that already have an "ok" result are skipped, failed ones are tried again.
+Calls go through the same scheduler, response cache and metrics as the app, at most --concurrency at once.
+
+With --openai-batch the outstanding jobs are submitted as one OpenAI Batch API job instead (half the
+price, results within 24 hours). The batch id is kept next to the output file, so running the same
+command again checks on that batch and writes its plans once it has finished.
+The OpenAI key comes from Streamlit secrets or the OPENAI_API_KEY environment variable.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+
+from clients import get_openai_client
+from keyword_planner import build_ppc_prompt
+from llm_cache import get_llm_cache, llm_cache_key
+from llm_integration import LLM_MODEL, SYSTEM_PROMPT, build_messages, submit_gpt
+from scheduler import scheduled_call
+from tenants import get_tenant, resolve_tenant, use_tenant
+
+# Plans generated at once when calling the API directly
+DEFAULT_CONCURRENCY = 4
+
+# Batch API jobs that have stopped and won't produce any more output
+BATCH_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+_KEYWORD_SEPARATOR = re.compile(r"[;,\n]")
+
+
+def _job_id(business_context, keywords):
+    digest = hashlib.sha256(json.dumps([business_context, keywords]).encode("utf-8")).hexdigest()
+    return digest[:12]
+
+
+def _parse_keywords(keywords):
+    if isinstance(keywords, str):
+        keywords = _KEYWORD_SEPARATOR.split(keywords)
+    return [keyword.strip() for keyword in keywords if keyword and keyword.strip()]
+
+
+def load_jobs(path):
+    """
+    Read jobs from a JSONL or CSV file. Returns a list of {"id", "tenant", "business_context", "keywords"} dicts.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            records = list(csv.DictReader(f))
+        else:
+            records = [json.loads(line) for line in f if line.strip()]
+
+    jobs, seen = [], set()
+    for number, record in enumerate(records, start=1):
+        tenant = record.get("tenant") or None
+        business_context = record.get("business_context") or (get_tenant(tenant).business_context if tenant else "")
+        business_context = business_context.strip()
+        keywords = _parse_keywords(record.get("keywords") or [])
+        if not keywords:
+            raise ValueError(f"Job {number} in {path} has no keywords.")
+        job_id = str(record.get("id") or _job_id(business_context, keywords))
+        if job_id in seen:
+            raise ValueError(f"Job id '{job_id}' appears more than once in {path}.")
+        seen.add(job_id)
+        jobs.append({"id": job_id, "tenant": tenant, "business_context": business_context, "keywords": keywords})
+    return jobs
+
+
+def load_finished(path):
+    """
+    Ids of jobs that already have a successful result in the output file.
+    """
+    finished = set()
+    if not os.path.exists(path):
+        return finished
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted write; the job simply runs again
+                continue
+            if result.get("status") == "ok":
+                finished.add(result["job_id"])
+    return finished
+
+
+def append_result(f, job, plan=None, error=None):
+    """
+    Write one job's outcome to the output file and make sure it reached the disk before moving on.
+    """
+    result = {
+        "job_id": job["id"],
+        "tenant": job["tenant"],
+        "business_context": job["business_context"],
+        "keywords": job["keywords"],
+        "status": "error" if error else "ok",
+        "plan": plan,
+        "error": error,
+        "model": LLM_MODEL,
+        "completed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    f.write(json.dumps(result) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def run_jobs(jobs, output_path, concurrency=DEFAULT_CONCURRENCY, regenerate=False):
+    """
+    Generate a plan for every job, keeping at most concurrency calls in flight. Returns (ok, failed) counts.
+    """
+    ok = failed = 0
+    pending = iter(jobs)
+    in_flight = {}
+    with open(output_path, "a", encoding="utf-8") as f:
+        while True:
+            while len(in_flight) < concurrency:
+                job = next(pending, None)
+                if job is None:
+                    break
+                with use_tenant(job["tenant"]):
+                    in_flight[job["id"]] = (job, submit_gpt(
+                        build_ppc_prompt(job["keywords"]), context=job["business_context"],
+                        regenerate=regenerate, label="ppc_batch",
+                    ))
+            if not in_flight:
+                return ok, failed
+
+            done, _ = wait([future for _, future in in_flight.values()], return_when=FIRST_COMPLETED)
+            for job_id in [job_id for job_id, (_, future) in in_flight.items() if future in done]:
+                job, future = in_flight.pop(job_id)
+                answer, entry = future.result()
+                if entry is None:
+                    append_result(f, job, error=answer.removeprefix("Error: "))
+                    failed += 1
+                else:
+                    append_result(f, job, plan=answer)
+                    ok += 1
+                print(f"[{ok + failed}/{len(jobs)}] {job_id}: {'ok' if entry else answer}", file=sys.stderr)
+
+
+def _batch_state_path(output_path):
+    return output_path + ".batch.json"
+
+
+def _batch_request(job):
+    messages = build_messages(build_ppc_prompt(job["keywords"]), "", job["business_context"])
+    return {
+        "custom_id": job["id"],
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {"model": LLM_MODEL, "messages": messages},
+    }
+
+
+def submit_batch(jobs, output_path):
+    """
+    Upload the jobs as an OpenAI Batch API job and remember its id next to the output file.
+    """
+    client = get_openai_client()
+    requests = "".join(json.dumps(_batch_request(job)) + "\n" for job in jobs)
+    upload = scheduled_call(
+        "openai", client.files.create, file=("ppc_batch.jsonl", io.BytesIO(requests.encode("utf-8"))), purpose="batch"
+    )
+    batch = scheduled_call(
+        "openai", client.batches.create,
+        input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window="24h",
+    )
+    with open(_batch_state_path(output_path), "w", encoding="utf-8") as f:
+        json.dump({"batch_id": batch.id, "job_ids": [job["id"] for job in jobs]}, f)
+    return batch
+
+
+def collect_batch(jobs, output_path):
+    """
+    Check on the submitted batch; once it has finished, write its plans to the output file.
+    Returns the batch status, or None if there is no batch in progress.
+    """
+    state_path = _batch_state_path(output_path)
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, encoding="utf-8") as f:
+        state = json.load(f)
+
+    client = get_openai_client()
+    batch = scheduled_call("openai", client.batches.retrieve, state["batch_id"])
+    if batch.status not in BATCH_FINAL_STATUSES:
+        return batch.status
+
+    outcomes = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if file_id:
+            content = scheduled_call("openai", client.files.content, file_id)
+            for line in content.text.splitlines():
+                if line.strip():
+                    result = json.loads(line)
+                    outcomes[result["custom_id"]] = result
+
+    by_id = {job["id"]: job for job in jobs}
+    with open(output_path, "a", encoding="utf-8") as f:
+        for job_id in state["job_ids"]:
+            job = by_id.get(job_id)
+            if job is None:
+                continue
+            result = outcomes.get(job_id)
+            response = (result or {}).get("response") or {}
+            if response.get("status_code") == 200:
+                plan = response["body"]["choices"][0]["message"]["content"]
+                # Later interactive runs with the same keywords reuse the plan
+                get_llm_cache(resolve_tenant(job["tenant"])).set(llm_cache_key(
+                    LLM_MODEL, SYSTEM_PROMPT, job["business_context"], "", build_ppc_prompt(job["keywords"])
+                ), plan)
+                append_result(f, job, plan=plan)
+            else:
+                error = (result or {}).get("error") or response.get("body", {}).get("error") or f"Batch {batch.status}"
+                append_result(f, job, error=error.get("message", str(error)) if isinstance(error, dict) else error)
+    os.remove(state_path)
+    return batch.status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("jobs", help="JSONL or CSV file of jobs")
+    parser.add_argument("output", help="JSONL file the plans are appended to")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--regenerate", action="store_true", help="skip the LLM response cache")
+    parser.add_argument("--openai-batch", action="store_true", help="submit through the OpenAI Batch API")
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.jobs)
+    if args.openai_batch:
+        status = collect_batch(jobs, args.output)
+        if status is not None and status not in BATCH_FINAL_STATUSES:
+            print(f"Batch still {status}; run again later to collect it.", file=sys.stderr)
+            return
+        if status is not None:
+            print(f"Batch {status}; results written to {args.output}.", file=sys.stderr)
+
+    finished = load_finished(args.output)
+    todo = [job for job in jobs if job["id"] not in finished]
+    print(f"{len(jobs)} jobs, {len(jobs) - len(todo)} already done, {len(todo)} to run.", file=sys.stderr)
+    if not todo:
+        return
+
+    if args.openai_batch:
+        batch = submit_batch(todo, args.output)
+        print(f"Submitted batch {batch.id}; run again later to collect it.", file=sys.stderr)
+        return
+
+    ok, failed = run_jobs(todo, args.output, max(1, args.concurrency), args.regenerate)
+    print(f"{ok} plans written, {failed} failed.", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import bisect
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from text_utils import load_stopwords
+
+# Length of the character n-grams used for substring lookups
+CHAR_NGRAM = 3
+
+# Longest head term (in words) considered when grouping queries
+MAX_HEAD_TERM_WORDS = 3
+
+# Search modifiers that say how or where someone searches rather than what for; like stopwords,
+# they never make a head term on their own and don't count towards how specific one is
+QUERY_MODIFIERS = frozenset({"near", "nearby", "best", "top", "cheap", "affordable", "local", "online", "free"})
+
+# Recent lookups kept per index, so each keystroke narrows the last result instead of starting over
+RESULT_CACHE_SIZE = 64
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_EMPTY = np.array([], dtype=np.int64)
+
+
+def _normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+# Fold simple plurals ("dietitians") into the singular so variants share head terms
+def _singular(word):
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _postings(index):
+    # Position lists collected while building become sorted int arrays for fast intersection
+    return {key: np.array(ids, dtype=np.int64) for key, ids in index.items()}
+
+
+def _intersect(arrays):
+    arrays = sorted(arrays, key=len)
+    result = arrays[0]
+    for array in arrays[1:]:
+        if not len(result):
+            break
+        result = np.intersect1d(result, array, assume_unique=True)
+    return result
+
+
+class QueryIndex:
+    """
+    In-memory inverted index over a list of short texts (search queries, keywords).
+
+    Every text is indexed by its words and by its character n-grams, so lookups touch only the
+    texts that share those terms instead of scanning the whole list:
+      - prefix(text):   texts that start with text
+      - search(text):   texts containing a word starting with each word of text (search-as-you-type)
+      - contains(text): texts containing text anywhere
+    Matching ignores case and repeated whitespace. Results are positions into the original list,
+    in the original order. Recent substring results are kept, so typing one more character only
+    re-checks the texts that matched before it, and head term groupings are worked out once per setting.
+    """
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self._normalized = [_normalize(text) for text in self.texts]
+        self._by_text = sorted(range(len(self._normalized)), key=self._normalized.__getitem__)
+        self._sorted_texts = [self._normalized[i] for i in self._by_text]
+
+        words, ngrams = defaultdict(list), defaultdict(list)
+        for i, text in enumerate(self._normalized):
+            for word in dict.fromkeys(_WORD.findall(text)):
+                words[word].append(i)
+            for gram in dict.fromkeys(text[j:j + CHAR_NGRAM] for j in range(len(text) - CHAR_NGRAM + 1)):
+                ngrams[gram].append(i)
+        self._words = _postings(words)
+        self._vocabulary = sorted(self._words)
+        self._ngrams = _postings(ngrams)
+
+        self._results = OrderedDict()
+        self._head_terms = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def prefix(self, text):
+        """
+        Positions of texts that start with text.
+        """
+        text = _normalize(text)
+        if not text:
+            return np.arange(len(self.texts))
+        start = bisect.bisect_left(self._sorted_texts, text)
+        end = bisect.bisect_left(self._sorted_texts, text + "\uffff")
+        return np.sort(np.array(self._by_text[start:end], dtype=np.int64))
+
+    def search(self, text):
+        """
+        Positions of texts with a word starting with each word of text, in any order
+        (so "diet near" finds "dietitian near me" and "near me dietitians").
+        """
+        terms = _WORD.findall(_normalize(text))
+        if not terms:
+            return np.arange(len(self.texts))
+        matches = []
+        for term in dict.fromkeys(terms):
+            start = bisect.bisect_left(self._vocabulary, term)
+            end = bisect.bisect_left(self._vocabulary, term + "\uffff")
+            postings = [self._words[word] for word in self._vocabulary[start:end]]
+            if not postings:
+                return _EMPTY
+            matches.append(np.unique(np.concatenate(postings)) if len(postings) > 1 else postings[0])
+        return _intersect(matches)
+
+    def contains(self, text):
+        """
+        Positions of texts that contain text as a substring.
+        """
+        text = _normalize(text)
+        if not text:
+            return np.arange(len(self.texts))
+
+        with self._lock:
+            if text in self._results:
+                self._results.move_to_end(text)
+                return self._results[text]
+            # A cached result for a shorter piece of this text already holds every possible match
+            narrower = max((key for key in self._results if key in text), key=len, default=None)
+            previous = self._results[narrower] if narrower is not None else None
+
+        if len(text) == CHAR_NGRAM:
+            # A single n-gram's postings are exactly its matches
+            result = self._ngrams.get(text, _EMPTY)
+        else:
+            if len(text) < CHAR_NGRAM:
+                candidates = previous if previous is not None else np.arange(len(self.texts))
+            else:
+                candidates = self._ngram_candidates(text)
+                if previous is not None:
+                    candidates = np.intersect1d(candidates, previous, assume_unique=True)
+            normalized = self._normalized
+            result = np.array([i for i in candidates.tolist() if text in normalized[i]], dtype=np.int64)
+
+        with self._lock:
+            self._results[text] = result
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return result
+
+    def _ngram_candidates(self, text):
+        grams = {text[j:j + CHAR_NGRAM] for j in range(len(text) - CHAR_NGRAM + 1)}
+        if any(gram not in self._ngrams for gram in grams):
+            return _EMPTY
+        return _intersect([self._ngrams[gram] for gram in grams])
+
+    def head_terms(self, max_words=MAX_HEAD_TERM_WORDS, min_size=2):
+        """
+        Group texts by the most specific run of words (up to max_words, plurals folded) they share with
+        at least min_size texts, e.g. "dietitian" for "dietitian near me" and "best dietitians".
+        Runs are ranked by their words that are neither stopwords nor QUERY_MODIFIERS, then by length,
+        so filler like "near me" never heads a group. Returns {head term: positions}, largest groups
+        first; texts with no shared run, and groups left smaller than min_size, are left out.
+        """
+        with self._lock:
+            if (max_words, min_size) in self._head_terms:
+                return self._head_terms[max_words, min_size]
+        groups = self._group_head_terms(max_words, min_size)
+        with self._lock:
+            return self._head_terms.setdefault((max_words, min_size), groups)
+
+    def _group_head_terms(self, max_words, min_size):
+        filler = load_stopwords() | QUERY_MODIFIERS
+        runs = defaultdict(list)
+        informative = {}
+        text_runs = []
+        for i, text in enumerate(self._normalized):
+            words = [_singular(word) for word in _WORD.findall(text)]
+            own = set()
+            for size in range(1, max_words + 1):
+                for j in range(len(words) - size + 1):
+                    run = words[j:j + size]
+                    content = sum(word not in filler for word in run)
+                    if not content:
+                        continue
+                    run = " ".join(run)
+                    informative[run] = content
+                    own.add(run)
+            for run in own:
+                runs[run].append(i)
+            text_runs.append(own)
+
+        groups = defaultdict(list)
+        for i, own in enumerate(text_runs):
+            shared = [run for run in own if len(runs[run]) >= min_size]
+            if shared:
+                # Most content words first, then most words, then the run shared by the most texts
+                head = max(shared, key=lambda run: (informative[run], run.count(" "), len(runs[run]), run))
+                groups[head].append(i)
+        # A run shared by enough texts may still end up heading fewer of them
+        groups = {head: ids for head, ids in groups.items() if len(ids) >= min_size}
+        ordered = sorted(groups.items(), key=lambda item: (-len(item[1]), item[0]))
+        return {head: np.array(ids, dtype=np.int64) for head, ids in ordered}
+
@@ -0,0 +1,100 @@
+import pandas as pd
+
+from token_counter import count_tokens
+
+# Ways a report can be laid out as text:
+#   table    - "A | B | C" header and a rule, then one "a | b | c" line per row
+#   markdown - a Markdown table
+#   fields   - one paragraph per row: "**first value**: Label: value, Label: value" (empty values left out)
+#   plain    - one "a: b" line per row, no header
+REPORT_STYLES = ("table", "markdown", "fields", "plain")
+
+# Width of the rule under a table header
+TABLE_RULE_WIDTH = 50
+
+
+def _column_spec(column):
+    # A column is given by name, or as (name, label) or (name, label, format template)
+    if isinstance(column, str):
+        return column, column, None
+    name, label, template = (tuple(column) + (None, None))[:3]
+    return name, label or name, template
+
+
+def _format_column(values, template):
+    # Missing values come back as None so the "fields" style can leave them out
+    present = values.notna()
+    if template is None:
+        text = values.astype(str)
+    else:
+        text = values.map(template.format, na_action="ignore")
+    return text.where(present, None)
+
+
+def select_top(data, by, top, ascending=False):
+    """
+    The top rows of data by the `by` column(s), found with a partial selection (nlargest/nsmallest)
+    instead of sorting every row.
+    """
+    if top is None or by is None:
+        return data
+    return data.nsmallest(top, by) if ascending else data.nlargest(top, by)
+
+
+def render_report(data, columns, style="table", title=None, by=None, top=None, ascending=False, token_budget=None):
+    """
+    Render a DataFrame as prompt text in one of REPORT_STYLES, formatting whole columns at a time.
+
+    columns lists what to show, each as a column name or a (name, label, format template) tuple,
+    e.g. ("Avg. Position", "Avg. Position", "{:.0f}"). With by and top only the top rows by that
+    column are kept (the smallest ones if ascending). With token_budget, rows are dropped from the
+    end once the text would pass the budget (by count_tokens) and a closing line says how many.
+    """
+    if style not in REPORT_STYLES:
+        raise ValueError(f"Unknown report style '{style}'; expected one of {', '.join(REPORT_STYLES)}.")
+    specs = [_column_spec(column) for column in columns]
+    missing = [name for name, _, _ in specs if name not in data.columns]
+    if missing:
+        raise ValueError(f"Data does not contain required columns: {', '.join(missing)}")
+
+    rows = select_top(data, by, top, ascending)
+    labels = [label for _, label, _ in specs]
+    cells = [_format_column(rows[name], template) for name, _, template in specs]
+
+    header = []
+    if title:
+        header.append(title)
+    if style == "table":
+        header += [" | ".join(labels), "-" * TABLE_RULE_WIDTH]
+    elif style == "markdown":
+        header += ["| " + " | ".join(labels) + " |", "|" + " --- |" * len(labels)]
+
+    if not cells or rows.empty:
+        lines = pd.Series([], dtype=object)
+    elif style == "fields":
+        fields = pd.Series("", index=rows.index)
+        for label, text in zip(labels[1:], cells[1:]):
+            field = label + ": " + text
+            joined = fields.where(fields == "", fields + ", ") + field
+            fields = joined.where(field.notna(), fields)
+        lines = ("**" + cells[0].fillna("") + "**").where(fields == "", "**" + cells[0].fillna("") + "**: " + fields)
+    else:
+        separator = ": " if style == "plain" else " | "
+        lines = cells[0].fillna("").str.cat([text.fillna("") for text in cells[1:]], sep=separator)
+        if style == "markdown":
+            lines = "| " + lines + " |"
+
+    row_separator = "\n\n" if style == "fields" else "\n"
+    if token_budget is not None:
+        lines = _fit_to_budget(lines, header, row_separator, token_budget)
+    return "\n".join(header + [row_separator.join(lines)] if len(lines) else header)
+
+
+def _fit_to_budget(lines, header, row_separator, token_budget):
+    # Keep room for the closing line about the rows that didn't fit
+    budget = token_budget - count_tokens("\n".join(header)) - count_tokens("(+000000 more rows)")
+    used = (lines.map(count_tokens) + count_tokens(row_separator)).cumsum()
+    kept = lines[(used <= budget).values]
+    if len(kept) == len(lines):
+        return lines
+    return pd.concat([kept, pd.Series([f"(+{len(lines) - len(kept)} more rows)"])], ignore_index=True)
@@ -0,0 +1,424 @@
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Request rate (per second), burst size and concurrent requests allowed per external backend,
+# kept under each API's published quotas so bursts of sessions queue instead of failing
+BACKEND_LIMITS = {
+    "openai": {"rate": 8.0, "burst": 16, "concurrency": 8},
+    "ga4": {"rate": 5.0, "burst": 10, "concurrency": 8},
+    "gsc": {"rate": 10.0, "burst": 20, "concurrency": 4},
+    "google_ads": {"rate": 1.0, "burst": 2, "concurrency": 2},
+}
+
+# Status codes worth retrying: rate limited and temporarily unavailable
+RETRY_STATUSES = {429, 503}
+
+# gRPC status names (GA4 and Google Ads clients) that mean the same as RETRY_STATUSES
+RETRY_GRPC_CODES = {"RESOURCE_EXHAUSTED": 429, "UNAVAILABLE": 503}
+
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20.0
+
+# Seconds between checks while an async call waits for a free slot
+ASYNC_POLL_SECONDS = 0.02
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a scheduled call can't start (or retry) before the current request deadline.
+    """
+
+
+@contextmanager
+def request_deadline(seconds):
+    """
+    Give every scheduled call made inside the block (including from TaskGraph tasks and LLM calls
+    submitted from it) a shared deadline seconds from now. Nested deadlines can only shorten it.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline():
+    return _deadline.get()
+
+
+@contextmanager
+def deadline_at(deadline):
+    """
+    Restore a deadline captured with current_deadline() in another thread or task.
+    """
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time():
+    """
+    Seconds left before the current deadline (None if there is none). Raises DeadlineExceeded once it has passed.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("Request deadline passed before the call could run")
+    return remaining
+
+
+def error_status(exc):
+    """
+    HTTP-style status of an API error from any of the clients (None if it doesn't carry one).
+    """
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        code = getattr(exc, "code", None)
+        status = code if isinstance(code, int) else None
+    if status is None and getattr(exc, "resp", None) is not None:
+        status = getattr(exc.resp, "status", None)
+    if status is None and getattr(exc, "error", None) is not None and callable(getattr(exc.error, "code", None)):
+        status = RETRY_GRPC_CODES.get(getattr(exc.error.code(), "name", None))
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(exc):
+    """
+    Seconds the server asked us to wait (Retry-After header), if it said.
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class Backend:
+    """
+    Admission control for one external API: a token bucket for the request rate and a cap on
+    requests in flight. Keeps counters of calls, retries, failures and time spent waiting.
+    """
+
+    def __init__(self, name, rate, burst, concurrency):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+
+    def try_acquire(self):
+        """
+        Take a token and a slot if both are free. Returns 0 on success, otherwise the seconds to wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._in_flight >= self.concurrency:
+                return ASYNC_POLL_SECONDS
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+            self._in_flight += 1
+            return 0
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def acquire(self):
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                break
+            remaining = remaining_time()
+            time.sleep(min(wait, remaining) if remaining is not None else wait)
+        self._record_wait(time.monotonic() - started)
+
+    async def acquire_async(self):
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                break
+            remaining = remaining_time()
+            await asyncio.sleep(min(wait, remaining) if remaining is not None else wait)
+        self._record_wait(time.monotonic() - started)
+
+    def _record_wait(self, seconds):
+        with self._lock:
+            self.calls += 1
+            self.wait_seconds += seconds
+
+    def backoff(self, exc, attempt):
+        """
+        Seconds to wait before retrying after exc, or None if it shouldn't be retried.
+        """
+        if attempt >= MAX_RETRIES or error_status(exc) not in RETRY_STATUSES:
+            return None
+        # Full jitter, so sessions that were throttled together don't retry together
+        delay = retry_after(exc) or random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+        remaining = remaining_time() if current_deadline() is not None else None
+        if remaining is not None and delay >= remaining:
+            return None
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "in_flight": self._in_flight,
+                "avg_wait_ms": round(self.wait_seconds / self.calls * 1000, 1) if self.calls else 0.0,
+            }
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name):
+    with _backends_lock:
+        if name not in _backends:
+            limits = BACKEND_LIMITS.get(name, {"rate": 5.0, "burst": 10, "concurrency": 4})
+            _backends[name] = Backend(name, **limits)
+        return _backends[name]
+
+
+def scheduler_stats():
+    """
+    Return call, retry, failure and queueing counters for every backend, keyed by name.
+    """
+    with _backends_lock:
+        backends = dict(_backends)
+    return {name: backend.stats() for name, backend in backends.items()}
+
+
+def _with_timeout(kwargs, timeout_arg):
+    # Pass what is left of the deadline to clients that take a per-call timeout
+    remaining = remaining_time()
+    if timeout_arg and remaining is not None and timeout_arg not in kwargs:
+        return dict(kwargs, **{timeout_arg: remaining})
+    return kwargs
+
+
+def scheduled_call(backend_name, func, *args, timeout_arg=None, **kwargs):
+    """
+    Call func(*args, **kwargs) once the backend's rate and concurrency limits allow, retrying
+    rate-limit and unavailable errors with jittered exponential backoff within the current deadline.
+    timeout_arg names func's per-call timeout parameter, if it has one, to pass the remaining deadline on.
+    """
+    backend = get_backend(backend_name)
+    attempt = 0
+    while True:
+        backend.acquire()
+        try:
+            return func(*args, **_with_timeout(kwargs, timeout_arg))
+        except Exception as exc:
+            delay = backend.backoff(exc, attempt)
+            if delay is None:
+                backend.record_failure()
+                raise
+        finally:
+            backend.release()
+        time.sleep(delay)
+        attempt += 1
+
+
+async def scheduled_call_async(backend_name, func, *args, timeout_arg=None, **kwargs):
+    """
+    Async version of scheduled_call for a func that returns an awaitable.
+    """
+    backend = get_backend(backend_name)
+    attempt = 0
+    while True:
+        await backend.acquire_async()
+        try:
+            return await func(*args, **_with_timeout(kwargs, timeout_arg))
+        except Exception as exc:
+            delay = backend.backoff(exc, attempt)
+            if delay is None:
+                backend.record_failure()
+                raise
+        finally:
+            backend.release()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+class _HeldSlot:
+    # A backend concurrency slot owned by a stream, given back exactly once
+    def __init__(self, stream, backend):
+        self._stream = stream
+        self._backend = backend
+        self._held = True
+        self._lock = threading.Lock()
+
+    def _give_back(self):
+        # True for the one caller that gets to release the slot
+        with self._lock:
+            held, self._held = self._held, False
+        return held
+
+    def __del__(self):
+        # A stream dropped without being read to the end or closed
+        if getattr(self, "_held", False) and self._give_back():
+            self._backend.release()
+
+
+class HeldStream(_HeldSlot):
+    """
+    Iterator over a streamed response that keeps its backend's concurrency slot until the stream
+    has been read to the end, fails or is closed (also as a context manager, or when dropped unread).
+    """
+
+    def __init__(self, stream, backend):
+        super().__init__(stream, backend)
+        self._iterator = iter(stream)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._give_back():
+            try:
+                close = getattr(self._stream, "close", None)
+                if close is not None:
+                    close()
+            finally:
+                self._backend.release()
+
+
+class HeldAsyncStream(_HeldSlot):
+    """
+    Async version of HeldStream, for `async for` and `async with`.
+    """
+
+    def __init__(self, stream, backend):
+        super().__init__(stream, backend)
+        self._iterator = stream.__aiter__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._iterator.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._give_back():
+            try:
+                # The OpenAI SDK's async streams have an awaitable close(); async generators have aclose()
+                close = getattr(self._stream, "close", None) or getattr(self._stream, "aclose", None)
+                if close is not None:
+                    result = close()
+                    if asyncio.iscoroutine(result):
+                        await result
+            finally:
+                self._backend.release()
+
+def scheduled_stream(backend_name, func, *args, timeout_arg=None, **kwargs):
+    """
+    scheduled_call for a func that returns a stream (e.g. a completion created with stream=True).
+    Returns a HeldStream, so the backend's concurrency slot stays taken while the stream is read.
+    """
+    backend = get_backend(backend_name)
+    attempt = 0
+    while True:
+        backend.acquire()
+        try:
+            stream = func(*args, **_with_timeout(kwargs, timeout_arg))
+        except Exception as exc:
+            backend.release()
+            delay = backend.backoff(exc, attempt)
+            if delay is None:
+                backend.record_failure()
+                raise
+        except BaseException:
+            backend.release()
+            raise
+        else:
+            return HeldStream(stream, backend)
+        time.sleep(delay)
+        attempt += 1
+
+
+async def scheduled_stream_async(backend_name, func, *args, timeout_arg=None, **kwargs):
+    """
+    Async version of scheduled_stream for a func that returns an awaitable async stream.
+    """
+    backend = get_backend(backend_name)
+    attempt = 0
+    while True:
+        await backend.acquire_async()
+        try:
+            stream = await func(*args, **_with_timeout(kwargs, timeout_arg))
+        except Exception as exc:
+            backend.release()
+            delay = backend.backoff(exc, attempt)
+            if delay is None:
+                backend.record_failure()
+                raise
+        except BaseException:
+            backend.release()
+            raise
+        else:
+            return HeldAsyncStream(stream, backend)
+        await asyncio.sleep(delay)
+        attempt += 1
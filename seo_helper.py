@@ -106,9 +106,10 @@
 import streamlit as st
 from urllib.parse import unquote
 import gsc_data_pull 
+from tenants import select_tenant, use_tenant
 import requests
 from bs4 import BeautifulSoup
-from llm_integration import query_gpt 
+from llm_integration import render_stream, stream_gpt
 
 # Page configuration
 st.set_page_config(layout="wide")
@@ -158,10 +159,10 @@ def fetch_page_copy(url):
         return {"Error": f"An error occurred while fetching the page: {e}"}
 
 def display_report_with_llm(llm_prompt):
-    # Query the LLM with the prompt
-    llm_response = query_gpt(llm_prompt)
+    # Query the LLM with the prompt, showing the answer as it streams in
     st.write("GPT-4 Analysis:")
-    st.write(llm_response)
+    llm_response = render_stream(stream_gpt(llm_prompt))
+    return llm_response
 
 def main():
     # Ensure session_summary is initialized in session state
@@ -170,7 +171,7 @@ def main():
 
     
     # Pull the same dataframe as in the main app
-    df = gsc_data_pull.fetch_search_console_data()  # Replace 'pull_data' with the actual function name
+    df = gsc_data_pull.fetch_search_console_data()  # Read from the local Search Console store
     
     # Retrieve message from URL parameter
     query_params = st.experimental_get_query_params()
@@ -211,4 +212,5 @@ def main():
         display_report_with_llm(llm_prompt)
  
 if __name__ == "__main__":
-     main()
+    with use_tenant(select_tenant()):
+        main()
@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls that are in flight at the same time, process-wide: the first caller
+    for a key runs the call, and anyone asking for the same key before it finishes waits for
+    that call and shares its result (or exception) instead of issuing their own.
+    Counts calls issued and calls coalesced onto one already running.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs), or wait for the identical call already running under key.
+        Returns (result, shared), where shared is True if the result came from another caller's call.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.issued += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._forget(key, future)
+
+    def share(self, key, start):
+        """
+        For calls that run in the background: start() begins the call and returns its handle (a
+        concurrent.futures.Future, or an object whose .future is one). Identical requests made while
+        it runs get the same handle back.
+        """
+        with self._lock:
+            handle = self._calls.get(key)
+            if handle is not None:
+                self.coalesced += 1
+                return handle
+            handle = start()
+            self._calls[key] = handle
+            self.issued += 1
+        getattr(handle, "future", handle).add_done_callback(lambda _: self._forget(key, handle))
+        return handle
+
+    def _forget(self, key, handle):
+        with self._lock:
+            if self._calls.get(key) is handle:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            calls = self.issued + self.coalesced
+            return {
+                "issued": self.issued,
+                "coalesced": self.coalesced,
+                "coalesced_rate": round(self.coalesced / calls, 3) if calls else 0.0,
+                "in_flight": len(self._calls),
+            }
+
+
+# One coalescing layer per backend, shared by every session in the process
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name):
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight()
+        return _flights[name]
+
+
+def singleflight_stats():
+    """
+    Return issued/coalesced counters for every coalescing layer, keyed by name.
+    """
+    with _flights_lock:
+        flights = dict(_flights)
+    return {name: flight.stats() for name, flight in flights.items()}
@@ -0,0 +1,95 @@
+import json
+
+from jsonschema import Draft7Validator
+
+
+def json_schema_format(name, schema):
+    """
+    response_format asking the model for JSON that matches schema (OpenAI structured outputs).
+    Strict mode only accepts a subset of JSON Schema, so keep limits like item counts out of
+    schema and check them separately.
+    """
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def schema_errors(instance, schema, path="$"):
+    """
+    Return a readable message for every way instance breaks schema (an empty list if it is valid).
+    """
+    errors = []
+    for error in sorted(Draft7Validator(schema).iter_errors(instance), key=lambda e: list(e.absolute_path)):
+        location = path + "".join(f"[{part}]" if isinstance(part, int) else f".{part}" for part in error.absolute_path)
+        errors.append(f"{location}: {error.message}")
+    return errors
+
+
+class JSONItemStream:
+    """
+    Incremental parser that picks complete items out of a JSON document while it is still streaming.
+
+    Feed it text as it arrives; it returns every object that closed at item_depth (2 for the items
+    of an array inside the top-level object, 1 for the items of a top-level array). Raises ValueError
+    as soon as the text can't be JSON, so a stream that went off the rails can be stopped early.
+    """
+
+    def __init__(self, item_depth=2):
+        self.item_depth = item_depth
+        self.text = ""
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._item_start = None
+        self._started = False
+
+    def feed(self, piece):
+        items = []
+        offset = len(self.text)
+        self.text += piece
+        for index, char in enumerate(piece, start=offset):
+            if not self._started:
+                if char.isspace():
+                    continue
+                if char not in "{[":
+                    raise ValueError(f"Expected a JSON object or array, got {self.text.strip()[:40]!r}")
+                self._started = True
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if char == "{" and self._depth == self.item_depth:
+                    self._item_start = index
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth < 0:
+                    raise ValueError("Unbalanced closing bracket in JSON output")
+                if char == "}" and self._depth == self.item_depth and self._item_start is not None:
+                    items.append(json.loads(self.text[self._item_start:index + 1]))
+                    self._item_start = None
+        return items
+
+    def result(self):
+        """
+        Parse the whole document once the stream has finished.
+        """
+        return json.loads(self.text)
+
+
+def repair_prompt(output, errors):
+    """
+    Prompt asking the model to fix only the listed problems in its previous JSON answer.
+    """
+    problems = "\n".join(f"- {error}" for error in errors)
+    return (
+        "Your previous answer did not pass validation. Fix only these problems and keep everything else unchanged:\n"
+        f"{problems}\n\n"
+        "Return the corrected JSON and nothing else.\n\n"
+        f"Previous answer:\n{output}"
+    )
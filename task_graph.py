@@ -0,0 +1,113 @@
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+
+class TaskGraph:
+    """
+    Small dependency-aware task runner on a thread pool.
+
+    Tasks are added with the names of the tasks they depend on and start as soon as those finish,
+    receiving their results as positional arguments (in the order the dependencies were listed).
+    Independent tasks run concurrently, so the wall-clock time of the graph is roughly its slowest
+    chain rather than the sum of every call. A failed task fails every task that depends on it.
+
+    When created inside a Streamlit script run, worker threads are attached to that run's context
+    so tasks can still read and write st.session_state (tasks must not draw UI elements). Each task
+    also runs in a copy of the context variables set where it was added (e.g. the request deadline).
+    """
+
+    def __init__(self, max_workers=8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task-graph")
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._script_ctx = _current_script_ctx()
+
+    def add(self, name, func, deps=()):
+        """
+        Schedule func under the given name once every task in deps has finished. Returns its Future.
+        """
+        with self._lock:
+            if name in self._futures:
+                raise ValueError(f"Task '{name}' was already added.")
+            missing = [dep for dep in deps if dep not in self._futures]
+            if missing:
+                raise ValueError(f"Task '{name}' depends on unknown tasks: {', '.join(missing)}")
+            future = Future()
+            context = contextvars.copy_context()
+            dep_futures = [self._futures[dep] for dep in deps]
+            self._futures[name] = future
+
+        remaining = [len(dep_futures)]
+        remaining_lock = threading.Lock()
+
+        def start():
+            failed = next((dep for dep in dep_futures if dep.exception() is not None), None)
+            if failed is not None:
+                future.set_exception(failed.exception())
+                return
+            inner = self._executor.submit(self._call, context, func, [dep.result() for dep in dep_futures])
+            inner.add_done_callback(lambda done: _copy_outcome(done, future))
+
+        def on_dep_done(_):
+            with remaining_lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                start()
+
+        if not dep_futures:
+            start()
+        for dep in dep_futures:
+            dep.add_done_callback(on_dep_done)
+        return future
+
+    def result(self, name, timeout=None):
+        """
+        Block until the named task finishes and return its result (or raise its exception).
+        """
+        return self._futures[name].result(timeout=timeout)
+
+    def done(self, name):
+        """
+        Return True if the named task has finished (successfully or not).
+        """
+        return self._futures[name].done()
+
+    def as_completed(self, names, timeout=None):
+        """
+        Yield the given task names in the order they finish.
+        """
+        by_future = {self._futures[name]: name for name in names}
+        for future in as_completed(by_future, timeout=timeout):
+            yield by_future[future]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown(wait=exc_info[0] is None)
+
+    def _call(self, context, func, args):
+        if self._script_ctx is not None:
+            from streamlit.runtime.scriptrunner import add_script_run_ctx
+            add_script_run_ctx(threading.current_thread(), self._script_ctx)
+        return context.run(func, *args)
+
+
+def _current_script_ctx():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    return get_script_run_ctx(suppress_warning=True)
+
+
+def _copy_outcome(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
@@ -0,0 +1,241 @@
+import contextvars
+import hmac
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import streamlit as st
+
+from warehouse import DATA_DIR
+
+# JSON file listing the agency's client accounts, used when there is no [tenants] section in Streamlit secrets
+TENANTS_PATH = os.environ.get("BIZBUDDY_TENANTS_PATH", "tenants.json")
+
+# Tenant used when none is chosen, and the only one when no registry is configured
+DEFAULT_TENANT_ID = "default"
+
+# Per-tenant limits on the shared caches, unless a tenant's entry sets its own:
+#   cache_entries   - results kept per data source (GA4, Search Console, Google Ads) in memory
+#   llm_cache_bytes - size of the tenant's LLM response cache on disk
+DEFAULT_QUOTAS = {
+    "cache_entries": 32,
+    "llm_cache_bytes": 5 * 1024 * 1024,
+}
+
+# Business context for the original single-client deployment
+DEFAULT_BUSINESS_CONTEXT = """
+Answer these questions based on this context: The data is from a one-person dietitian business that began about a year ago. The dietitian has some technical
+skills and seeks to use GA4 data to grow her website’s performance and make clear, actionable business decisions. Keep insights simple, specific, and free from jargon.
+Keep a few key things in mind, she is in lynnwood Washing just outside Seattle. She is hoping to work specifcally with Adults with Eating disorders. A conversion event
+for her is someone going to the contact page and filling out a contact form (a lead). Keep in mind this data is from this year summarized for that whole time period.
+"""
+
+DEFAULT_SITE_URL = "https://www.chelseawnutrition.com/"
+
+# Internal (agency staff) deployments only: list every client in the sidebar, let ?tenant= open any
+# of them without its access key and show the ?debug=1 metrics panel. Anyone who can reach such a
+# deployment can see every client's data
+TENANT_SELECTOR = os.environ.get("BIZBUDDY_TENANT_SELECTOR", "") == "1"
+
+
+class Tenant:
+    """
+    One client account: its GA4 property, Search Console site, Google Ads customer and the business
+    context sent with its LLM questions. google_credentials and ads_credentials name the Streamlit
+    secrets sections to authenticate with; tenants naming the same section share one client.
+    access_key is the shared secret a client's links carry (?tenant=<id>&key=<access_key>).
+    """
+
+    def __init__(self, tenant_id, name=None, ga4_property_id=None, gsc_site_url=None, ads_customer_id=None,
+                 business_context="", site_url=None, google_credentials="google_service_account",
+                 ads_credentials="google_ads", quotas=None, access_key=None):
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", tenant_id):
+            raise ValueError(f"Tenant id '{tenant_id}' may only contain letters, digits, '-' and '_'.")
+        self.id = tenant_id
+        self.name = name or tenant_id
+        self.ga4_property_id = ga4_property_id
+        self.gsc_site_url = gsc_site_url or site_url
+        self.ads_customer_id = ads_customer_id
+        self.business_context = business_context
+        self.site_url = site_url or gsc_site_url
+        self.google_credentials = google_credentials
+        self.ads_credentials = ads_credentials
+        self.quotas = dict(DEFAULT_QUOTAS, **(quotas or {}))
+        self.access_key = access_key
+
+    @property
+    def data_dir(self):
+        """
+        Directory for the tenant's local stores; the default tenant keeps the original top-level files.
+        """
+        if self.id == DEFAULT_TENANT_ID:
+            return DATA_DIR
+        return os.path.join(DATA_DIR, "tenants", self.id)
+
+    def validate(self):
+        """
+        Raise a ValueError naming the settings this tenant is missing. Every tenant needs a site;
+        all but the default one need their own GA4 property (the default may use the secrets' one).
+        An Ads customer is only checked when keyword data is fetched, since not every client runs Ads.
+        """
+        missing = []
+        if not self.gsc_site_url:
+            missing.append("gsc_site_url or site_url")
+        if not self.ga4_property_id and self.id != DEFAULT_TENANT_ID:
+            missing.append("ga4_property_id")
+        if missing:
+            raise ValueError(f"Tenant '{self.id}' is missing {', '.join(missing)}.")
+        return self
+
+    def __repr__(self):
+        return f"Tenant({self.id!r})"
+
+
+def _default_tenant():
+    return Tenant(
+        DEFAULT_TENANT_ID, name="Chelsea W Nutrition", site_url=DEFAULT_SITE_URL,
+        business_context=DEFAULT_BUSINESS_CONTEXT,
+        quotas={"cache_entries": 64, "llm_cache_bytes": 20 * 1024 * 1024},
+    )
+
+
+def _registry_entries():
+    # Streamlit secrets first ([tenants.<id>] tables), then the JSON file ({"<id>": {...}})
+    try:
+        return {tenant_id: dict(entry) for tenant_id, entry in st.secrets["tenants"].items()}
+    except (FileNotFoundError, KeyError):
+        pass
+    if os.path.exists(TENANTS_PATH):
+        with open(TENANTS_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+_tenants = None
+_tenants_lock = threading.Lock()
+
+
+def load_tenants():
+    """
+    Return {tenant id: Tenant} for every configured client, loaded once per process.
+    Without a registry this is just the default tenant.
+    """
+    global _tenants
+    with _tenants_lock:
+        if _tenants is None:
+            tenants = {}
+            for tenant_id, entry in _registry_entries().items():
+                entry = dict(entry)
+                if "quotas" in entry:
+                    entry["quotas"] = dict(entry["quotas"])
+                tenants[tenant_id] = Tenant(tenant_id, **entry).validate()
+            _tenants = tenants or {DEFAULT_TENANT_ID: _default_tenant()}
+        return _tenants
+
+
+def register_tenant(tenant):
+    """
+    Add or replace a tenant in the registry (e.g. one loaded from elsewhere, or a test stand-in).
+    """
+    tenant.validate()
+    tenants = load_tenants()
+    with _tenants_lock:
+        tenants[tenant.id] = tenant
+    return tenant
+
+
+def get_tenant(tenant_id):
+    tenants = load_tenants()
+    if tenant_id not in tenants:
+        raise KeyError(f"Unknown tenant '{tenant_id}'.")
+    return tenants[tenant_id]
+
+
+def default_tenant():
+    tenants = load_tenants()
+    return tenants.get(DEFAULT_TENANT_ID) or next(iter(tenants.values()))
+
+
+_current = contextvars.ContextVar("tenant", default=None)
+
+
+def current_tenant():
+    """
+    The tenant the current request is working for (see use_tenant), or the default tenant.
+    """
+    return _current.get() or default_tenant()
+
+
+def resolve_tenant(tenant=None):
+    """
+    Turn a Tenant, a tenant id or None (the current tenant) into a Tenant.
+    """
+    if tenant is None:
+        return current_tenant()
+    return get_tenant(tenant) if isinstance(tenant, str) else tenant
+
+
+@contextmanager
+def use_tenant(tenant):
+    """
+    Make every fetch, cache lookup and LLM call inside the block work for tenant (a Tenant or its id).
+    TaskGraph tasks and LLM calls started inside the block carry it along. None keeps the current tenant.
+    """
+    if tenant is None:
+        yield current_tenant()
+        return
+    tenant = resolve_tenant(tenant)
+    token = _current.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current.reset(token)
+
+
+# Whether a page view holding this key may see the tenant. A tenant without an access key can only be
+# opened by default (the original single-client app) or through the staff selector
+def _can_view(tenant, key):
+    if tenant.access_key:
+        return hmac.compare_digest(str(key or ""), str(tenant.access_key))
+    return tenant.id == DEFAULT_TENANT_ID
+
+
+def select_tenant():
+    """
+    Pick the tenant for this page view: the one named by ?tenant= (which must come with its ?key=),
+    otherwise the default tenant. With TENANT_SELECTOR on, the sidebar lists every client instead
+    and no key is asked for. Stops the page if the requested client can't be shown.
+    """
+    tenants = load_tenants()
+    params = st.experimental_get_query_params()
+    requested = params.get("tenant", [None])[0]
+    if requested is None and TENANT_SELECTOR and len(tenants) > 1:
+        ids = list(tenants)
+        default = default_tenant().id
+        chosen = st.sidebar.selectbox(
+            "Client", ids, index=ids.index(default), format_func=lambda tenant_id: tenants[tenant_id].name
+        )
+        return tenants[chosen]
+
+    tenant = tenants.get(requested) if requested is not None else default_tenant()
+    if tenant is None or not (TENANT_SELECTOR or _can_view(tenant, params.get("key", [None])[0])):
+        st.error("This client doesn't exist or the link's access key is wrong.")
+        st.stop()
+        # st.stop only halts pages running under `streamlit run`; never fall through to the tenant
+        raise PermissionError(f"No access to tenant '{requested}'.")
+    return tenant
+
+
+def tenant_link_params(tenant=None):
+    """
+    Query parameters that open the same tenant in another page (e.g. the SEO helper).
+    """
+    tenant = resolve_tenant(tenant)
+    if tenant.id == DEFAULT_TENANT_ID and not tenant.access_key:
+        return {}
+    params = {"tenant": tenant.id}
+    if tenant.access_key:
+        params["key"] = tenant.access_key
+    return params
@@ -0,0 +1,47 @@
+import pytest
+
+import clients
+import llm_cache
+import llm_integration
+import llm_metrics
+import tenants
+from llm_metrics import LLMMetrics, record_llm_call
+from llm_replay import FAKE_ANSWER, FakeLLM, install
+
+
+@pytest.fixture
+def metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(tenants, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(llm_cache, "_caches", {})
+    monkeypatch.setattr(clients, "_clients", {})
+    recorded = LLMMetrics(log_path=None)
+    monkeypatch.setattr(llm_metrics, "_metrics", recorded)
+    return recorded
+
+
+def test_calls_record_their_status(metrics):
+    with record_llm_call("done", "gpt-4o-mini", [{"content": "q"}]) as call:
+        call.answer = "a"
+    with pytest.raises(RuntimeError):
+        with record_llm_call("failed", "gpt-4o-mini", [{"content": "q"}]):
+            raise RuntimeError("API down")
+    assert [(record["label"], record["status"], record["error"]) for record in metrics.latest(10)] == [
+        ("done", "ok", None), ("failed", "error", "RuntimeError"),
+    ]
+
+
+def test_a_stream_closed_early_is_recorded_as_cancelled(metrics):
+    install(FakeLLM(latency=0, tokens_per_second=0))
+    stream = llm_integration.stream_completion("question", label="partial")
+    first, second = next(stream), next(stream)
+    stream.close()
+
+    [record] = metrics.latest(10)
+    assert record["status"] == "cancelled"
+    assert record["completion_tokens"] == llm_metrics.count_tokens(first + second)
+    assert record["completion_tokens"] < llm_metrics.count_tokens(FAKE_ANSWER)
+    # Only finished answers are cached
+    key = llm_integration.llm_cache_key(llm_integration.LLM_MODEL, llm_integration.SYSTEM_PROMPT, "", "", "question")
+    assert llm_cache.get_llm_cache().get(key) is None
+    assert "".join(llm_integration.stream_completion("question")) == FAKE_ANSWER
+    assert llm_cache.get_llm_cache().get(key) == FAKE_ANSWER
@@ -0,0 +1,126 @@
+import pandas as pd
+import pytest
+
+import data_cache
+import gsc_data_pull
+import keyword_planner
+from query_index import QueryIndex
+
+QUERIES = [
+    "dietitian near me",
+    "Eating Disorder Dietitian",
+    "near me dietitians",
+    "binge eating help",
+    "sports nutritionist",
+    "dietitian   lynnwood",
+]
+
+
+def _substring_matches(texts, text):
+    text = " ".join(text.lower().split())
+    return [i for i, query in enumerate(texts) if text in " ".join(query.lower().split())]
+
+
+def test_contains_matches_a_plain_substring_scan():
+    index = QueryIndex(QUERIES)
+    for text in ["d", "di", "die", "diet", "dietitian", "ETITIAN", "near me", "tian lyn", "me d", "xyz", ""]:
+        assert index.contains(text).tolist() == (_substring_matches(QUERIES, text) if text else list(range(6)))
+
+
+def test_contains_narrows_cached_results_as_the_query_grows():
+    index = QueryIndex(QUERIES)
+    typed = ""
+    for char in "dietitian ne":
+        typed += char
+        assert index.contains(typed).tolist() == _substring_matches(QUERIES, typed)
+    assert "dietitian" in index._results
+    # Repeating a lookup returns the cached result
+    assert index.contains("dietitian") is index.contains("dietitian")
+
+
+def test_contains_result_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr("query_index.RESULT_CACHE_SIZE", 3)
+    index = QueryIndex(QUERIES)
+    for text in ["die", "diet", "eat", "near"]:
+        index.contains(text)
+    assert list(index._results) == ["diet", "eat", "near"]
+
+
+def test_search_matches_word_prefixes_in_any_order():
+    index = QueryIndex(QUERIES)
+    assert index.search("diet near").tolist() == [0, 2]
+    assert index.search("nutrition").tolist() == [4]
+    assert index.search("lynn DIET").tolist() == [5]
+    assert index.search("missing").tolist() == []
+
+
+def test_prefix_matches_the_start_of_the_whole_text():
+    index = QueryIndex(QUERIES)
+    assert index.prefix("dietitian").tolist() == [0, 5]
+    assert index.prefix("NEAR ME").tolist() == [2]
+
+
+def test_head_terms_prefers_content_words_over_filler():
+    index = QueryIndex(["dietitian near me", "near me dietitians", "Best Dietitian"])
+    groups = index.head_terms()
+    assert {head: ids.tolist() for head, ids in groups.items()} == {"dietitian": [0, 1, 2]}
+
+
+def test_head_terms_drops_groups_left_too_small():
+    index = QueryIndex([
+        "dietitian near me", "dietitian near me lynnwood", "eating disorder dietitian near me",
+        "eating disorder help", "cheap food",
+    ])
+    groups = {head: ids.tolist() for head, ids in index.head_terms().items()}
+    assert groups == {"dietitian near me": [0, 1], "eating disorder": [2, 3]}
+
+
+def test_head_terms_are_worked_out_once_per_setting(monkeypatch):
+    index = QueryIndex(QUERIES)
+    first = index.head_terms()
+    monkeypatch.setattr(index, "_group_head_terms", lambda *args: pytest.fail("head terms were regrouped"))
+    assert index.head_terms() is first
+    assert (3, 2) in index._head_terms
+    monkeypatch.undo()
+    assert index.head_terms(min_size=3) is not first
+
+
+
+def test_search_console_index_is_built_once_per_pull(monkeypatch):
+    monkeypatch.setattr(data_cache, "_source_caches", {})
+    pulls = []
+
+    def pull(start_date=None, end_date=None):
+        pulls.append((start_date, end_date))
+        return pd.DataFrame({"Search Query": QUERIES, "Impressions": 1, "Clicks": 0})
+
+    monkeypatch.setattr(gsc_data_pull, "fetch_search_console_data", pull)
+    (first_data, first), (second_data, second) = (gsc_data_pull.fetch_search_console_index() for _ in range(2))
+    assert len(pulls) == 1
+    # Callers get their own copies, sharing the index's postings and result cache
+    assert first._ngrams is second._ngrams
+    first.contains("dietitian")
+    assert "dietitian" in second._results
+    assert second_data.iloc[second.search("diet near")]["Search Query"].tolist() == [QUERIES[0], QUERIES[2]]
+
+
+def test_keyword_filter_matches_within_single_cells():
+    table = pd.DataFrame({
+        "Keyword": ["dietitian near me", "eating disorder", "Nutrition"],
+        "Avg. Monthly Searches": [10, 20, 30],
+        "Competition": ["LOW", "HIGH", "LOW"],
+    })
+    assert keyword_planner.filter_data(table, "DIET").index.tolist() == [0]
+    assert keyword_planner.filter_data(table, "low").index.tolist() == [0, 2]
+    # Text spanning two cells of a row is not a match
+    assert keyword_planner.filter_data(table, "me 10").empty
+    assert keyword_planner.filter_data(table, "").index.tolist() == [0, 1, 2]
+
+
+def test_grouping_a_filtered_view_keeps_groups_left_with_two_queries():
+    search_data = pd.DataFrame({"Search Query": QUERIES, "Impressions": range(6), "Clicks": 1})
+    index = QueryIndex(QUERIES)
+    grouped = gsc_data_pull.group_queries_by_head_term(search_data, index, index.search("near"))
+    assert grouped[["Head Term", "Queries", "Impressions"]].to_dict("records") == [
+        {"Head Term": "dietitian", "Queries": 2, "Impressions": 2},
+    ]
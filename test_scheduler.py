@@ -0,0 +1,153 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+import scheduler
+from scheduler import (
+    Backend, DeadlineExceeded, error_status, remaining_time, request_deadline, retry_after, scheduled_call,
+    scheduled_stream, scheduled_stream_async,
+)
+
+
+class RateLimited(Exception):
+    def __init__(self, status_code=429, retry_after=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = types.SimpleNamespace(headers=headers)
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    # Keep retries in the tests down to milliseconds, and give every test fresh backends
+    monkeypatch.setattr(scheduler, "BACKOFF_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(scheduler, "_backends", {})
+    monkeypatch.setitem(scheduler.BACKEND_LIMITS, "test", {"rate": 1000.0, "burst": 10, "concurrency": 2})
+
+
+def test_try_acquire_caps_requests_in_flight():
+    backend = Backend("test", rate=1000.0, burst=10, concurrency=2)
+    assert backend.try_acquire() == 0
+    assert backend.try_acquire() == 0
+    assert backend.try_acquire() > 0
+    backend.release()
+    assert backend.try_acquire() == 0
+    assert backend.stats()["in_flight"] == 2
+
+
+def test_try_acquire_waits_for_tokens_once_the_burst_is_spent():
+    backend = Backend("test", rate=1.0, burst=2, concurrency=10)
+    assert backend.try_acquire() == 0
+    assert backend.try_acquire() == 0
+    wait = backend.try_acquire()
+    assert 0.5 < wait <= 1.0
+
+
+def test_backoff_only_retries_rate_limits_and_unavailable():
+    backend = Backend("test", rate=1.0, burst=1, concurrency=1)
+    assert backend.backoff(RateLimited(400), 0) is None
+    assert backend.backoff(ValueError("bad input"), 0) is None
+    assert backend.backoff(RateLimited(503), 0) is not None
+    assert backend.backoff(RateLimited(429), scheduler.MAX_RETRIES) is None
+    assert backend.backoff(RateLimited(429, retry_after=2), 0) == 2.0
+    assert backend.stats()["retries"] == 2
+
+
+def test_backoff_gives_up_when_the_wait_would_pass_the_deadline():
+    backend = Backend("test", rate=1.0, burst=1, concurrency=1)
+    with request_deadline(0.5):
+        assert backend.backoff(RateLimited(429, retry_after=5), 0) is None
+
+
+def test_error_status_reads_each_client_style():
+    assert error_status(RateLimited(429)) == 429
+    assert error_status(types.SimpleNamespace(resp=types.SimpleNamespace(status="503"))) == 503
+    grpc_error = types.SimpleNamespace(error=types.SimpleNamespace(
+        code=lambda: types.SimpleNamespace(name="RESOURCE_EXHAUSTED")
+    ))
+    assert error_status(grpc_error) == 429
+    assert error_status(ValueError()) is None
+    assert retry_after(RateLimited(retry_after=3)) == 3.0
+
+
+def test_remaining_time_raises_once_the_deadline_has_passed():
+    assert remaining_time() is None
+    with request_deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            remaining_time()
+
+
+def test_scheduled_call_retries_and_releases_its_slot():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimited(429)
+        return "ok"
+
+    assert scheduled_call("test", flaky) == "ok"
+    stats = scheduler.scheduler_stats()["test"]
+    assert len(attempts) == 3
+    assert stats["retries"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_scheduled_call_raises_errors_that_are_not_retried():
+    def broken():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduled_call("test", broken)
+    stats = scheduler.scheduler_stats()["test"]
+    assert stats["failures"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_scheduled_call_passes_the_remaining_deadline_as_timeout():
+    with request_deadline(30):
+        timeout = scheduled_call("test", lambda timeout=None: timeout, timeout_arg="timeout")
+    assert 0 < timeout <= 30
+
+
+def test_scheduled_stream_holds_the_slot_until_the_stream_is_read():
+    backend = scheduler.get_backend("test")
+    stream = scheduled_stream("test", lambda: iter([1, 2, 3]))
+    assert backend.stats()["in_flight"] == 1
+    assert next(stream) == 1
+    assert backend.stats()["in_flight"] == 1
+    assert list(stream) == [2, 3]
+    assert backend.stats()["in_flight"] == 0
+
+
+def test_scheduled_stream_releases_the_slot_when_closed_early():
+    backend = scheduler.get_backend("test")
+    with scheduled_stream("test", lambda: iter([1, 2, 3])) as stream:
+        next(stream)
+    assert backend.stats()["in_flight"] == 0
+    stream.close()
+    assert backend.stats()["in_flight"] == 0
+
+
+def test_scheduled_stream_async_releases_the_slot_when_the_stream_fails():
+    backend = scheduler.get_backend("test")
+
+    async def chunks():
+        yield 1
+        raise RuntimeError("connection dropped")
+
+    async def create():
+        return chunks()
+
+    async def read():
+        stream = await scheduled_stream_async("test", create)
+        assert backend.stats()["in_flight"] == 1
+        async with stream:
+            return [chunk async for chunk in stream]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(read())
+    assert backend.stats()["in_flight"] == 0
@@ -0,0 +1,87 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight, get_flight
+
+
+def test_concurrent_calls_for_one_key_run_once():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flight.do, "key", fetch)
+        started.wait(5)
+        followers = [pool.submit(flight.do, "key", fetch) for _ in range(3)]
+        # Followers only join once they are waiting on the leader's call
+        while flight.stats()["coalesced"] < 3:
+            time.sleep(0.001)
+        release.set()
+        assert leader.result() == ("result", False)
+        assert [future.result() for future in followers] == [("result", True)] * 3
+
+    assert len(calls) == 1
+    assert flight.stats() == {"issued": 1, "coalesced": 3, "coalesced_rate": 0.75, "in_flight": 0}
+
+
+def test_different_keys_and_later_calls_run_separately():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == (1, False)
+    assert flight.do("b", lambda: 2) == (2, False)
+    assert flight.do("a", lambda: 3) == (3, False)
+    assert flight.stats()["issued"] == 3
+
+
+def test_exceptions_reach_every_waiter_and_are_not_remembered():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("backend down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "key", fail)
+        started.wait(5)
+        follower = pool.submit(flight.do, "key", fail)
+        while flight.stats()["coalesced"] < 1:
+            time.sleep(0.001)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError):
+                future.result()
+
+    assert flight.do("key", lambda: "recovered") == ("recovered", False)
+
+
+def test_share_hands_out_one_handle_until_it_finishes():
+    flight = SingleFlight()
+    future = Future()
+    starts = []
+
+    def start():
+        starts.append(1)
+        return future
+
+    assert flight.share("key", start) is future
+    assert flight.share("key", start) is future
+    assert len(starts) == 1
+
+    future.set_result("done")
+    assert flight.share("key", lambda: Future()) is not future
+    assert flight.stats()["coalesced"] == 1
+
+
+def test_get_flight_returns_one_flight_per_name():
+    assert get_flight("test-flight") is get_flight("test-flight")
+    assert get_flight("test-flight") is not get_flight("other-test-flight")
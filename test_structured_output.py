@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from structured_output import JSONItemStream, json_schema_format, repair_prompt, schema_errors
+
+PLAN = {"keywords": [
+    {"Keyword": "dietitian {near} me", "Ad Group": "Local"},
+    {"Keyword": 'say "hi" \\ [ok]', "Ad Group": "Odd}"},
+    {"Keyword": "eating disorder help", "Ad Group": "Services"},
+]}
+
+ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {"Keyword": {"type": "string"}, "Ad Group": {"type": "string"}},
+    "required": ["Keyword", "Ad Group"],
+    "additionalProperties": False,
+}
+
+
+def _feed_in_pieces(parser, text, size):
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_items_come_out_as_soon_as_they_close(size):
+    text = json.dumps(PLAN, indent=2)
+    parser = JSONItemStream(item_depth=2)
+    assert _feed_in_pieces(parser, text, size) == PLAN["keywords"]
+    assert parser.result() == PLAN
+
+
+def test_each_item_is_returned_by_the_piece_that_closes_it():
+    parser = JSONItemStream(item_depth=2)
+    assert parser.feed('{"keywords": [{"Keyword": "a", ') == []
+    assert parser.feed('"Ad Group": "x"}, {"Keyword"') == [{"Keyword": "a", "Ad Group": "x"}]
+    assert parser.feed(': "b", "Ad Group": "y"}]}') == [{"Keyword": "b", "Ad Group": "y"}]
+
+
+def test_top_level_arrays_use_item_depth_one():
+    parser = JSONItemStream(item_depth=1)
+    assert parser.feed('[{"a": 1}, {"b": {"c": 2}}]') == [{"a": 1}, {"b": {"c": 2}}]
+
+
+def test_output_that_is_not_json_fails_on_the_first_character():
+    parser = JSONItemStream()
+    assert parser.feed("  \n") == []
+    with pytest.raises(ValueError):
+        parser.feed("Sure! Here are your keywords:")
+
+
+def test_unbalanced_brackets_fail_early():
+    parser = JSONItemStream()
+    with pytest.raises(ValueError):
+        parser.feed('{"keywords": []}]')
+
+
+def test_result_raises_for_a_truncated_document():
+    parser = JSONItemStream()
+    parser.feed('{"keywords": [{"Keyword": "a", "Ad Group": "x"}')
+    with pytest.raises(ValueError):
+        parser.result()
+
+
+def test_schema_errors_report_json_paths():
+    assert schema_errors({"Keyword": "a", "Ad Group": "x"}, ITEM_SCHEMA) == []
+    errors = schema_errors({"Keyword": 3}, ITEM_SCHEMA, "$.keywords[0]")
+    assert errors == [
+        "$.keywords[0]: 'Ad Group' is a required property",
+        "$.keywords[0].Keyword: 3 is not of type 'string'",
+    ]
+
+
+def test_json_schema_format_and_repair_prompt():
+    response_format = json_schema_format("keyword_plan", ITEM_SCHEMA)
+    assert response_format["type"] == "json_schema"
+    assert response_format["json_schema"]["name"] == "keyword_plan"
+    assert response_format["json_schema"]["schema"] == ITEM_SCHEMA
+
+    prompt = repair_prompt('{"keywords": []}', ["$.keywords: expected 3 ad groups, got 0"])
+    assert '{"keywords": []}' in prompt
+    assert "$.keywords: expected 3 ad groups, got 0" in prompt
@@ -0,0 +1,171 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import streamlit as st
+
+import clients
+import data_cache
+import llm_cache
+import llm_integration
+import llm_metrics
+import tenants
+from data_cache import cache_stats, cached_fetch, get_source_cache
+from llm_cache import get_llm_cache
+from llm_metrics import LLMMetrics, record_llm_call
+from tenants import Tenant, current_tenant, use_tenant
+
+
+@pytest.fixture(autouse=True)
+def registry(tmp_path, monkeypatch):
+    # A few clients with their own data directories under tmp_path, and empty shared caches
+    monkeypatch.setattr(tenants, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(tenants, "TENANT_SELECTOR", False)
+    monkeypatch.setattr(data_cache, "_source_caches", {})
+    monkeypatch.setattr(llm_cache, "_caches", {})
+    registered = {
+        "default": Tenant("default", site_url="https://default.example/"),
+        "acme": Tenant("acme", site_url="https://acme.example/", ga4_property_id="222", access_key="s3cret",
+                       quotas={"cache_entries": 1, "llm_cache_bytes": 1024}),
+        "open": Tenant("open", site_url="https://open.example/", ga4_property_id="333"),
+    }
+    monkeypatch.setattr(tenants, "_tenants", registered)
+    return registered
+
+
+calls = []
+
+
+@cached_fetch("tenant_test")
+def fetch_report(name):
+    calls.append((current_tenant().id, name))
+    return f"{current_tenant().id}:{name}"
+
+
+def test_cached_fetch_keeps_each_tenants_results_apart():
+    calls.clear()
+    assert fetch_report("visits") == "default:visits"
+    assert fetch_report("visits", tenant="acme") == "acme:visits"
+    with use_tenant("acme"):
+        assert fetch_report("visits") == "acme:visits"
+    assert fetch_report("visits") == "default:visits"
+    assert calls == [("default", "visits"), ("acme", "visits")]
+    assert set(cache_stats()) == {"tenant_test", "acme/tenant_test"}
+
+
+def test_tenant_quota_caps_its_own_cache_only():
+    calls.clear()
+    fetch_report("a", tenant="acme")
+    fetch_report("b", tenant="acme")
+    fetch_report("a", tenant="acme")
+    fetch_report("a")
+    fetch_report("b")
+    fetch_report("a")
+    assert calls == [("acme", "a"), ("acme", "b"), ("acme", "a"), ("default", "a"), ("default", "b")]
+    assert get_source_cache("tenant_test", tenants.get_tenant("acme")).maxsize == 1
+
+
+def test_tasks_started_under_a_tenant_keep_it():
+    with use_tenant("acme"):
+        context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        assert pool.submit(context.run, fetch_report, "pages").result() == "acme:pages"
+
+
+def test_llm_cache_is_per_tenant(registry, tmp_path):
+    default_cache, acme_cache = get_llm_cache(), get_llm_cache(registry["acme"])
+    assert default_cache is not acme_cache
+    assert default_cache.path == os.path.join(str(tmp_path), "llm_cache.sqlite")
+    assert acme_cache.path == os.path.join(str(tmp_path), "tenants", "acme", "llm_cache.sqlite")
+    assert acme_cache.max_bytes == 1024
+
+    acme_cache.set("key", "acme answer")
+    assert default_cache.get("key") is None
+    with use_tenant("acme"):
+        assert get_llm_cache().get("key") == "acme answer"
+
+
+def test_tenant_validation_names_missing_settings():
+    with pytest.raises(ValueError, match="gsc_site_url or site_url, ga4_property_id"):
+        Tenant("acme").validate()
+    assert Tenant("default", site_url="https://default.example/").validate().id == "default"
+    with pytest.raises(ValueError):
+        Tenant("bad id!")
+
+
+def test_only_the_default_tenant_uses_the_secrets_property(monkeypatch):
+    monkeypatch.setattr(clients.st, "secrets", {"google_service_account": {"property_id": "111"}})
+    assert clients.get_ga4_property_id() == "111"
+    with use_tenant("acme"):
+        assert clients.get_ga4_property_id() == "222"
+    with use_tenant(Tenant("other", site_url="https://other.example/")):
+        with pytest.raises(ValueError, match="ga4_property_id"):
+            clients.get_ga4_property_id()
+
+
+def _select(monkeypatch, **params):
+    monkeypatch.setattr(st, "experimental_get_query_params", lambda: {k: [v] for k, v in params.items()})
+    monkeypatch.setattr(st, "stop", lambda: None)
+    monkeypatch.setattr(st, "error", lambda message: None)
+    return tenants.select_tenant()
+
+
+def test_select_tenant_requires_the_clients_access_key(monkeypatch):
+    assert _select(monkeypatch).id == "default"
+    assert _select(monkeypatch, tenant="acme", key="s3cret").id == "acme"
+    for params in ({"tenant": "acme"}, {"tenant": "acme", "key": "wrong"}, {"tenant": "open"}, {"tenant": "nope"}):
+        with pytest.raises(PermissionError):
+            _select(monkeypatch, **params)
+
+
+def test_select_tenant_staff_mode_opens_any_client(monkeypatch):
+    monkeypatch.setattr(tenants, "TENANT_SELECTOR", True)
+    assert _select(monkeypatch, tenant="open").id == "open"
+    with pytest.raises(PermissionError):
+        _select(monkeypatch, tenant="nope")
+
+
+def test_links_carry_the_tenant_and_its_key():
+    assert tenants.tenant_link_params() == {}
+    assert tenants.tenant_link_params("acme") == {"tenant": "acme", "key": "s3cret"}
+    assert tenants.tenant_link_params("open") == {"tenant": "open"}
+
+
+def test_llm_metrics_and_cache_stats_filter_by_tenant(monkeypatch):
+    metrics = LLMMetrics(log_path=None)
+    monkeypatch.setattr(llm_metrics, "_metrics", metrics)
+    for tenant_id in ("default", "acme", "acme"):
+        with use_tenant(tenant_id), record_llm_call("insight", "gpt-4o-mini", [{"content": "q"}]) as call:
+            call.answer = "a"
+    assert [record["tenant"] for record in metrics.latest(10, "acme")] == ["acme", "acme"]
+    assert metrics.summary("acme").loc[0, "calls"] == 2
+    assert metrics.summary().loc[0, "calls"] == 3
+    assert metrics.to_jsonl("default").count("\n") == 1
+
+    fetch_report("visits")
+    fetch_report("visits", tenant="acme")
+    assert set(cache_stats(tenants.get_tenant("acme"))) == {"tenant_test"}
+
+
+def test_identical_questions_are_only_coalesced_within_a_tenant(monkeypatch):
+    keys = []
+
+    class RecordingFlight:
+        def do(self, key, func, *args):
+            keys.append(key)
+            return ("answer", None), False
+
+        def share(self, key, start):
+            keys.append(key)
+
+    monkeypatch.setattr(llm_integration, "get_flight", lambda name: RecordingFlight())
+    for tenant_id in ("default", "acme"):
+        with use_tenant(tenant_id):
+            llm_integration.complete("same question", regenerate=True)
+            llm_integration.submit_gpt("same question")
+            llm_integration.submit_gpt_stream("same question")
+    assert [key[:2] for key in keys] == [
+        ("complete", "default"), ("answer", "default"), ("stream", "default"),
+        ("complete", "acme"), ("answer", "acme"), ("stream", "acme"),
+    ]
@@ -0,0 +1,204 @@
+import gc
+import time
+import weakref
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import clients
+import gsc_data_pull
+import tenants
+from warehouse import DateWarehouse, date_runs, resolve_ga4_date
+
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def warehouse(tmp_path):
+    return DateWarehouse(str(tmp_path / "store.sqlite"), settle_days=3, settle_refresh=3600)
+
+
+def _rows(days, query="dietitian", page="/", impressions=10, clicks=1, position=2.0):
+    return pd.DataFrame({
+        "Date": [day.isoformat() for day in days],
+        "Search Query": query,
+        "Page": page,
+        "Impressions": impressions,
+        "Clicks": clicks,
+        "Avg. Position": position,
+    })
+
+
+# Seconds since the epoch at noon on the given day, so local-date conversions are unambiguous
+def _noon(day):
+    return datetime(day.year, day.month, day.day, 12).timestamp()
+
+
+def test_resolve_ga4_date_understands_relative_dates():
+    today = date(2024, 3, 10)
+    assert resolve_ga4_date("today", today) == today
+    assert resolve_ga4_date("yesterday", today) == date(2024, 3, 9)
+    assert resolve_ga4_date("30daysAgo", today) == date(2024, 2, 9)
+    assert resolve_ga4_date("2024-01-05", today) == date(2024, 1, 5)
+
+
+def test_date_runs_collapses_and_splits_runs():
+    days = [date(2024, 1, d) for d in (1, 2, 3, 5, 6)]
+    assert date_runs(days) == [(date(2024, 1, 1), date(2024, 1, 3)), (date(2024, 1, 5), date(2024, 1, 6))]
+    assert date_runs(days, max_days=2) == [
+        (date(2024, 1, 1), date(2024, 1, 2)), (date(2024, 1, 3), date(2024, 1, 3)),
+        (date(2024, 1, 5), date(2024, 1, 6)),
+    ]
+
+
+def test_missing_runs_lists_days_never_fetched(warehouse):
+    start, end = date(2024, 1, 1), date(2024, 1, 10)
+    assert warehouse.missing_runs("report", start, end) == [(start, end)]
+
+    warehouse.store("report", _rows([date(2024, 1, 3)]), date(2024, 1, 3), date(2024, 1, 5), fetched_at=_noon(end))
+    assert warehouse.missing_runs("report", start, end) == [
+        (date(2024, 1, 1), date(2024, 1, 2)), (date(2024, 1, 6), date(2024, 1, 10)),
+    ]
+    assert warehouse.missing_runs("report", start, end, max_days=3) == [
+        (date(2024, 1, 1), date(2024, 1, 2)), (date(2024, 1, 6), date(2024, 1, 8)),
+        (date(2024, 1, 9), date(2024, 1, 10)),
+    ]
+
+
+def test_missing_runs_refetches_unsettled_days_after_the_refresh_interval(warehouse):
+    day = date(2024, 1, 10)
+    fetched_at = _noon(day + timedelta(days=1))
+    warehouse.store("report", _rows([day]), day, day, fetched_at=fetched_at)
+
+    # Fetched one day after it ended: still settling, but fresh enough for now
+    assert warehouse.missing_runs("report", day, day, now=fetched_at + 60) == []
+    assert warehouse.missing_runs("report", day, day, now=fetched_at + 3601) == [(day, day)]
+
+
+def test_missing_runs_never_refetches_settled_days(warehouse):
+    day = date(2024, 1, 10)
+    fetched_at = _noon(day + timedelta(days=3))
+    warehouse.store("report", _rows([day]), day, day, fetched_at=fetched_at)
+    assert warehouse.missing_runs("report", day, day, now=fetched_at + 365 * DAY) == []
+
+
+def test_store_replaces_the_range_and_marks_empty_days(warehouse):
+    start, end = date(2024, 1, 1), date(2024, 1, 3)
+    warehouse.store("report", _rows([start, end], impressions=10), start, end)
+    warehouse.store("report", _rows([end], impressions=99), start, end)
+
+    stored = warehouse.read("report", start, end)
+    assert stored["Date"].tolist() == ["2024-01-03"]
+    assert stored["Impressions"].tolist() == [99]
+    assert warehouse.missing_runs("report", start, end, now=time.time()) == []
+
+
+def test_store_holds_one_lazy_chunk_at_a_time(warehouse):
+    start, end = date(2024, 1, 1), date(2024, 1, 3)
+    chunks, seen_while_fetching = [], []
+
+    def pages():
+        for day in pd.date_range(start, end).date:
+            # Earlier chunks are already staged (and released), and nothing is locked while fetching
+            gc.collect()
+            seen_while_fetching.append((sum(chunk() is not None for chunk in chunks), warehouse._lock.locked()))
+            frame = _rows([day])
+            chunks.append(weakref.ref(frame))
+            yield frame
+            del frame
+
+    warehouse.store("report", pages(), start, end)
+    assert seen_while_fetching == [(0, False)] * 3
+    assert len(warehouse.read("report", start, end)) == 3
+
+
+def test_store_failing_partway_keeps_the_old_range(warehouse):
+    start, end = date(2024, 1, 1), date(2024, 1, 2)
+    warehouse.store("report", _rows([start, end], impressions=10), start, end, fetched_at=_noon(end))
+
+    def pages():
+        yield _rows([start], impressions=99)
+        raise RuntimeError("page fetch failed")
+
+    with pytest.raises(RuntimeError):
+        warehouse.store("report", pages(), start, end)
+    stored = warehouse.read("report", start, end)
+    assert stored["Impressions"].tolist() == [10, 10]
+    with warehouse._connect() as conn:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    assert sorted(tables) == ["report", "synced_days"]
+
+
+def test_read_returns_none_for_a_report_never_stored(warehouse):
+    assert warehouse.read("missing", date(2024, 1, 1), date(2024, 1, 2)) is None
+    assert warehouse.aggregate("missing", date(2024, 1, 1), date(2024, 1, 2), ["Page"], {"Clicks": '"Clicks"'}) is None
+
+
+def test_aggregate_groups_and_sums_inside_the_range(warehouse):
+    start, end = date(2024, 1, 1), date(2024, 1, 3)
+    rows = pd.concat([
+        _rows([start, end], query="dietitian", page="/a", impressions=10, clicks=1, position=2.0),
+        _rows([start], query="nutritionist", page="/a", impressions=30, clicks=3, position=4.0),
+        _rows([date(2024, 1, 4)], query="dietitian", page="/a", impressions=1000, clicks=100),
+    ])
+    warehouse.store("report", rows, start, date(2024, 1, 4))
+
+    totals = warehouse.aggregate("report", start, end, ["Search Query"], {
+        "Impressions": '"Impressions"',
+        "Clicks": '"Clicks"',
+        "Weighted Position": '"Avg. Position" * "Impressions"',
+    }).set_index("Search Query")
+    assert totals.loc["dietitian", "Impressions"] == 20
+    assert totals.loc["dietitian", "Clicks"] == 2
+    assert totals.loc["nutritionist", "Weighted Position"] == 120.0
+
+    by_page = warehouse.aggregate("report", start, end, ["Page"], {"Impressions": '"Impressions"'})
+    assert by_page.to_dict("records") == [{"Page": "/a", "Impressions": 50}]
+
+
+class FakeSearchConsole:
+    """
+    Search Analytics stand-in where one query shows two pages: per page it gets 10 impressions a day,
+    but as a query it counts once per search (15 a day), as Search Console reports it.
+    """
+
+    def searchanalytics(self):
+        return self
+
+    def query(self, siteUrl, body):
+        self.body = body
+        return self
+
+    def execute(self):
+        if self.body["startRow"]:
+            return {}
+        days = pd.date_range(self.body["startDate"], self.body["endDate"]).strftime("%Y-%m-%d")
+        rows = []
+        for day in days:
+            if "page" in self.body["dimensions"]:
+                for page in ("/a", "/b"):
+                    keys = {"date": day, "query": "dietitian", "page": page}
+                    rows.append({"keys": [keys[d] for d in self.body["dimensions"]],
+                                 "impressions": 10, "clicks": 1, "ctr": 0.1, "position": 2.0})
+            else:
+                keys = {"date": day, "query": "dietitian"}
+                rows.append({"keys": [keys[d] for d in self.body["dimensions"]],
+                             "impressions": 15, "clicks": 2, "ctr": 0.13, "position": 1.5})
+        return {"rows": rows}
+
+
+def test_search_console_query_totals_come_from_the_query_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(tenants, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(gsc_data_pull, "_warehouses", {})
+    monkeypatch.setitem(clients._clients, "search_console", FakeSearchConsole())
+    tenant = tenants.Tenant("gsc-test", site_url="https://example.com/", ga4_property_id="1")
+
+    by_query = gsc_data_pull.aggregate_search_console("2024-01-01", "2024-01-02", by=("query",), tenant=tenant)
+    assert by_query[["Search Query", "Impressions", "Clicks"]].to_dict("records") == [
+        {"Search Query": "dietitian", "Impressions": 30, "Clicks": 4},
+    ]
+    assert by_query.loc[0, "Avg. Position"] == 1.5
+
+    by_page = gsc_data_pull.aggregate_search_console("2024-01-01", "2024-01-02", by=("page",), tenant=tenant)
+    assert dict(zip(by_page["Page"], by_page["Impressions"])) == {"/a": 20, "/b": 20}
@@ -0,0 +1,15 @@
+import functools
+import os
+
+# English stopword list shipped with the app (same words as NLTK's "english" list),
+# so nothing has to be downloaded at startup
+STOPWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords_en.txt")
+
+
+@functools.lru_cache(maxsize=None)
+def load_stopwords():
+    """
+    Load the bundled English stopwords on first use and return them as a frozenset.
+    """
+    with open(STOPWORDS_PATH, encoding="utf-8") as f:
+        return frozenset(line.strip() for line in f if line.strip())
@@ -0,0 +1,33 @@
+import math
+import re
+
+# Words, numbers and single punctuation marks, roughly how BPE tokenizers split English text
+_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Characters per token for long words, which BPE splits into several sub-word tokens
+CHARS_PER_TOKEN = 4
+
+
+def count_tokens(text):
+    """
+    Estimate the number of model tokens in text without calling the API or downloading a vocabulary.
+    Errs slightly high for ordinary English, so staying under a budget by this count stays under it for real.
+    """
+    if not text:
+        return 0
+    return sum(math.ceil(len(piece) / CHARS_PER_TOKEN) for piece in _PIECES.findall(text))
+
+
+def truncate_to_tokens(text, budget, suffix="..."):
+    """
+    Cut text down to at most budget tokens (by count_tokens), ending with suffix if anything was cut.
+    """
+    if count_tokens(text) <= budget:
+        return text
+    kept, used = 0, count_tokens(suffix)
+    for match in _PIECES.finditer(text):
+        used += math.ceil(len(match.group()) / CHARS_PER_TOKEN)
+        if used > budget:
+            break
+        kept = match.end()
+    return text[:kept].rstrip() + suffix
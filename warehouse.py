@@ -0,0 +1,225 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+# Directory for the local report store (one SQLite file per data source and property)
+DATA_DIR = os.environ.get("BIZBUDDY_DATA_DIR", ".bizbuddy_data")
+
+# Days of data that may still change after they are first reported
+SETTLE_DAYS = 3
+
+# How often a day that is still settling gets re-fetched
+SETTLE_REFRESH_SECONDS = 60 * 60
+
+_DAYS_AGO = re.compile(r"^(\d+)daysAgo$")
+
+
+def resolve_ga4_date(value, today=None):
+    """
+    Turn a GA4 date string ("today", "yesterday", "NdaysAgo" or "YYYY-MM-DD") into a date.
+    """
+    today = today or date.today()
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if value == "today":
+        return today
+    if value == "yesterday":
+        return today - timedelta(days=1)
+    match = _DAYS_AGO.match(value)
+    if match:
+        return today - timedelta(days=int(match.group(1)))
+    return date.fromisoformat(value)
+
+
+def date_runs(days, max_days=None):
+    """
+    Collapse a collection of dates into a sorted list of contiguous (start, end) runs,
+    none longer than max_days if given.
+    """
+    runs = []
+    for day in sorted(days):
+        if (runs and day == runs[-1][1] + timedelta(days=1)
+                and (max_days is None or (day - runs[-1][0]).days < max_days)):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [(start, end) for start, end in runs]
+
+
+class DateWarehouse:
+    """
+    Local store of date-partitioned report rows backed by a single SQLite file.
+
+    Each table holds the rows for one report, with an ISO "Date" column. A side table records
+    when every day was last fetched, so callers can ask which days are missing (or still settling)
+    and only pull those from the API.
+    """
+
+    # Guards writes per database file; SQLite handles concurrent readers on its own
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, path, settle_days=SETTLE_DAYS, settle_refresh=SETTLE_REFRESH_SECONDS):
+        self.path = path
+        self.settle_days = settle_days
+        self.settle_refresh = settle_refresh
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with DateWarehouse._locks_guard:
+            self._lock = DateWarehouse._locks.setdefault(os.path.abspath(path), threading.Lock())
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS synced_days ("
+                "report TEXT NOT NULL, day TEXT NOT NULL, fetched_at REAL NOT NULL, "
+                "PRIMARY KEY (report, day))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps the store safe to use from any thread
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def missing_runs(self, report, start, end, now=None, max_days=None):
+        """
+        Return the (start, end) date runs in [start, end] that have never been fetched,
+        or that were fetched before they had settled and are due for a refresh.
+        With max_days, long runs are split so each can be fetched and stored on its own.
+        """
+        now = now or time.time()
+        with self._connect() as conn:
+            synced = dict(conn.execute(
+                "SELECT day, fetched_at FROM synced_days WHERE report = ? AND day BETWEEN ? AND ?",
+                (report, start.isoformat(), end.isoformat()),
+            ).fetchall())
+
+        needed = []
+        day = start
+        while day <= end:
+            fetched_at = synced.get(day.isoformat())
+            if fetched_at is None:
+                needed.append(day)
+            else:
+                # A day is final once it was fetched at least settle_days after it ended
+                fetched_on = date.fromtimestamp(fetched_at)
+                settled = fetched_on >= day + timedelta(days=self.settle_days)
+                if not settled and now - fetched_at > self.settle_refresh:
+                    needed.append(day)
+            day += timedelta(days=1)
+        return date_runs(needed, max_days)
+
+    def store(self, report, frames, start, end, fetched_at=None):
+        """
+        Replace every row of the report between start and end (inclusive) with the given frame
+        (or iterable of frame chunks), and mark each of those days as fetched. Days with no rows are
+        still marked, since GA4 simply returns nothing for days without traffic.
+
+        Chunks may be fetched lazily (API pages): each one is written to a staging table as it
+        arrives, so only one is held in memory and no lock is held while the next is fetched. The
+        range is then swapped in from staging in one short transaction, so a fetch that fails partway
+        leaves the stored range as it was.
+        """
+        fetched_at = fetched_at or time.time()
+        if isinstance(frames, pd.DataFrame):
+            frames = [frames]
+        days = pd.date_range(start, end, freq="D").strftime("%Y-%m-%d")
+        staging = f"{report}__staging_{uuid.uuid4().hex[:12]}"
+
+        try:
+            for frame in frames:
+                with self._connect() as conn:
+                    self._with_iso_dates(frame).to_sql(staging, conn, if_exists="append", index=False)
+                # Let go of this chunk before the next one is fetched
+                del frame
+
+            with self._lock, self._connect() as conn:
+                if self._has_table(conn, report):
+                    conn.execute(
+                        f'DELETE FROM "{report}" WHERE Date BETWEEN ? AND ?',
+                        (start.isoformat(), end.isoformat()),
+                    )
+                if self._has_table(conn, staging):
+                    if not self._has_table(conn, report):
+                        conn.execute(f'CREATE TABLE "{report}" AS SELECT * FROM "{staging}" WHERE 0')
+                    columns = ", ".join(
+                        f'"{row[1]}"' for row in conn.execute(f'PRAGMA table_info("{staging}")').fetchall()
+                    )
+                    conn.execute(f'INSERT INTO "{report}" ({columns}) SELECT {columns} FROM "{staging}"')
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "{report}_date" ON "{report}" (Date)')
+                conn.executemany(
+                    "INSERT OR REPLACE INTO synced_days (report, day, fetched_at) VALUES (?, ?, ?)",
+                    [(report, day, fetched_at) for day in days],
+                )
+        finally:
+            with self._connect() as conn:
+                conn.execute(f'DROP TABLE IF EXISTS "{staging}"')
+
+    def read(self, report, start, end, chunksize=None):
+        """
+        Read the report's rows between start and end (inclusive). Returns None if the report
+        has never been stored. With a chunksize, returns an iterator of DataFrames instead.
+        """
+        if chunksize:
+            return self._read_chunks(report, start, end, chunksize)
+        with self._connect() as conn:
+            if not self._has_table(conn, report):
+                return None
+            return pd.read_sql_query(
+                f'SELECT * FROM "{report}" WHERE Date BETWEEN ? AND ?',
+                conn,
+                params=(start.isoformat(), end.isoformat()),
+            )
+
+    def aggregate(self, report, start, end, by, sums):
+        """
+        Group the report's rows between start and end (inclusive) by the `by` columns inside SQLite,
+        so only one row per group is loaded. `sums` maps output column names to SQL expressions over
+        the report's columns (e.g. '"Clicks"') that are summed per group. Returns None if the report
+        has never been stored.
+        """
+        group = ", ".join(f'"{column}"' for column in by)
+        totals = ", ".join(f'SUM({expression}) AS "{name}"' for name, expression in sums.items())
+        with self._connect() as conn:
+            if not self._has_table(conn, report):
+                return None
+            return pd.read_sql_query(
+                f'SELECT {group}, {totals} FROM "{report}" WHERE Date BETWEEN ? AND ? GROUP BY {group}',
+                conn,
+                params=(start.isoformat(), end.isoformat()),
+            )
+
+    def _read_chunks(self, report, start, end, chunksize):
+        with self._connect() as conn:
+            if not self._has_table(conn, report):
+                return
+            yield from pd.read_sql_query(
+                f'SELECT * FROM "{report}" WHERE Date BETWEEN ? AND ?',
+                conn,
+                params=(start.isoformat(), end.isoformat()),
+                chunksize=chunksize,
+            )
+
+    @staticmethod
+    def _with_iso_dates(frame):
+        frame = frame.copy()
+        frame["Date"] = pd.to_datetime(frame["Date"].astype(str)).dt.strftime("%Y-%m-%d")
+        return frame
+
+    @staticmethod
+    def _has_table(conn, name):
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone()
+        return row is not None